@@ -0,0 +1,25 @@
+"""df_py
+
+Set envvar ENFORCE_TYPES=0 (or run `dftool --fast`) to skip the runtime
+type checks of @enforce_types, for speed. It must be set before df_py is
+imported. Behaviour is otherwise the same, except that wrongly-typed
+arguments don't raise a TypeError.
+"""
+
+import os
+
+import enforce_typing
+
+
+def enforce_types_enabled() -> bool:
+    """Return False if envvar ENFORCE_TYPES=0"""
+    return os.getenv("ENFORCE_TYPES", "1") != "0"
+
+
+def _no_type_checks(wrapped):
+    return wrapped
+
+
+# df_py modules do "from enforce_typing import enforce_types", after this
+if not enforce_types_enabled():
+    enforce_typing.enforce_types = _no_type_checks
@@ -1,4 +1,4 @@
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 from enforce_typing import enforce_types
 
@@ -9,7 +9,10 @@ from df_py.util.graphutil import wait_to_latest_block
 
 @enforce_types
 def calc_predictoor_rewards(
-    predictoors: Dict[str, Predictoor], tokens_avail: Union[int, float], chain_id: int
+    predictoors: Dict[str, Predictoor],
+    tokens_avail: Union[int, float],
+    chain_id: int,
+    contract_addrs: Optional[list] = None,
 ) -> Dict[str, Dict[str, float]]:
     """
     Calculate rewards for predictoors based on their weekly payout.
@@ -19,6 +22,8 @@ def calc_predictoor_rewards(
         The predictoors to calculate rewards for.
     tokens_avail -- float
         The number of tokens available for distribution as rewards.
+    contract_addrs -- list of str
+        The predictoor contracts. If not given, query the chain for them.
 
     @return
     rewards -- dict of [contract addr][predictoor addr]: float
@@ -27,9 +32,11 @@ def calc_predictoor_rewards(
     MIN_REWARD = 1e-15
     tokens_avail = float(tokens_avail)
 
-    wait_to_latest_block(chain_id)
-
-    predictoor_contracts = query_predictoor_contracts(chain_id).keys()
+    if contract_addrs is None:
+        wait_to_latest_block(chain_id)
+        predictoor_contracts = list(query_predictoor_contracts(chain_id).keys())
+    else:
+        predictoor_contracts = contract_addrs
     print("# of available contracts: ", len(predictoor_contracts))
     tokens_per_contract = tokens_avail / len(predictoor_contracts)
     print("Tokens per contract:", tokens_per_contract)
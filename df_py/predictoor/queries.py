@@ -5,7 +5,8 @@ from web3 import Web3
 
 from df_py.predictoor.models import PredictContract, Prediction, Predictoor
 from df_py.util.constants import DEPLOYER_ADDRS
-from df_py.util.graphutil import submit_query
+from df_py.util.concurrency import run_sync
+from df_py.util.graphutil import async_paginate_records
 from df_py.util.networkutil import DEV_CHAINID
 
 WHITELIST_FEEDS_MAINNET = [
@@ -31,6 +32,57 @@ WHITELIST_FEEDS_MAINNET = [
     "0xfa69b2c1224cebb3b6a36fb5b8c3c419afab08dd",
 ]
 
+# selection sets for async_paginate_records(); each must include `id`
+PREDICT_CONTRACT_FIELDS = """
+  id
+  token {
+    id
+    name
+    symbol
+    nft {
+      id
+      owner {
+        id
+      }
+      nftData {
+        key
+        value
+      }
+    }
+  }
+  secondsPerEpoch
+  secondsPerSubscription
+  truevalSubmitTimeout
+"""
+
+PREDICTION_FIELDS = """
+  id
+  stake
+  slot {
+    status
+    predictContract {
+      id
+      token {
+        nft {
+          id
+          owner {
+            id
+          }
+        }
+      }
+    }
+    slot
+  }
+  user {
+    id
+  }
+  payout {
+    id
+    payout
+  }
+  block
+"""
+
 
 @enforce_types
 def key_to_725(key: str):
@@ -78,6 +130,14 @@ def info_from_725(info725_list: list) -> Dict[str, Optional[str]]:
 
 @enforce_types
 def query_predictoor_contracts(chain_id: int) -> Dict[str, PredictContract]:
+    """Sync version of async_query_predictoor_contracts()"""
+    return run_sync(async_query_predictoor_contracts(chain_id))
+
+
+@enforce_types
+async def async_query_predictoor_contracts(
+    chain_id: int,
+) -> Dict[str, PredictContract]:
     """
     @description
         Queries the predictContracts for a given chain ID,
@@ -90,76 +150,38 @@ def query_predictoor_contracts(chain_id: int) -> Dict[str, PredictContract]:
         contracts_dict -- A dictionary mapping contract address to
                           PredictContract objects
     @raises
-        AssertionError: If the result of the query contains an error.
+        AssertionError, SubgraphNoDataError: If the query result has an error.
 
     @notes
         This will only return the prediction feeds that are owned by DEPLOYER_ADDRS
     """
 
-    chunk_size = 1000
-    offset = 0
     contracts_dict = {}
 
-    while True:
-        query = """
-        {
-            predictContracts(skip:%s, first:%s){
-                id
-                token {
-                    id
-                    name
-                    symbol
-                    nft {
-                        id
-                        owner {
-                            id
-                        }
-                        nftData {
-                            key
-                            value
-                        }
-                    }
-                }
-                secondsPerEpoch
-                secondsPerSubscription
-                truevalSubmitTimeout
-            }
-        }
-        """ % (
-            offset,
-            chunk_size,
-        )
-        offset += chunk_size
-        result = submit_query(query, chain_id)
-        if "error" in result:
-            raise AssertionError(result)
-        if "data" not in result:
-            raise AssertionError(result)
-        predictoor_contracts = result["data"]["predictContracts"]
-        if len(predictoor_contracts) == 0:
-            break
-        for contract in predictoor_contracts:
-            if contract["id"] not in WHITELIST_FEEDS_MAINNET:
-                owner = contract["token"]["nft"]["owner"]["id"]
-                if chain_id != DEV_CHAINID and owner not in DEPLOYER_ADDRS[chain_id]:
-                    continue
+    async for contract in async_paginate_records(
+        "predictContracts", PREDICT_CONTRACT_FIELDS, chain_id
+    ):
+        if contract["id"] not in WHITELIST_FEEDS_MAINNET:
+            owner = contract["token"]["nft"]["owner"]["id"]
+            if chain_id != DEV_CHAINID and owner not in DEPLOYER_ADDRS[chain_id]:
+                continue
 
-            nft_addr = contract["id"]
-            pair = contract["token"]["name"].replace("/", "-")
-            timeframe = "5m" if int(contract["secondsPerEpoch"]) == 300 else "1h"
-            source = "binance"
+        nft_addr = contract["id"]
+        pair = contract["token"]["name"].replace("/", "-")
+        timeframe = "5m" if int(contract["secondsPerEpoch"]) == 300 else "1h"
+        source = "binance"
 
-            asset_name = f"{pair}-{source}-{timeframe}"
+        asset_name = f"{pair}-{source}-{timeframe}"
 
-            contract_obj = PredictContract(
-                chain_id,
-                nft_addr,
-                asset_name,
-                contract["token"]["symbol"],
-                contract["secondsPerEpoch"],
-                contract["secondsPerSubscription"],
-            )
-            contracts_dict[nft_addr] = contract_obj
+        contract_obj = PredictContract(
+            chain_id,
+            nft_addr,
+            asset_name,
+            contract["token"]["symbol"],
+            contract["secondsPerEpoch"],
+            contract["secondsPerSubscription"],
+        )
+        contracts_dict[nft_addr] = contract_obj
 
     print(contracts_dict)
     return contracts_dict
@@ -167,6 +189,14 @@ def query_predictoor_contracts(chain_id: int) -> Dict[str, PredictContract]:
 
 @enforce_types
 def query_predictoors(st_ts: int, end_ts: int, chainID: int) -> Dict[str, Predictoor]:
+    """Sync version of async_query_predictoors()"""
+    return run_sync(async_query_predictoors(st_ts, end_ts, chainID))
+
+
+@enforce_types
+async def async_query_predictoors(
+    st_ts: int, end_ts: int, chainID: int
+) -> Dict[str, Predictoor]:
     """
     @description
         Queries the predictPredictions GraphQL endpoint for a given
@@ -183,88 +213,39 @@ def query_predictoors(st_ts: int, end_ts: int, chainID: int) -> Dict[str, Predic
         predictoors -- A dictionary of address to Predictoor objects
 
     @raises
-        AssertionError: If the result of the query contains an error.
+        AssertionError, SubgraphNoDataError: If the query result has an error.
     """
     predictoors: Dict[str, Predictoor] = {}
 
-    chunk_size = 1000
-    offset = 0
-
-    while True:
-        # pylint: disable=line-too-long
-        query = """
-        {
-            predictPredictions(where: {slot_: {slot_gt: %s, slot_lte: %s, status: Paying}, payout_not: null}, skip:%s, first:%s) {
-                id,
-                stake,
-                slot{
-                    status,
-                    predictContract {
-                        id
-                        token {
-                            nft {
-                                id
-                                owner {
-                                    id
-                                }
-                            }
-                        }
-                    }
-                    slot
-                },
-                user {
-                    id
-                }
-                payout {
-                    id
-                    payout
-                }
-                block
-            }
-        }
-        """ % (
-            st_ts,
-            end_ts,
-            offset,
-            chunk_size,
-        )
-
-        offset += chunk_size
-        result = submit_query(query, chainID)
-
-        if "error" in result:
-            raise AssertionError(result)
-        if "data" not in result:
-            raise AssertionError(result)
-
-        predictions = result["data"]["predictPredictions"]
-        print(len(predictoors))
-        if len(predictions) == 0:
-            break
-
-        for prediction_dict in predictions:
-            if (
-                prediction_dict["slot"]["predictContract"]["id"]
-                not in WHITELIST_FEEDS_MAINNET
-            ):
-                owner = prediction_dict["slot"]["predictContract"]["token"]["nft"][
-                    "owner"
-                ]["id"]
-                if chainID != DEV_CHAINID:
-                    if owner not in DEPLOYER_ADDRS[chainID]:
-                        print("noowner", owner, chainID, DEPLOYER_ADDRS)
-                        continue
-            predictoor_addr = prediction_dict["user"]["id"]
-
-            # 0 - Pending
-            # 1 - Paying
-            # 2 - Canceled
-            status = prediction_dict["slot"]["status"]
-            if status != "Paying":
-                continue
-
-            prediction = Prediction.from_query_result(prediction_dict)
-            predictoors.setdefault(predictoor_addr, Predictoor(predictoor_addr))
-            predictoors[predictoor_addr].add_prediction(prediction)
+    where = (
+        f"slot_: {{slot_gt: {st_ts}, slot_lte: {end_ts}, status: Paying}}"
+        ", payout_not: null"
+    )
+    async for prediction_dict in async_paginate_records(
+        "predictPredictions", PREDICTION_FIELDS, chainID, where=where
+    ):
+        if (
+            prediction_dict["slot"]["predictContract"]["id"]
+            not in WHITELIST_FEEDS_MAINNET
+        ):
+            owner = prediction_dict["slot"]["predictContract"]["token"]["nft"]["owner"][
+                "id"
+            ]
+            if chainID != DEV_CHAINID:
+                if owner not in DEPLOYER_ADDRS[chainID]:
+                    print("noowner", owner, chainID, DEPLOYER_ADDRS)
+                    continue
+        predictoor_addr = prediction_dict["user"]["id"]
+
+        # 0 - Pending
+        # 1 - Paying
+        # 2 - Canceled
+        status = prediction_dict["slot"]["status"]
+        if status != "Paying":
+            continue
+
+        prediction = Prediction.from_query_result(prediction_dict)
+        predictoors.setdefault(predictoor_addr, Predictoor(predictoor_addr))
+        predictoors[predictoor_addr].add_prediction(prediction)
 
     return predictoors
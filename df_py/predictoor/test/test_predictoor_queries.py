@@ -13,16 +13,18 @@ from df_py.predictoor.queries import (
     value_to_725,
 )
 from df_py.util import networkutil
+from df_py.util.graphtestutil import mock_stream_query
 
 CHAINID = networkutil.DEV_CHAINID
 
 
-@patch("df_py.predictoor.queries.submit_query")
-def test_query_predictoors(mock_submit_query):
+def test_query_predictoors():
     responses, users, stats = create_mock_responses(100)
-    mock_submit_query.side_effect = responses
-
-    predictoors = query_predictoors(1, 2, CHAINID)
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(responses),
+    ) as mock_stream_query_:
+        predictoors = query_predictoors(1, 2, CHAINID)
 
     for user in users:
         if stats[user]["total"] == 0:
@@ -34,7 +36,7 @@ def test_query_predictoors(mock_submit_query):
         assert predictoors[user].correct_prediction_count == user_correct
         assert predictoors[user].accuracy == user_correct / user_total
 
-    mock_submit_query.assert_called()
+    mock_stream_query_.assert_called()
 
 
 @pytest.mark.skip(reason="Requires predictoor support in subgraph")
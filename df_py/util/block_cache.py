@@ -0,0 +1,282 @@
+"""
+Cache of block number -> timestamp, for blocktime.py. One per chain,
+shared by all blocktime functions in a process, and optionally persisted
+to a JSON file per chain. Also caches the block that a timestamp resolved
+to. So converting the same dates again (e.g. for volsym, then allocations,
+then vebals of one week) needs no RPC calls.
+
+Only blocks at least BLOCK_CACHE_CONFIRMATIONS below the highest chain
+head seen are cached, since those can't be reorged away. Development
+chains are never cached: they get reset.
+
+Each chain's cache also holds its BlockIndex, in a .idx file next to it.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+from enforce_typing import enforce_types
+
+from df_py.util.block_index import BlockIndex
+from df_py.util.constants import BLOCK_CACHE_CONFIRMATIONS, BLOCK_CACHE_DIR
+from df_py.util.networkutil import DEV_CHAINID
+
+# dir of the per-chain files; None means in memory only. Set by enable()
+_DIR: Optional[str] = None
+
+# [chainID] : cache, for this process
+_CACHES: Dict[int, "BlockTimestampCache"] = {}
+
+# [web3] : chainID, so that a cache hit costs no chain_id RPC call either
+_CHAINIDS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+# the data, where it's persisted, hit stats & a lock: all needed per chain
+# pylint: disable=too-many-instance-attributes
+class BlockTimestampCache:
+    """Timestamps of one chain's final blocks, in memory & maybe on disk"""
+
+    @enforce_types
+    def __init__(self, chainID: int, path: Optional[str] = None):
+        self.chainID = chainID
+        self.path = path
+        self.head = 0  # highest chain head seen
+        self.timestamps: Dict[int, int] = {}  # [block] : timestamp
+        self.answers: Dict[str, int] = {}  # [method:timestamp] : block
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self._merge(_read_file(path))
+        index_path = None if path is None else os.path.splitext(path)[0] + ".idx"
+        self.index = BlockIndex(index_path)
+
+    @enforce_types
+    def is_final(self, block: int) -> bool:
+        return block <= self.head - BLOCK_CACHE_CONFIRMATIONS
+
+    @enforce_types
+    def note_head(self, block: int):
+        with self._lock:
+            if block > self.head:
+                self.head = block
+                self._dirty = True
+
+    @enforce_types
+    def get_timestamp(self, block: int) -> Optional[int]:
+        with self._lock:
+            timestamp = self.timestamps.get(block)
+            if timestamp is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return timestamp
+
+    @enforce_types
+    def put_timestamp(self, block: int, timestamp: int):
+        if not self.is_final(block):
+            return
+        with self._lock:
+            if self.timestamps.get(block) != timestamp:
+                self.timestamps[block] = timestamp
+                self._dirty = True
+
+    @enforce_types
+    def get_answer(self, key: str) -> Optional[int]:
+        with self._lock:
+            return self.answers.get(key)
+
+    @enforce_types
+    def put_answer(self, key: str, block: int):
+        """Remember that key resolved to block. Only if block is final"""
+        if not self.is_final(block):
+            return
+        with self._lock:
+            self.answers[key] = block
+            self._dirty = True
+
+    def save(self):
+        """Write to self.path, if anything changed. Merges with what other
+        processes may have written there meanwhile"""
+        self.index.save()
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            if os.path.exists(self.path):
+                self._merge(_read_file(self.path))
+            _write_file(self.path, self._to_dict())
+            self._dirty = False
+
+    def _merge(self, d: dict):
+        self.head = max(self.head, d.get("head", 0))
+        for block, timestamp in d.get("timestamps", {}).items():
+            self.timestamps.setdefault(int(block), timestamp)
+        for key, block in d.get("answers", {}).items():
+            self.answers.setdefault(key, block)
+
+    def _to_dict(self) -> dict:
+        return {
+            "chainID": self.chainID,
+            "head": self.head,
+            "timestamps": {str(b): t for b, t in sorted(self.timestamps.items())},
+            "answers": self.answers,
+        }
+
+
+class BlockTimestamps:
+    """
+    @description
+      Timestamps of a web3's blocks, each fetched at most once per
+      instance. Final blocks are read from & written to the chain's
+      BlockTimestampCache. Make one per conversion.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self.cache = cache_for_web3(web3)
+        self.rpc_calls = 0
+        self.head: Optional[int] = None  # latest block, once fetched
+        self._recent: Dict[int, int] = {}  # non-final blocks
+
+    def timestamp(self, block: int, remember: bool = True) -> int:
+        """Return the timestamp of block. If not remember, a fetched one
+        doesn't go in the cache, e.g. as it goes in the BlockIndex"""
+        block = int(block)
+        if block in self._recent:
+            return self._recent[block]
+        if self.cache is not None:
+            timestamp = self.cache.get_timestamp(block)
+            if timestamp is not None:
+                return timestamp
+
+        self.rpc_calls += 1
+        timestamp = int(self.web3.eth.get_block(block).timestamp)
+        if remember:
+            self._add(block, timestamp)
+        return timestamp
+
+    @property
+    def index(self) -> Optional[BlockIndex]:
+        """The chain's BlockIndex, if the cache is persisted. (Building
+        one just for this process would cost more than it saves)"""
+        if self.cache is None or self.cache.path is None:
+            return None
+        return self.cache.index
+
+    def latest(self) -> Tuple[int, int]:
+        """Return (number, timestamp) of the latest block. Always an RPC"""
+        self.rpc_calls += 1
+        block = self.web3.eth.get_block("latest")
+        number, timestamp = int(block.number), int(block.timestamp)
+        self.head = number
+        if self.cache is not None:
+            self.cache.note_head(number)
+        self._add(number, timestamp)
+        return number, timestamp
+
+    def head_number(self) -> int:
+        """Return the latest block's number. An RPC only the 1st time"""
+        if self.head is None:
+            self.latest()
+        return self.head  # type: ignore[return-value]
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.save()
+
+    def _add(self, block: int, timestamp: int):
+        if self.cache is not None and self.cache.is_final(block):
+            self.cache.put_timestamp(block, timestamp)
+        else:
+            self._recent[block] = timestamp
+
+
+@enforce_types
+def enable(path: Optional[str] = None):
+    """
+    @description
+      Persist the caches of this process, one JSON file per chain.
+
+    @arguments
+      path -- dir of the files. Default: envvar BLOCK_CACHE_DIR, else
+        constants.BLOCK_CACHE_DIR
+    """
+    global _DIR
+    if path is None:
+        path = os.getenv("BLOCK_CACHE_DIR", BLOCK_CACHE_DIR)
+    _DIR = os.path.expanduser(path)
+    _CACHES.clear()
+
+
+def disable():
+    """Stop persisting; caches are in memory only, from now"""
+    global _DIR
+    for cache in _CACHES.values():
+        cache.save()
+    _DIR = None
+    _CACHES.clear()
+
+
+@enforce_types
+def get_cache(chainID: int) -> Optional[BlockTimestampCache]:
+    """Return the cache of chainID, or None for development chains"""
+    if chainID == DEV_CHAINID:
+        return None
+    if chainID not in _CACHES:
+        path = None
+        if _DIR is not None:
+            path = os.path.join(_DIR, f"{chainID}.json")
+        _CACHES[chainID] = BlockTimestampCache(chainID, path)
+    return _CACHES[chainID]
+
+
+def cache_for_web3(web3) -> Optional[BlockTimestampCache]:
+    """Return the cache of web3's chain. None if it has no int chain_id,
+    e.g. a mock"""
+    try:
+        chainID = _CHAINIDS.get(web3)
+    except TypeError:  # not hashable: no memo
+        chainID = None
+    if chainID is None:
+        chainID = web3.eth.chain_id
+        if not isinstance(chainID, int):
+            return None
+        try:
+            _CHAINIDS[web3] = chainID
+        except TypeError:
+            pass
+    return get_cache(chainID)
+
+
+def print_cache_stats():
+    for chainID, cache in sorted(_CACHES.items()):
+        print(
+            f"Block timestamp cache, chain {chainID}: {cache.hits} hits"
+            f", {cache.misses} misses, {len(cache.timestamps)} blocks"
+            f", {len(cache.answers)} dates, {len(cache.index)} index anchors"
+        )
+
+
+def _read_file(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable block cache {path}: {e}")
+        return {}
+
+
+def _write_file(path: str, d: dict):
+    """Write atomically, so that readers never see a partial file"""
+    dirname = os.path.dirname(path) or "."
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(d, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,148 @@
+"""
+Sparse index of a chain's block timestamps: anchors at multiples of
+BLOCK_INDEX_SPACING, added around each block that a timestamp resolves to.
+A timestamp between two adjacent anchors is then bracketed to within
+BLOCK_INDEX_SPACING blocks without RPC calls, so that search_block()
+needs just one or two to pin the block down. Elsewhere, the nearest
+anchors still narrow the search.
+
+File format, little-endian: magic b"DFBI", version (uint32), spacing
+(int64), then one (block, timestamp) int64 pair per anchor, by block.
+"""
+
+import os
+import struct
+import tempfile
+import threading
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from enforce_typing import enforce_types
+
+from df_py.util.constants import BLOCK_INDEX_SPACING
+
+_MAGIC = b"DFBI"
+_VERSION = 2
+_HEADER = struct.Struct("<4sIq")
+
+
+class BlockIndex:
+    """Anchors (block, timestamp) of one chain, in memory & maybe on disk"""
+
+    @enforce_types
+    def __init__(self, path: Optional[str] = None, spacing: int = BLOCK_INDEX_SPACING):
+        self.path = path
+        self.spacing = spacing
+        self.blocks = np.zeros(0, dtype=np.int64)  # of each anchor, ascending
+        self.timestamps = np.zeros(0, dtype=np.int64)  # of each anchor
+        self._n_saved = 0
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            self._load(path)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @enforce_types
+    def bracket(
+        self, timestamp: Union[float, int]
+    ) -> Optional[Tuple[int, int, int, int]]:
+        """
+        @return
+          lo, lo_ts, hi, hi_ts -- adjacent anchors with lo_ts < timestamp
+            <= hi_ts. None if timestamp isn't within the anchors. hi - lo
+            is BLOCK_INDEX_SPACING, or more where there are no anchors yet
+        """
+        ts = self.timestamps
+        if len(ts) < 2 or not ts[0] < timestamp <= ts[-1]:
+            return None
+        i = int(np.searchsorted(ts, timestamp, side="left"))
+        if not ts[i - 1] < timestamp <= ts[i]:  # not monotonic here
+            return None
+        return (
+            int(self.blocks[i - 1]),
+            int(ts[i - 1]),
+            int(self.blocks[i]),
+            int(ts[i]),
+        )
+
+    @enforce_types
+    def anchor_at_or_before(self, block: int) -> Optional[Tuple[int, int]]:
+        """Return (block, timestamp) of the last anchor <= block, if any"""
+        i = int(np.searchsorted(self.blocks, block, side="right")) - 1
+        if i < 0:
+            return None
+        return int(self.blocks[i]), int(self.timestamps[i])
+
+    def add_around(self, blocks, block: int, final: int) -> int:
+        """
+        @description
+          Add the anchors just below & at or above block, unless they're
+          there already or past block final. Then a timestamp that
+          resolved to block gets bracketed to within one spacing.
+          Fetches their timestamps via blocks, a BlockTimestamps.
+
+        @return
+          n_added -- # anchors added: 0, 1 or 2
+        """
+        below = max(block - 1, 0) // self.spacing * self.spacing
+        new_blocks = [
+            b
+            for b in (below, below + self.spacing)
+            if b <= final and b not in self.blocks
+        ]
+        if not new_blocks:
+            return 0
+        new_ts = [blocks.timestamp(b, remember=False) for b in new_blocks]
+        with self._lock:
+            self._merge(np.array(new_blocks), np.array(new_ts))
+        return len(new_blocks)
+
+    def save(self):
+        """Write to self.path, if there are new anchors. Keeps the anchors
+        of both this & the file (maybe written by another process)"""
+        if self.path is None or len(self) == self._n_saved:
+            return
+        with self._lock:
+            if os.path.exists(self.path):
+                other = BlockIndex(self.path, self.spacing)
+                self._merge(other.blocks, other.timestamps)
+            _write_file(self.path, self.spacing, self.blocks, self.timestamps)
+            self._n_saved = len(self)
+
+    def _merge(self, blocks: np.ndarray, timestamps: np.ndarray):
+        """Add anchors, keeping self.blocks ascending & unique"""
+        all_blocks = np.concatenate([self.blocks, blocks.astype(np.int64)])
+        all_ts = np.concatenate([self.timestamps, timestamps.astype(np.int64)])
+        self.blocks, I = np.unique(all_blocks, return_index=True)
+        self.timestamps = all_ts[I]
+
+    def _load(self, path: str):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, spacing = _HEADER.unpack_from(data)
+            if (magic, version) != (_MAGIC, _VERSION):
+                raise ValueError("not a block index file")
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ignoring unreadable block index {path}: {e}")
+            return
+        if spacing != self.spacing:
+            return  # from another setting; rebuild
+        body = data[_HEADER.size :]
+        body = body[: len(body) // 16 * 16]  # drop a partial anchor
+        anchors = np.frombuffer(body, dtype="<i8").astype(np.int64).reshape(-1, 2)
+        self.blocks, self.timestamps = anchors[:, 0].copy(), anchors[:, 1].copy()
+        self._n_saved = len(self)
+
+
+def _write_file(path: str, spacing: int, blocks: np.ndarray, timestamps: np.ndarray):
+    """Write atomically, so that readers never see a partial file"""
+    dirname = os.path.dirname(path) or "."
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, spacing))
+        f.write(np.column_stack([blocks, timestamps]).astype("<i8").tobytes())
+    os.replace(tmp_path, path)
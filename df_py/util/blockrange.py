@@ -1,13 +1,24 @@
+import os
+from typing import List, Optional
+
 import numpy
 from enforce_typing import enforce_types
 
 from df_py.util.blocktime import get_st_fin_blocks
+from df_py.util.constants import BLOCKRANGE_SAMPLING
 
 
 @enforce_types
 class BlockRange:
     def __init__(
-        self, st: int, fin: int, num_samples: int, random_seed=None, web3=None
+        self,
+        st: int,
+        fin: int,
+        num_samples: int,
+        random_seed=None,
+        web3=None,
+        *,
+        sampling: Optional[str] = None,
     ):
         """
         @arguments
@@ -15,6 +26,11 @@ class BlockRange:
           fin -- end block
           num_samples -- # blocks to randomly sample from (without replacement)
           random_seed -- pass in an integer for predictable sampling
+          sampling -- "generator": sample via a numpy Generator, without
+            building the list of candidate blocks. "legacy": the blocks
+            that df-py sampled for a given seed before, via numpy's global
+            random state. Default: envvar BLOCKRANGE_SAMPLING, or
+            "generator"
         """
         assert st >= 0
         assert fin > 0
@@ -24,20 +40,24 @@ class BlockRange:
         self.st: int = st
         self.fin: int = fin
 
-        cand_blocks = list(range(st, fin + 1))  # []
-
         if num_samples == 1:
             print("WARNING: num_samples=1, so not sampling")
             self._blocks = [fin]
             return
 
-        num_samples = min(num_samples, len(cand_blocks))
-        if random_seed is not None:
-            numpy.random.seed(random_seed)
+        if sampling is None:
+            sampling = os.getenv("BLOCKRANGE_SAMPLING", BLOCKRANGE_SAMPLING)
+        num_cand = fin - st + 1
+        num_samples = min(num_samples, num_cand)
+        if sampling == "generator":
+            rng = numpy.random.default_rng(random_seed)
+            offsets = sample_offsets(rng, num_cand, num_samples)
+        elif sampling == "legacy":
+            offsets = _legacy_sample_offsets(num_cand, num_samples, random_seed)
+        else:
+            raise ValueError(f"Unknown sampling '{sampling}'")
 
-        self._blocks = sorted(
-            numpy.random.choice(cand_blocks, num_samples, replace=False)
-        )
+        self._blocks = sorted(st + offset for offset in offsets)
 
         if web3:
             self.web3 = web3
@@ -68,6 +88,40 @@ class BlockRange:
         )
 
 
+@enforce_types
+def sample_offsets(rng: numpy.random.Generator, n: int, k: int) -> List[int]:
+    """
+    @description
+      Draw k distinct ints from [0, n) by Robert Floyd's algorithm: k random
+      draws and a set of size k, whatever n. Whereas rng.choice(n, k,
+      replace=False) may permute all of [0, n), and its stream may change
+      across numpy versions.
+
+    @return
+      offsets -- in the order drawn
+    """
+    assert 0 <= k <= n
+    highs = numpy.arange(n - k + 1, n + 1, dtype=numpy.int64)
+    draws = rng.integers(0, highs).tolist()  # draws[i] in [0, highs[i])
+    chosen: set = set()
+    offsets = []
+    for draw, j in zip(draws, (highs - 1).tolist()):
+        offset = j if draw in chosen else draw
+        chosen.add(offset)
+        offsets.append(offset)
+    return offsets
+
+
+@enforce_types
+def _legacy_sample_offsets(n: int, k: int, random_seed) -> List[int]:
+    """Like numpy.random.choice(range(n), k, replace=False) after seeding
+    numpy's global state, as BlockRange sampled originally. That permutes
+    all of [0, n), but as one int64 array rather than a list of ints"""
+    if random_seed is not None:
+        numpy.random.seed(random_seed)
+    return numpy.random.permutation(n)[:k].tolist()
+
+
 def create_range(web3, st, fin, samples, rndseed) -> BlockRange:
     st_block, fin_block = get_st_fin_blocks(web3, st, fin)
     rng = BlockRange(st_block, fin_block, samples, rndseed, web3=web3)
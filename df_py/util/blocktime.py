@@ -1,11 +1,13 @@
 from datetime import datetime, timedelta, timezone
-from math import ceil
-from typing import Union
+from math import ceil, floor
+from typing import Optional, Tuple, Union
 
 from enforce_typing import enforce_types
-from scipy import optimize
 from web3.main import Web3
 
+from df_py.util.block_cache import BlockTimestamps
+from df_py.util.constants import BLOCK_CACHE_CONFIRMATIONS
+
 
 @enforce_types
 def get_block_number_thursday(web3) -> int:
@@ -46,15 +48,37 @@ def timestr_to_block(web3, timestr: str, test_eth: bool = False) -> int:
       timestr -- str - YYYY-MM-DD | YYYY-MM-DD_HH:MM | YYYY-MM-DD_HH:MM:SS
     @return
       block -- int
+
+    @notes
+      Once the block found is final, it's remembered in the chain's block
+      cache. Then converting timestr again needs no RPC calls.
+      A timestamp within a spacing of one converted before, via the
+      chain's BlockIndex, takes ~1-3 RPC calls.
     """
     timestamp = timestr_to_timestamp(timestr)
-    if web3.eth.chain_id == 1 or test_eth:
+    blocks = BlockTimestamps(web3)
+    chainID = web3.eth.chain_id if blocks.cache is None else blocks.cache.chainID
+    method = "closest" if (chainID == 1 or test_eth) else "bisect"
+    key = f"{method}:{timestamp}"
+    if blocks.cache is not None:
+        block = blocks.cache.get_answer(key)
+        if block is not None:
+            return block
+
+    if method == "closest":
         # more accurate for mainnet
-        block = eth_timestamp_to_block(web3, timestamp)
-        block = eth_find_closest_block(web3, block, timestamp)
-        return block
+        if blocks.index is None:
+            block = eth_timestamp_to_block(web3, timestamp, blocks)
+        else:
+            block = _indexed_search(blocks, timestamp)
+        block = eth_find_closest_block(web3, block, timestamp, blocks)
+    else:
+        block = timestamp_to_block(web3, timestamp, blocks)
 
-    return timestamp_to_block(web3, timestamp)
+    if blocks.cache is not None:
+        blocks.cache.put_answer(key, block)
+        blocks.save()
+    return block
 
 
 @enforce_types
@@ -79,16 +103,23 @@ def timestr_to_timestamp(timestr: str) -> float:
 
 @enforce_types
 def timestamp_to_future_block(web3, timestamp: Union[float, int]) -> int:
-    def time_since_timestamp(block_i):
-        return web3.eth.get_block(int(block_i)).timestamp
-
-    block_last_number = web3.eth.get_block("latest").number
+    blocks = BlockTimestamps(web3)
+    block_last_number, block_last_time = blocks.latest()
 
     # 40,000 is the average number of blocks per week
     block_old_number = max(0, block_last_number - 40_000)  # go back 40,000 blocks
 
-    block_last_time = time_since_timestamp(block_last_number)  # time of last block
-    block_old_time = time_since_timestamp(block_old_number)  # time of old block
+    # time of old block. An index anchor near it will do, and is free
+    anchor = (
+        None
+        if blocks.index is None
+        else blocks.index.anchor_at_or_before(block_old_number)
+    )
+    if anchor is not None and block_old_number - anchor[0] < 40_000:
+        block_old_number, block_old_time = anchor
+    else:
+        block_old_time = blocks.timestamp(block_old_number)
+    blocks.save()
 
     assert block_last_time < timestamp
 
@@ -108,13 +139,14 @@ def timestamp_to_future_block(web3, timestamp: Union[float, int]) -> int:
 
 
 class BlockTimestampComparer:
-    def __init__(self, target_timestamp, web3):
+    def __init__(self, target_timestamp, web3, blocks=None):
         self.target_timestamp = target_timestamp
         self.web3 = web3
+        self.blocks = BlockTimestamps(web3) if blocks is None else blocks
 
     def time_since_timestamp(self, block_i):
         try:
-            block_timestamp = self.web3.eth.get_block(int(block_i)).timestamp
+            block_timestamp = self.blocks.timestamp(int(block_i))
         except Exception as e:
             print(f"An exception occurred while getting block {block_i}, {e}")
             block_timestamp = 0
@@ -122,40 +154,53 @@ class BlockTimestampComparer:
 
 
 @enforce_types
-def timestamp_to_block(web3, timestamp: Union[float, int]) -> int:
-    """Example: 1648872899.0 --> 4928"""
+def timestamp_to_block(
+    web3, timestamp: Union[float, int], blocks: Optional[BlockTimestamps] = None
+) -> int:
+    """
+    @description
+      Example: 1648872899.0 --> 4928. Returns the first block at or after
+      timestamp, found by search_block().
+
+    @arguments
+      web3 -- web3 instance
+      timestamp -- unix time
+      blocks -- BlockTimestamps to fetch with. Default: a new one. Its
+        rpc_calls says how many RPC calls the lookup used
+    """
+    if blocks is None:
+        blocks = BlockTimestamps(web3)
+    rpc_calls0 = blocks.rpc_calls
+
+    index = blocks.index
+    bracket = None if index is None else index.bracket(timestamp)
+    if index is not None and bracket is not None:
+        # between 2 final anchors: the head doesn't matter
+        block_i = search_block(blocks, timestamp, bracket)
+        index.add_around(blocks, block_i, bracket[2])
+    else:
+        a, a_ts = 0, blocks.timestamp(0)
+        b, b_ts = blocks.latest()
+
+        if a_ts > timestamp and b_ts > timestamp:  # corner case: all in the past
+            if web3.eth.chain_id == 8996:
+                return 0  # this situation is feasible on testnet
+
+            # on other networks, the target will never be 0
+            raise ValueError("timestamp_to_block() everything is in the past")
 
-    f = BlockTimestampComparer(timestamp, web3).time_since_timestamp
-    a = 0
-    b = web3.eth.get_block("latest").number
-
-    if f(a) > 0 and f(b) > 0:  # corner case: everything's in the past
-        if web3.eth.chain_id == 8996:
-            return 0  # this situation is feasible on testnet
-
-        # on other networks, the target will never be 0
-        raise ValueError("timestamp_to_block() everything is in the past")
-
-    if f(a) < 0 and f(b) < 0:  # corner case: everything's in the future
-        return web3.eth.get_block("latest").number
-
-    # pylint: disable=unused-variable
-    (block_i, results) = optimize.bisect(f, a, b, xtol=0.4, full_output=True)
-
-    # uncomment to debug
-    # ---
-    # print(f"iterations = {results.iterations}")
-    # print(f"function calls = {results.function_calls}")
-    # print(f"converged? {results.converged}")
-    # print(f"cause of termination? {results.flag}")
-    # print("")
-    # print(f"target timestamp = {timestamp}")
-    # print(f"distToTargetTimestamp(a=0) = {f(0)}")
-    # print(f"distToTargetTimestamp(b={b}) = {f(b)}")
-    # print(f"distToTargetTimestamp(result=block_i={block_i}) = {f(block_i)}")
-    # ---
-    block_found = web3.eth.get_block(int(block_i))
-    block_timestamp = block_found.timestamp
+        if a_ts < timestamp and b_ts < timestamp:  # corner case: all in future
+            return b
+
+        if timestamp <= a_ts:
+            block_i = a
+        else:
+            bracket = _narrow_by_index(blocks, timestamp, (a, a_ts, b, b_ts))
+            block_i = search_block(blocks, timestamp, bracket)
+            if index is not None:
+                index.add_around(blocks, block_i, b - BLOCK_CACHE_CONFIRMATIONS)
+    block_timestamp = blocks.timestamp(block_i)
+    blocks.save()
 
     if abs(block_timestamp - timestamp) > 60 * 15:
         # pylint: disable=line-too-long
@@ -176,77 +221,267 @@ def timestamp_to_block(web3, timestamp: Union[float, int]) -> int:
         timestamp,
         "diff",
         abs(block_timestamp - timestamp),
+        "RPC calls",
+        blocks.rpc_calls - rpc_calls0,
     )
-    return int(block_i)
+    return block_i
+
+
+@enforce_types
+def search_block(
+    blocks: BlockTimestamps,
+    timestamp: Union[float, int],
+    bracket: Tuple[int, int, int, int],
+) -> int:
+    """
+    @description
+      Given bracket = (lo, lo_ts, hi, hi_ts), blocks lo & hi and their
+      timestamps, return the first block in (lo, hi] whose timestamp is
+      >= timestamp. Needs lo_ts < timestamp <= hi_ts.
+
+      Each guess is a secant step: from the 2 latest probes, at the block
+      rate measured between them, plus a margin so that the guess likely
+      lands just past the target, bracketing it tightly. If it lands on
+      the same side as before, the margin doubles (galloping).
+      Where timestamps aren't monotonic, or the bracket fails to halve
+      for a few steps, it bisects instead.
+
+    @notes
+      With steady block times, that takes ~2 probes; with drifting &
+      jittery ones, ~10. Plain bisection takes ~log2(# blocks) + 3, e.g.
+      29 on Polygon.
+    """
+    lo, lo_ts, hi, hi_ts = bracket
+    assert lo_ts < timestamp <= hi_ts, (lo, lo_ts, timestamp, hi, hi_ts)
+    probes = [(lo, lo_ts), (hi, hi_ts)]  # latest 2, for the secant
+    margin = 1
+    went_up = None  # whether the last probe moved lo
+    n_slow = 0  # consecutive steps that didn't halve the bracket
+    monotonic = True
+
+    while hi - lo > 1:
+        guess = None
+        if monotonic and n_slow < 3:
+            guess = _secant_guess(probes, timestamp, margin, (lo, lo_ts, hi, hi_ts))
+        if guess is None or not lo < guess < hi:
+            guess = (lo + hi) // 2
+
+        guess_ts = blocks.timestamp(guess)
+        if not lo_ts <= guess_ts <= hi_ts:
+            monotonic = False  # this segment can't be interpolated
+
+        width = hi - lo
+        up = guess_ts < timestamp
+        if up:
+            lo, lo_ts = guess, guess_ts
+        else:
+            hi, hi_ts = guess, guess_ts
+        margin = margin * 2 if up == went_up else 1
+        went_up = up
+        n_slow = n_slow + 1 if 2 * (hi - lo) > width else 0
+        probes = [probes[1], (guess, guess_ts)]
+
+    return hi
+
+
+def _indexed_search(blocks: BlockTimestamps, timestamp: Union[float, int]) -> int:
+    """
+    @description
+      Return the first block at or after timestamp, via the BlockIndex.
+      Or the first or latest block, if timestamp is outside the chain.
+
+      Then add the anchors around that block, if they aren't there yet:
+      at most 2 RPC calls. So another timestamp near it, e.g. of the same
+      date on a later run, gets bracketed within one spacing.
+    """
+    index = blocks.index
+    assert index is not None
+    bracket = index.bracket(timestamp)
+    if bracket is not None:
+        final = bracket[2]  # anchors are final blocks
+    else:
+        b, b_ts = blocks.latest()
+        a, a_ts = 0, blocks.timestamp(0)
+        if timestamp > b_ts:
+            return b
+        if timestamp <= a_ts:
+            return a
+        bracket = _narrow_by_index(blocks, timestamp, (a, a_ts, b, b_ts))
+        final = b - BLOCK_CACHE_CONFIRMATIONS
+
+    block = search_block(blocks, timestamp, bracket)
+    index.add_around(blocks, block, final)
+    return block
+
+
+def _narrow_by_index(
+    blocks: BlockTimestamps,
+    timestamp: Union[float, int],
+    bracket: Tuple[int, int, int, int],
+) -> Tuple[int, int, int, int]:
+    """
+    @description
+      Narrow bracket, of timestamp as search_block() takes it, by the
+      anchors of the chain's BlockIndex, for a timestamp that's past the
+      last anchor or before the first. No RPC calls.
+    """
+    index = blocks.index
+    if index is None or len(index) == 0:
+        return bracket
+
+    lo, lo_ts, hi, hi_ts = bracket
+    last = index.anchor_at_or_before(hi)
+    if last is not None and lo < last[0] and last[1] < timestamp:
+        return last[0], last[1], hi, hi_ts
+    first, first_ts = int(index.blocks[0]), int(index.timestamps[0])
+    if lo < first < hi and timestamp <= first_ts:
+        return lo, lo_ts, first, first_ts
+    return bracket
+
+
+def _secant_guess(probes, timestamp, margin, bracket) -> Optional[int]:
+    """Guess of search_block(), or None if there's no usable block rate"""
+    lo, lo_ts, hi, hi_ts = bracket
+    (b1, t1), (b2, t2) = probes
+    if b1 != b2 and (t2 - t1) / (b2 - b1) > 0:
+        secs_per_block = (t2 - t1) / (b2 - b1)
+    else:
+        secs_per_block = (hi_ts - lo_ts) / (hi - lo)  # > 0, as bracketed
+    est = b2 + (timestamp - t2) / secs_per_block  # where ts == timestamp
+
+    # the answer is ceil(est). Aim past it, on the far side from b2
+    if est > b2:
+        return ceil(est) + margin - 1
+    return ceil(est) - margin
 
 
 @enforce_types
-def eth_timestamp_to_block(web3, timestamp: Union[float, int]) -> int:
+def eth_timestamp_to_block(
+    web3, timestamp: Union[float, int], blocks: Optional[BlockTimestamps] = None
+) -> int:
     """Example: 1648872899.0 --> 4928"""
-    block = web3.eth.get_block("latest")
-    current_block = block.number
-    current_time = block.timestamp
-    return eth_calc_block_number(
-        int(current_time), int(current_block), int(timestamp), web3
+    if blocks is None:
+        blocks = BlockTimestamps(web3)
+    current_block, current_time = blocks.latest()
+    block = eth_calc_block_number(
+        current_time, current_block, int(timestamp), web3, blocks
     )
+    blocks.save()
+    return block
 
 
 @enforce_types
-def eth_calc_block_number(ts: int, block: int, target_ts: int, web3):
+def eth_calc_block_number(
+    ts: int,
+    block: int,
+    target_ts: int,
+    web3,
+    blocks: Optional[BlockTimestamps] = None,
+):
+    """
+    @description
+      Estimate the block at target_ts, stepping from block (at ts) at the
+      average mainnet block time, until within 5 blocks' time. At most
+      MAX_CALC_STEPS steps; then the latest estimate is returned as is,
+      and eth_find_closest_block() is left to finish the job.
+    """
+    if blocks is None:
+        blocks = BlockTimestamps(web3)
     AVG_BLOCK_TIME = 12.06  # seconds
-    diff = target_ts - ts
-    diff_blocks = int(diff // AVG_BLOCK_TIME)
-    block += diff_blocks
-    ts_found = web3.eth.get_block(block).timestamp
-    if abs(ts_found - target_ts) > 12 * 5:
-        return eth_calc_block_number(ts_found, block, target_ts, web3)
+    for _ in range(MAX_CALC_STEPS):
+        diff = target_ts - ts
+        diff_blocks = int(diff // AVG_BLOCK_TIME)
+        block = min(max(0, block + diff_blocks), blocks.head_number())
+        ts = blocks.timestamp(block)
+        if abs(ts - target_ts) <= 12 * 5:
+            break
 
     return block
 
 
+# max # steps of eth_calc_block_number()
+MAX_CALC_STEPS = 10
+
+
 @enforce_types
 def eth_find_closest_block(
-    web3: Web3, block_number: int, timestamp: Union[float, int]
+    web3: Web3,
+    block_number: int,
+    timestamp: Union[float, int],
+    blocks: Optional[BlockTimestamps] = None,
 ) -> int:
     """
     @arguments
         web3 -- Web3 instance
-        block_number -- int
+        block_number -- int -- where to start, ideally near the answer
         timestamp -- int
+        blocks -- BlockTimestamps to fetch with. Default: a new one
     @return
         block_number -- int
     @description
-        Finds the closest block number to given timestamp
+        Finds the closest block number to given timestamp. Of 2 blocks
+        that are equally close: the earlier one if block_number's
+        timestamp is > timestamp, else the later one.
+
+        Gallops away from block_number (1, 2, 4, .. blocks) until past
+        timestamp, then narrows in with search_block(). That's
+        O(log distance) RPC calls, vs 1 per block of distance for a walk.
     """
 
-    block_ts = web3.eth.get_block(block_number).timestamp  # type: ignore[attr-defined]
-    found = block_number
+    if blocks is None:
+        blocks = BlockTimestamps(web3)
+    block_ts = blocks.timestamp(block_number)
 
-    last = None
     if block_ts > timestamp:
-        # search backwards
-        while True:
-            last = found
-            found -= 1
-            if web3.eth.get_block(found).timestamp < timestamp:  # type: ignore[attr-defined]
-                break
+        # search backwards, for the last block before timestamp
+        bracket = _gallop(blocks, block_number, block_ts, -1, lambda ts: ts < timestamp)
+        last = search_block(blocks, timestamp, bracket)
+        found = last - 1
 
     else:
-        # search forwards
-        while True:
-            last = found
-            found += 1
-            if web3.eth.get_block(found).timestamp > timestamp:  # type: ignore[attr-defined]
-                break
-
-    if abs(web3.eth.get_block(last).timestamp - timestamp) < abs(  # type: ignore[attr-defined]
-        web3.eth.get_block(found).timestamp - timestamp  # type: ignore[attr-defined]
+        # search forwards, for the first block after timestamp
+        bracket = _gallop(blocks, block_number, block_ts, 1, lambda ts: ts > timestamp)
+        found = search_block(blocks, floor(timestamp) + 1, bracket)
+        last = found - 1
+
+    if abs(blocks.timestamp(last) - timestamp) < abs(
+        blocks.timestamp(found) - timestamp
     ):
         found = last
 
+    blocks.save()
     return found
 
 
+def _gallop(blocks, block: int, block_ts: int, direction: int, is_past):
+    """
+    @description
+      From block, probe 1, 2, 4, .. blocks away in direction (+1 or -1),
+      until a probe's timestamp is_past().
+
+    @return
+      lo, lo_ts, hi, hi_ts -- the bracket, as search_block() takes it:
+        the last probe that wasn't past, and the first one that was
+    """
+    near, near_ts = block, block_ts
+    end = 0 if direction < 0 else blocks.head_number()
+    step = 1
+    while True:
+        if near == end:
+            raise ValueError(f"eth_find_closest_block(): no block past {end}")
+        far = near + direction * step
+        far = max(far, end) if direction < 0 else min(far, end)
+        far_ts = blocks.timestamp(far)
+        if is_past(far_ts):
+            break
+        near, near_ts = far, far_ts
+        step *= 2
+
+    if direction > 0:
+        return near, near_ts, far, far_ts
+    return far, far_ts, near, near_ts
+
+
 @enforce_types
 def get_fin_block(web3, FIN):
     fin_block = 0
@@ -0,0 +1,277 @@
+"""Recompute rewards for many past DF weeks at once.
+
+Usage: put each week's csvs (from `dftool volsym`, `allocations`,
+`vebals`, `predictoor_data` etc) in its own folder under one dir, then
+call calc_history() on that dir. Rewards csvs are written into each
+week's folder, like `dftool calc` does.
+
+No queries are made: each week's predictoor feeds come from its
+predictoor_contracts.csv, not from today's subgraph. A week without one,
+e.g. from before Predictoor, has no feeds.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from enforce_typing import enforce_types
+
+from df_py.predictoor import csvs as predictoor_csvs
+from df_py.predictoor.calc_rewards import calc_predictoor_rewards
+from df_py.util.constants import SAPPHIRE_MAINNET_CHAINID
+from df_py.volume import csvs
+from df_py.volume.calc_rewards import calc_volume_rewards_from_csvs
+
+WEEK_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+@enforce_types
+def calc_history(
+    history_dir: str,
+    volume_tot_ocean: float,
+    predictoor_tot_rose: float,
+    n_workers: Optional[int] = None,
+    overwrite: bool = False,
+) -> List[dict]:
+    """
+    @description
+      Compute volume and predictoor rewards for each week folder in
+      history_dir, spread across a process pool. Each week's rewards csvs
+      are written into its folder.
+
+    @arguments
+      history_dir -- dir holding one folder of csvs per week
+      volume_tot_ocean -- OCEAN for volume rewards, per week. 0 = skip
+      predictoor_tot_rose -- ROSE for predictoor rewards, per week. 0 = skip
+      n_workers -- # processes. If None, the # of cpus
+      overwrite -- if True, replace rewards csvs left by an earlier run.
+        Otherwise skip the substreams that already have them
+
+    @return
+      timings -- list of dict, one per week in folder order, with keys:
+        week, volume_s, predictoor_s, total_s, error
+
+    @notes
+      A week folder whose name has a YYYY-MM-DD date uses it as the week's
+      start date, which sets the DF week for the DCV multiplier.
+      A failed week doesn't stop the others; see its "error". E.g. a
+      week without a predictoor_contracts.csv fails, if predictoor_tot_rose
+      > 0. (Its volume rewards are fine: it just has no predictoor feeds.)
+      Weeks' symbols & rates csvs are parsed just once, in this process,
+      and identical files are shared across weeks.
+    """
+    week_dirs = week_folders(history_dir)
+    shared = _load_symbols_and_rates(week_dirs) if volume_tot_ocean > 0 else {}
+
+    tasks = []
+    for week_dir in week_dirs:
+        SYM, R = shared.get(week_dir, (None, None))
+        tasks.append(
+            {
+                "week_dir": week_dir,
+                "start_date": week_start_date(week_dir),
+                "volume_tot_ocean": volume_tot_ocean,
+                "predictoor_tot_rose": predictoor_tot_rose,
+                "SYM": SYM,
+                "R": R,
+                "overwrite": overwrite,
+            }
+        )
+
+    if n_workers == 1:
+        return [_calc_week(**task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(_calc_week, **task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+@enforce_types
+def week_folders(history_dir: str) -> List[str]:
+    """Return the week folders in history_dir, sorted by name"""
+    names = sorted(os.listdir(history_dir))
+    paths = [os.path.join(history_dir, name) for name in names]
+    return [path for path in paths if os.path.isdir(path)]
+
+
+@enforce_types
+def week_start_date(week_dir: str) -> Optional[datetime]:
+    """Return the YYYY-MM-DD date in the folder's name, if any"""
+    match = WEEK_DATE_RE.search(os.path.basename(os.path.normpath(week_dir)))
+    if match is None:
+        return None
+    return datetime.strptime(match.group(0), "%Y-%m-%d")
+
+
+@enforce_types
+def history_table(timings: List[dict]) -> str:
+    """
+    @return
+      table -- timings from calc_history(), one line per week, and a total
+    """
+    lines = [f"{'week':>24} {'volume_s':>9} {'predictoor_s':>12} {'total_s':>8}  error"]
+    for t in timings:
+        lines.append(
+            f"{os.path.basename(t['week']):>24} {_secs(t['volume_s']):>9} "
+            f"{_secs(t['predictoor_s']):>12} {_secs(t['total_s']):>8}  "
+            f"{t['error'] or ''}"
+        )
+    total = sum(t["total_s"] for t in timings)
+    n_failed = sum(1 for t in timings if t["error"])
+    lines.append(f"{len(timings)} weeks, {n_failed} failed, {total:.2f}s in total")
+    return "\n".join(lines)
+
+
+# ========================================================================
+# helpers
+
+
+def _calc_week(
+    week_dir: str,
+    start_date: Optional[datetime],
+    *,
+    volume_tot_ocean: float,
+    predictoor_tot_rose: float,
+    SYM: Optional[dict],
+    R: Optional[dict],
+    overwrite: bool,
+) -> dict:
+    """
+    @description
+      Compute rewards for one week. Top-level, so that a process pool can
+      pickle it.
+
+    @return
+      timing -- dict, see calc_history()
+    """
+    timing: dict = {
+        "week": week_dir,
+        "volume_s": None,
+        "predictoor_s": None,
+        "total_s": 0.0,
+        "error": None,
+    }
+    t0 = time.time()
+    try:
+        if volume_tot_ocean > 0:
+            t = time.time()
+            if _clear_outputs(_volume_outputs(week_dir), overwrite):
+                calc_volume_rewards_from_csvs(
+                    week_dir,
+                    start_date,
+                    volume_tot_ocean,
+                    SYM=SYM,
+                    R=R,
+                    wait_for_subgraph=False,
+                    predictoor_feed_addrs=_predictoor_feed_addrs(week_dir),
+                )
+                timing["volume_s"] = time.time() - t
+
+        if predictoor_tot_rose > 0:
+            t = time.time()
+            outputs = [predictoor_csvs.predictoor_rewards_csv_filename(week_dir)]
+            if _clear_outputs(outputs, overwrite):
+                _calc_predictoor_week(week_dir, predictoor_tot_rose)
+                timing["predictoor_s"] = time.time() - t
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        timing["error"] = f"{type(e).__name__}: {e}"
+
+    timing["total_s"] = time.time() - t0
+    return timing
+
+
+def _calc_predictoor_week(week_dir: str, tot_rose: float):
+    """Like `dftool calc predictoor_rose`, for a past week"""
+    predictoors = predictoor_csvs.load_predictoor_data_csv(week_dir)
+    contract_addrs = list(_load_predictoor_contracts(week_dir).keys())
+
+    rewards = calc_predictoor_rewards(
+        predictoors, tot_rose, SAPPHIRE_MAINNET_CHAINID, contract_addrs
+    )
+    predictoor_csvs.save_predictoor_rewards_csv(rewards, week_dir)
+
+
+def _predictoor_feed_addrs(week_dir: str) -> Dict[int, List[str]]:
+    """Return dict of [chainID] : list of the week's predictoor feeds.
+    Empty if there's no predictoor_contracts.csv, e.g. before Predictoor"""
+    feed_addrs: Dict[int, List[str]] = {}
+    filename = predictoor_csvs.predictoor_contracts_csv_filename(week_dir)
+    if not os.path.exists(filename):
+        return feed_addrs
+    for contract in _load_predictoor_contracts(week_dir).values():
+        feed_addrs.setdefault(contract.chainid, []).append(contract.address)
+    return feed_addrs
+
+
+def _load_predictoor_contracts(week_dir: str) -> dict:
+    """
+    @description
+      Load the week's predictoor_contracts.csv. Past weeks need the
+      contracts of that week, not today's, so there's no falling back to
+      a query.
+
+    @raises
+      FileNotFoundError -- if there's no such csv
+    """
+    filename = predictoor_csvs.predictoor_contracts_csv_filename(week_dir)
+    if not os.path.exists(filename):
+        raise FileNotFoundError(
+            f"{filename} is missing. Get it via `dftool predictoor_data`"
+        )
+    return predictoor_csvs.load_predictoor_contracts_csv(week_dir)
+
+
+def _volume_outputs(week_dir: str) -> List[str]:
+    return [
+        csvs.volume_rewards_csv_filename(week_dir),
+        csvs.volume_rewardsinfo_csv_filename(week_dir),
+    ]
+
+
+def _clear_outputs(filenames: List[str], overwrite: bool) -> bool:
+    """
+    @return
+      go -- True if none of filenames exist (any more). If overwrite,
+        delete them first
+    """
+    existing = [f for f in filenames if os.path.exists(f)]
+    if existing and not overwrite:
+        return False
+    for f in existing:
+        os.remove(f)
+    return True
+
+
+def _load_symbols_and_rates(week_dirs: List[str]) -> Dict[str, Tuple[dict, dict]]:
+    """
+    @return
+      shared -- dict of [week_dir] : (symbols, rates). Weeks whose csvs
+        are the same share the same parsed dicts
+    """
+    symbols: dict = {}  # [contents of symbols csvs] : symbols
+    rates: dict = {}  # [contents of rate csvs] : rates
+    shared = {}
+    for week_dir in week_dirs:
+        sym_key = _contents(csvs.symbols_csv_filenames(week_dir))
+        if sym_key not in symbols:
+            symbols[sym_key] = csvs.load_symbols_csvs(week_dir)
+        rate_key = _contents(csvs.rate_csv_filenames(week_dir))
+        if rate_key not in rates:
+            rates[rate_key] = csvs.load_rate_csvs(week_dir)
+        shared[week_dir] = (symbols[sym_key], rates[rate_key])
+    return shared
+
+
+def _contents(filenames: List[str]) -> tuple:
+    contents = []
+    for filename in sorted(filenames):
+        with open(filename, "rb") as f:
+            contents.append((os.path.basename(filename), f.read()))
+    return tuple(contents)
+
+
+def _secs(s: Optional[float]) -> str:
+    return "-" if s is None else f"{s:.2f}"
@@ -0,0 +1,141 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from collections import deque
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    TypeVar,
+)
+
+from enforce_typing import enforce_types
+
+T = TypeVar("T")
+
+# event loop that runs coroutines for sync callers; see run_sync()
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop for sync callers, starting it if needed"""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_LOOP.run_forever, name="df_py-asyncio", daemon=True
+            )
+            thread.start()
+    return _LOOP
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    @description
+      Run a coroutine to completion from sync code, and return its result.
+
+      All sync callers share one event loop running in a background thread,
+      so state tied to a loop (aiohttp sessions, semaphores) lives across
+      calls. If the caller is interrupted, the coroutine is cancelled.
+
+    @raises
+      RuntimeError -- if called from a coroutine on the shared loop itself;
+        await the coroutine instead
+    """
+    loop = background_loop()
+    if _running_loop() is loop:
+        raise RuntimeError("run_sync() called from its own event loop")
+
+    future: concurrent.futures.Future[T] = asyncio.run_coroutine_threadsafe(
+        coro, loop  # type: ignore[arg-type]
+    )
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def iterate_sync(agen: AsyncIterator[T]) -> Iterator[T]:
+    """
+    @description
+      Iterate over an async generator from sync code, one item at a time.
+      See run_sync(). If the consumer stops early, the generator is closed.
+    """
+    try:
+        while True:
+            try:
+                item = run_sync(_anext(agen))
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            run_sync(aclose())
+
+
+async def _anext(agen: AsyncIterator[T]) -> T:
+    """Like the anext() builtin, which is Python >= 3.10. Dockerfile: 3.8"""
+    async for item in agen:
+        return item
+    raise StopAsyncIteration
+
+
+async def run_in_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking func (e.g. a web3 call) without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+
+@enforce_types
+async def ordered_map(
+    func: Callable, items: Iterable, max_workers: int
+) -> AsyncIterator:
+    """
+    @description
+      Like map(func, items) for an async func, but with up to max_workers
+      calls in flight. Results are yielded in the order of `items`,
+      whatever order they finish in, so consumers see exactly what a
+      serial loop would.
+
+    @arguments
+      func -- async function of one argument, called once per item
+      items -- arguments to func. Consumed lazily, as workers free up
+      max_workers -- max # calls in flight. <= 1 means run serially
+
+    @return
+      results -- async iterator of func(item), in order of items
+
+    @notes
+      At most max_workers results are held ahead of the consumer, to
+      bound memory when each result is large.
+    """
+    max_workers = max(1, max_workers)
+    tasks: deque = deque()
+    try:
+        for item in items:
+            tasks.append(asyncio.ensure_future(func(item)))
+            if len(tasks) >= max_workers:
+                yield await tasks.popleft()
+
+        while tasks:
+            yield await tasks.popleft()
+    finally:
+        # consumer stopped early or a call failed: drop pending work
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
@@ -25,6 +25,35 @@ DO_RANK = True
 RANK_SCALE_OP = "LOG"  # can be: LIN, POW2, POW4, LOG, SQRT
 MAX_N_RANK_ASSETS = 100  # only reward top N assets. Eg 20, 50, 100, 500
 
+# subgraph: max # sampled blocks to query concurrently.
+# Override per chain with envvar <NETWORK>_SUBGRAPH_MAX_WORKERS
+SUBGRAPH_MAX_WORKERS = 4
+
+# subgraph: max # requests per second to one chain's subgraph.
+# Override per chain with envvar <NETWORK>_SUBGRAPH_MAX_RPS
+SUBGRAPH_MAX_RPS = 10.0
+
+# subgraph: max # requests in flight over all chains, per event loop
+SUBGRAPH_MAX_CONCURRENCY = 16
+
+# subgraph: on-disk cache of responses for queries pinned to final blocks.
+# A block counts as final once it's this many blocks below the chain head
+SUBGRAPH_CACHE_FILE = "~/.dfpy/subgraph_cache.db"
+SUBGRAPH_CACHE_MAX_MB = 1024
+SUBGRAPH_CACHE_CONFIRMATIONS = 256
+
+# blocktime: per-chain files of block timestamps, for date -> block. Only
+# blocks this many below the chain head are cached
+BLOCK_CACHE_DIR = "~/.dfpy/block_timestamps"
+BLOCK_CACHE_CONFIRMATIONS = 256
+
+# blocktime: per-chain index of the timestamps of some multiples of this
+# block. Each date -> block conversion adds at most the 2 around its block
+BLOCK_INDEX_SPACING = 10_000
+
+# how BlockRange samples blocks: "generator" or "legacy"
+BLOCKRANGE_SAMPLING = "generator"
+
 # multisig
 MULTISIG_ADDRS = {
     1: "0xad0A852F968e19cbCB350AB9426276685651ce41",  # mainnet
@@ -21,13 +21,15 @@ Usage: dftool get_rate|volsym|allocations.. ARG1 ARG2 ..
   dftool help - full command list
 
   dftool get_rate TOKEN_SYMBOL ST FIN CSV_DIR --RETRIES
-  dftool volsym ST FIN NSAMP CSV_DIR CHAINID --RETRIES - query chain, output volumes, symbols, owners
-  dftool allocations ST FIN NSAMP CSV_DIR CHAINID --RETRIES
-  dftool vebals ST FIN NSAMP CSV_DIR CHAINID --RETRIES
+  dftool volsym ST FIN NSAMP CSV_DIR CHAINID --RETRIES --no-cache - query chain, output volumes, symbols, owners
+  dftool allocations ST FIN NSAMP CSV_DIR CHAINID --RETRIES --no-cache
+  dftool vebals ST FIN NSAMP CSV_DIR CHAINID --RETRIES --no-cache
   dftool predictoor_data START_DATE END_DATE CSV_DIR CHAINID --RETRIES
   dftool calc volume|predictoor CSV_DIR TOT_OCEAN START_DATE - from stakes/etc csvs (or predictoor/volume data csvs), output rewards
+  dftool sweep CSV_DIR TOT_OCEAN --START_DATE --RANK_SCALE_OPS --MAX_N_RANK_ASSETS --TARGET_WPYS --DO_PUBREWARDS --TOPK --WORKERS - from stakes/etc csvs, output volume rewards summary for each combination of reward params
+  dftool calc_history HISTORY_DIR VOLUME_TOT_OCEAN --PREDICTOOR_TOT_ROSE --WORKERS --OVERWRITE - from a dir of weekly csv folders, output rewards csvs for each week, in parallel
   dftool dispense_active CSV_DIR CHAINID --DFREWARDS_ADDR --TOKEN_ADDR --BATCH_NBR - from rewards, dispense funds
-  dftool nftinfo CSV_DIR CHAINID -- Query chain, output nft info csv
+  dftool nftinfo CSV_DIR CHAINID --no-cache -- Query chain, output nft info csv
 
   dftool new_acct - generate new account
   dftool init_dev_wallets CHAINID - Init wallets with OCEAN. (GANACHE ONLY)
@@ -36,6 +38,7 @@ Usage: dftool get_rate|volsym|allocations.. ARG1 ARG2 ..
   dftool chain_info CHAINID - info about a network
 
   dftool mine TIMEDELTA - force chain to pass time (ganache only)
+  dftool fake_subgraph PORT --dataset --recordings --upstream --SEED --save - serve a fake subgraph, from a synthetic dataset or recorded responses (for offline testing)
 
   dftool new_veallocate CHAINID - deploy veAllocate (for testing)
   dftool ve_set_allocation CHAINID amount TOKEN_ADDR - Allocate weight to veAllocate contract. Set to 0 to reset. (for testing)
@@ -48,6 +51,7 @@ Usage: dftool get_rate|volsym|allocations.. ARG1 ARG2 ..
   dftool checkpoint_feedist CHAINID - checkpoint FeeDistributor contract
 
 Transactions are signed with envvar 'DFTOOL_KEY`.
+Add --fast to any command to skip runtime type checks (same as envvar ENFORCE_TYPES=0).
 """
 
 
@@ -119,6 +123,28 @@ def block_or_valid_date(s: str):
     raise argparse.ArgumentTypeError(msg)
 
 
+def comma_separated(cast):
+    """Argparse type: comma-separated list of values, each passed to cast()"""
+
+    def _parse(s: str) -> list:
+        try:
+            return [cast(item.strip()) for item in s.split(",") if item.strip()]
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e)) from e
+
+    return _parse
+
+
+@enforce_types
+def bool_str(s: str) -> bool:
+    if s.lower() in ["true", "1", "yes"]:
+        return True
+    if s.lower() in ["false", "0", "no"]:
+        return False
+
+    raise ValueError(f"not a valid bool: {s}")
+
+
 @enforce_types
 def existing_path(s: str):
     if not os.path.exists(s):
@@ -189,6 +215,11 @@ class StartFinArgumentParser(argparse.ArgumentParser):
             help="# times to retry failed queries",
             required=False,
         )
+        self.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="don't read or write the on-disk caches of subgraph responses & block timestamps",
+        )
 
 
 @enforce_types
@@ -21,10 +21,26 @@ from df_py.predictoor.calc_rewards import (
     calc_predictoor_rewards,
 )
 from df_py.predictoor.queries import query_predictoor_contracts, query_predictoors
-from df_py.util import blockrange, dispense, get_rate, networkutil, oceantestutil
+from df_py.util import (
+    block_cache,
+    blockrange,
+    dispense,
+    fake_subgraph,
+    get_rate,
+    networkutil,
+    oceantestutil,
+    query_cache,
+)
 from df_py.util.base18 import from_wei, to_wei
+from df_py.util.calc_history import calc_history, history_table
 from df_py.util.blocktime import get_fin_block, timestr_to_timestamp
-from df_py.util.constants import SAPPHIRE_MAINNET_CHAINID
+from df_py.util.constants import (
+    DO_PUBREWARDS,
+    MAX_N_RANK_ASSETS,
+    RANK_SCALE_OP,
+    SAPPHIRE_MAINNET_CHAINID,
+    TARGET_WPY,
+)
 from df_py.util.contract_base import ContractBase
 from df_py.util.dftool_arguments import (
     CHAINID_EXAMPLES,
@@ -33,7 +49,9 @@ from df_py.util.dftool_arguments import (
     StartFinArgumentParser,
     autocreate_path,
     block_or_valid_date,
+    bool_str,
     chain_type,
+    comma_separated,
     do_help_long,
     existing_path,
     print_arguments,
@@ -53,13 +71,18 @@ from df_py.util.oceanutil import (
     record_deployed_contracts,
     veAllocate,
 )
+from df_py.util.request import print_connection_stats
 from df_py.util.retry import retry_function
 from df_py.util.vesting_schedule import (
     get_active_reward_amount_for_week_eth_by_stream,
 )
 from df_py.volume import csvs, queries
 from df_py.util.reward_shaper import RewardShaper
-from df_py.volume.calc_rewards import calc_volume_rewards_from_csvs
+from df_py.volume.calc_rewards import (
+    calc_volume_rewards_from_csvs,
+    sweep_volume_rewards_from_csvs,
+)
+from df_py.volume.sweep import sweep_table
 
 
 @enforce_types
@@ -69,6 +92,7 @@ def do_volsym():
         epilog=f"""Uses these envvars:
           \nADDRESS_FILE -- eg: export ADDRESS_FILE={networkutil.chain_id_to_address_file(chainID=DEV_CHAINID)}
           \nSECRET_SEED -- secret integer used to seed the rng
+          \nBLOCKRANGE_SAMPLING -- 'legacy' to sample the blocks that df-py sampled for a seed before; default 'generator'
         """,
         command_name="volsym",
         csv_names="nftvols-CHAINID.csv, owners-CHAINID.csv, symbols-CHAINID.csv",
@@ -82,6 +106,7 @@ def do_volsym():
     SECRET_SEED = _getSecretSeedOrExit()
 
     csv_dir, chain_id = arguments.CSV_DIR, arguments.CHAINID
+    _setupQueryCache(arguments)
 
     # check files, prep dir
     if not csvs.rate_csv_filenames(csv_dir):
@@ -104,6 +129,8 @@ def do_volsym():
     csvs.save_owners_csv(Ci, csv_dir, chain_id)
     csvs.save_symbols_csv(SYMi, csv_dir, chain_id)
 
+    _printCacheAndConnectionStats()
+
     print("dftool volsym: Done")
 
 
@@ -125,12 +152,18 @@ def do_nftinfo():
         help="last block # to calc on | YYYY-MM-DD | YYYY-MM-DD_HH:MM | latest",
         required=False,
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="don't read or write the on-disk caches of subgraph responses & block timestamps",
+    )
 
     arguments = parser.parse_args()
     print_arguments(arguments)
 
     # extract inputs
     csv_dir, chain_id, end_block = arguments.CSV_DIR, arguments.CHAINID, arguments.FIN
+    _setupQueryCache(arguments)
 
     # hardcoded values
     # -queries.queryNftinfo() can be problematic; it's only used for frontend data
@@ -151,6 +184,8 @@ def do_nftinfo():
     )
     csvs.save_nftinfo_csv(nftinfo, csv_dir, chain_id)
 
+    _printCacheAndConnectionStats()
+
     print("dftool nftinfo: Done")
 
 
@@ -163,6 +198,7 @@ def do_allocations():
         description="Query chain, outputs allocation csv",
         epilog="""Uses these envvars:
           \nSECRET_SEED -- secret integer used to seed the rng
+          \nBLOCKRANGE_SAMPLING -- 'legacy' to sample the blocks that df-py sampled for a seed before; default 'generator'
         """,
         command_name="allocations",
         csv_names="allocations.csv or allocations_realtime.csv",
@@ -172,6 +208,7 @@ def do_allocations():
     print_arguments(arguments)
 
     csv_dir, n_samp, chain_id = arguments.CSV_DIR, arguments.NSAMP, arguments.CHAINID
+    _setupQueryCache(arguments)
 
     # extract envvars
     SECRET_SEED = _getSecretSeedOrExit()
@@ -189,6 +226,8 @@ def do_allocations():
     )
     csvs.save_allocation_csv(allocs, csv_dir, n_samp > 1)
 
+    _printCacheAndConnectionStats()
+
     print("dftool allocations: Done")
 
 
@@ -201,6 +240,7 @@ def do_vebals():
         description="Query chain, outputs veBalances csv",
         epilog="""Uses these envvars:
           \nSECRET_SEED -- secret integer used to seed the rng
+          \nBLOCKRANGE_SAMPLING -- 'legacy' to sample the blocks that df-py sampled for a seed before; default 'generator'
         """,
         command_name="vebals",
         csv_names="vebals.csv or vebals_realtime.csv",
@@ -209,6 +249,7 @@ def do_vebals():
     print_arguments(arguments)
 
     csv_dir, n_samp, chain_id = arguments.CSV_DIR, arguments.NSAMP, arguments.CHAINID
+    _setupQueryCache(arguments)
 
     # extract envvars
     SECRET_SEED = _getSecretSeedOrExit()
@@ -225,6 +266,8 @@ def do_vebals():
     )
     csvs.save_vebals_csv(balances, locked_amt, unlock_time, csv_dir, n_samp > 1)
 
+    _printCacheAndConnectionStats()
+
     print("dftool vebals: Done")
 
 
@@ -352,6 +395,7 @@ def do_predictoor_data():
     if not only_contracts:
         save_predictoor_data_csv(predictoor_data, csv_dir)
         save_predictoor_summary_csv(predictoor_data, csv_dir)
+    print_connection_stats()
     print("dftool predictoor_data: Done")
 
 
@@ -772,6 +816,236 @@ def do_mine():
     print("dftool mine: Done")
 
 
+# ========================================================================
+@enforce_types
+def do_sweep():
+    parser = argparse.ArgumentParser(
+        description="From stakes/etc csvs, output volume rewards summary for "
+        "each combination of reward params"
+    )
+    parser.add_argument("command", choices=["sweep"])
+    parser.add_argument(
+        "CSV_DIR",
+        type=existing_path,
+        help="input dir for stakes/etc csvs, output dir for volume_sweep.csv",
+    )
+    parser.add_argument(
+        "TOT_OCEAN",
+        type=float,
+        help="total amount of OCEAN to distribute (decimal, not wei)",
+    )
+    parser.add_argument(
+        "--START_DATE",
+        type=valid_date_and_convert,
+        help="week start date -- YYYY-MM-DD. Sets DF week for DCV multiplier",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--RANK_SCALE_OPS",
+        type=comma_separated(str),
+        default=[RANK_SCALE_OP],
+        help="e.g. LIN,SQRT,POW2,POW4,LOG",
+    )
+    parser.add_argument(
+        "--MAX_N_RANK_ASSETS",
+        type=comma_separated(int),
+        default=[MAX_N_RANK_ASSETS],
+        help="e.g. 20,50,100,500",
+    )
+    parser.add_argument(
+        "--TARGET_WPYS",
+        type=comma_separated(float),
+        default=[TARGET_WPY],
+        help="e.g. 0.01,0.015717,0.02",
+    )
+    parser.add_argument(
+        "--DO_PUBREWARDS",
+        type=comma_separated(bool_str),
+        default=[DO_PUBREWARDS],
+        help="e.g. true,false",
+    )
+    parser.add_argument(
+        "--TOPK", type=int, default=5, help="# top recipients to report"
+    )
+    parser.add_argument(
+        "--WORKERS", type=int, default=1, help="# processes to spread batches over"
+    )
+
+    arguments = parser.parse_args()
+    print_arguments(arguments)
+    csv_dir = arguments.CSV_DIR
+
+    if arguments.TOT_OCEAN <= 0:
+        print("TOT_OCEAN must be > 0. Exiting.")
+        sys.exit(1)
+
+    # do we have the input files?
+    required_files = [
+        csvs.allocation_csv_filename(csv_dir),
+        csvs.vebals_csv_filename(csv_dir),
+        *csvs.nftvols_csv_filenames(csv_dir),
+        *csvs.owners_csv_filenames(csv_dir),
+        *csvs.symbols_csv_filenames(csv_dir),
+        *csvs.rate_csv_filenames(csv_dir),
+    ]
+    for fname in required_files:
+        if not os.path.exists(fname):
+            print(f"\nNo file {fname} in '{csv_dir}'. Exiting.")
+            sys.exit(1)
+
+    # shouldn't already have the output file
+    _exitIfFileExists(csvs.volume_sweep_csv_filename(csv_dir))
+
+    # main work
+    results = sweep_volume_rewards_from_csvs(
+        csv_dir,
+        arguments.START_DATE,
+        arguments.TOT_OCEAN,
+        rank_scale_ops=arguments.RANK_SCALE_OPS,
+        max_n_rank_assets=arguments.MAX_N_RANK_ASSETS,
+        target_wpys=arguments.TARGET_WPYS,
+        do_pubrewards=arguments.DO_PUBREWARDS,
+        top_k=arguments.TOPK,
+        n_workers=arguments.WORKERS,
+    )
+    print(sweep_table(results))
+
+    print("dftool sweep: Done")
+
+
+# ========================================================================
+@enforce_types
+def do_calc_history():
+    parser = argparse.ArgumentParser(
+        description="From a dir of weekly csv folders, output rewards csvs "
+        "for each week"
+    )
+    parser.add_argument("command", choices=["calc_history"])
+    parser.add_argument(
+        "HISTORY_DIR",
+        type=existing_path,
+        help="dir with one folder of stakes/etc csvs per week. A YYYY-MM-DD "
+        "in a folder's name sets that week's start date",
+    )
+    parser.add_argument(
+        "VOLUME_TOT_OCEAN",
+        type=float,
+        help="OCEAN for volume rewards, per week (decimal, not wei). 0 = skip",
+    )
+    parser.add_argument(
+        "--PREDICTOOR_TOT_ROSE",
+        type=float,
+        default=0.0,
+        help="ROSE for predictoor rewards, per week. 0 = skip (default)",
+    )
+    parser.add_argument(
+        "--WORKERS",
+        type=int,
+        default=None,
+        help="# processes to spread weeks over. Default: # cpus",
+    )
+    parser.add_argument(
+        "--OVERWRITE",
+        action="store_true",
+        help="replace rewards csvs from an earlier run, rather than skip them",
+    )
+
+    arguments = parser.parse_args()
+    print_arguments(arguments)
+
+    if arguments.VOLUME_TOT_OCEAN < 0 or arguments.PREDICTOOR_TOT_ROSE < 0:
+        print("Reward amounts must be >= 0. Exiting.")
+        sys.exit(1)
+
+    # main work
+    timings = calc_history(
+        arguments.HISTORY_DIR,
+        arguments.VOLUME_TOT_OCEAN,
+        arguments.PREDICTOOR_TOT_ROSE,
+        arguments.WORKERS,
+        arguments.OVERWRITE,
+    )
+    print(history_table(timings))
+
+    if any(t["error"] for t in timings):
+        print("dftool calc_history: Done, with errors")
+        sys.exit(1)
+
+    print("dftool calc_history: Done")
+
+
+# ========================================================================
+@enforce_types
+def do_fake_subgraph():
+    parser = argparse.ArgumentParser(
+        description="Serve a fake subgraph locally (for offline testing)"
+    )
+    parser.add_argument("command", choices=["fake_subgraph"])
+    parser.add_argument("PORT", type=int, help="e.g. 9000")
+    parser.add_argument(
+        "--dataset",
+        type=existing_path,
+        required=False,
+        help="dataset file from --save (.json or .json.gz); else synthesize one",
+    )
+    parser.add_argument(
+        "--recordings",
+        required=False,
+        help="JSON Lines of recorded responses, to replay (and append to)",
+    )
+    parser.add_argument(
+        "--upstream",
+        required=False,
+        help="real subgraph URL, for queries that aren't recorded yet",
+    )
+    parser.add_argument("--CHAINID", type=int, default=DEV_CHAINID, required=False)
+    parser.add_argument("--NFTS", type=int, default=500, required=False)
+    parser.add_argument("--LPS", type=int, default=1000, required=False)
+    parser.add_argument("--ORDERS", type=int, default=20000, required=False)
+    parser.add_argument("--SWAPS", type=int, default=5000, required=False)
+    parser.add_argument("--PREDICTIONS", type=int, default=20000, required=False)
+    parser.add_argument("--SEED", type=int, default=0, required=False)
+    parser.add_argument(
+        "--save", required=False, help="also write the dataset to this file"
+    )
+
+    arguments = parser.parse_args()
+    print_arguments(arguments)
+
+    # main work
+    if arguments.dataset is not None:
+        dataset = fake_subgraph.SubgraphDataset.load(arguments.dataset)
+    else:
+        dataset = fake_subgraph.synthesize_dataset(
+            chainID=arguments.CHAINID,
+            n_nfts=arguments.NFTS,
+            n_lps=arguments.LPS,
+            n_orders=arguments.ORDERS,
+            n_swaps=arguments.SWAPS,
+            n_predictions=arguments.PREDICTIONS,
+            seed=arguments.SEED,
+        )
+    if arguments.save is not None:
+        dataset.save(arguments.save)
+        print(f"Saved dataset to {arguments.save}")
+
+    server = fake_subgraph.FakeSubgraphServer(
+        dataset,
+        recordings_file=arguments.recordings,
+        upstream_url=arguments.upstream,
+        port=arguments.PORT,
+    )
+    network = networkutil.chain_id_to_network(arguments.CHAINID)
+    envvar = f"{network.upper().replace('-', '_')}_SUBGRAPH_URI"
+    print(f"Serving at {server.url}")
+    print(f"To use it: export {envvar}={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"dftool fake_subgraph: Done. Stats: {server.stats}")
+
+
 # ========================================================================
 @enforce_types
 def do_new_acct():
@@ -1042,6 +1316,25 @@ def do_checkpoint_feedist():
 # utilities
 
 
+def _setupQueryCache(arguments: argparse.Namespace):
+    """Turn on the on-disk caches of subgraph responses & block timestamps,
+    unless --no-cache was given"""
+    if arguments.no_cache:
+        query_cache.disable()
+        block_cache.disable()
+    else:
+        query_cache.enable()
+        block_cache.enable()
+
+
+def _printCacheAndConnectionStats():
+    """Print the stats of the caches that _setupQueryCache() sets up,
+    and of HTTP connection reuse"""
+    print_connection_stats()
+    query_cache.print_cache_stats()
+    block_cache.print_cache_stats()
+
+
 def _exitIfFileExists(filename: str):
     if os.path.exists(filename):
         print(f"\nFile {filename} exists. Exiting.")
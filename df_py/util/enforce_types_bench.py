@@ -0,0 +1,220 @@
+"""Measure the overhead of @enforce_types' runtime checks, per subsystem.
+
+Usage: python -m df_py.util.enforce_types_bench [--n N]
+
+Runs the same workloads twice, each in a fresh process: with checks, and
+with envvar ENFORCE_TYPES=0 (like `dftool --fast`). The switch acts at
+import time, hence the processes. Prints the time of each, and checks that
+both give the same results. Needs no network.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+from enforce_typing import enforce_types
+
+# df_py/__init__.py reads ENFORCE_TYPES first, so these get (un)checked
+import df_py
+from df_py.predictoor.calc_rewards import calc_predictoor_rewards
+from df_py.predictoor.models import Prediction, Predictoor
+from df_py.util.oceanutil import calc_did
+from df_py.volume.allocations import allocs_to_stakes
+from df_py.volume.models import Tok
+from df_py.volume.queries import _process_delegation
+from df_py.volume.reward_calculator import RewardCalculator
+
+
+@enforce_types
+def bench_enforce_types(n: int = 100_000) -> List[dict]:
+    """
+    @arguments
+      n -- # records per workload. Eg # predictions
+
+    @return
+      results -- list of dict, one per workload, with keys:
+        subsystem, workload, checked_s, unchecked_s, overhead
+          -- overhead is (checked_s / unchecked_s - 1)
+    """
+    checked = _run_child(n, enforce=True)
+    unchecked = _run_child(n, enforce=False)
+
+    results = []
+    for name, (checked_s, checked_out) in checked.items():
+        unchecked_s, unchecked_out = unchecked[name]
+        assert checked_out == unchecked_out, (name, checked_out, unchecked_out)
+        subsystem, workload = name.split(":")
+        results.append(
+            {
+                "subsystem": subsystem,
+                "workload": workload,
+                "checked_s": checked_s,
+                "unchecked_s": unchecked_s,
+                "overhead": checked_s / max(unchecked_s, 1e-9) - 1.0,
+            }
+        )
+    return results
+
+
+@enforce_types
+def bench_table(results: List[dict]) -> str:
+    """
+    @return
+      table -- results of bench_enforce_types(), one line per workload
+    """
+    lines = [
+        f"{'subsystem':>12} {'workload':>26} {'checked_s':>10} "
+        f"{'unchecked_s':>12} {'overhead':>9}"
+    ]
+    for r in results:
+        lines.append(
+            f"{r['subsystem']:>12} {r['workload']:>26} {r['checked_s']:>10.3f} "
+            f"{r['unchecked_s']:>12.3f} {r['overhead']:>8.0%}"
+        )
+    return "\n".join(lines)
+
+
+# ========================================================================
+# workloads. Each returns something to compare across the 2 runs
+
+
+def _predictions(n: int):
+    predictoors: dict = {}
+    for i in range(n):
+        addr = f"0x{i % 1000:040x}"
+        if addr not in predictoors:
+            predictoors[addr] = Predictoor(addr)
+        contract = f"0x{i % 10 + 1:040x}"
+        predictoors[addr].add_prediction(Prediction(i, float(i % 3), 1.0, contract))
+    return predictoors
+
+
+def _predictoor_rewards(predictoors: dict) -> float:
+    contract_addrs = [f"0x{c + 1:040x}" for c in range(10)]
+    rewards = calc_predictoor_rewards(predictoors, 1e4, 23294, contract_addrs)
+    return round(sum(sum(r.values()) for r in rewards.values()), 6)
+
+
+def _delegations(n: int) -> float:
+    delegation = {
+        "expireTime": "2000000000",
+        "timeLeftUnlock": "1000",
+        "amount": "10.0",
+        "receiver": {"id": "0x" + "ab" * 20},
+    }
+    balance = 1e9
+    for _ in range(n):
+        balance, _, _ = _process_delegation(delegation, balance, 1_700_000_000, 500)
+    return round(balance, 6)
+
+
+def _toks(n: int) -> int:
+    return len([Tok(137, f"0x{i:040x}", "OCEAN") for i in range(n)])
+
+
+def _dids(n: int) -> str:
+    return [calc_did(f"0x{i:040x}", 137) for i in range(n)][-1]
+
+
+def _volume_rewards(n: int) -> float:
+    n_nfts, n_LPs = max(1, n // 100), max(1, n // 5)
+    allocs: dict = {137: {}}
+    vebals = {}
+    for i in range(n_LPs):
+        LP = f"0x{i:040x}"
+        vebals[LP] = 1e3 + i
+        for k in range(5):
+            nft = f"0x{(i * 7 + k) % n_nfts + 10**6:040x}"
+            allocs[137].setdefault(nft, {})[LP] = 0.2
+    ocean = "0x967da4048cd07ab37855c090aaf366e4ce1b9f48"
+    nftvols = {137: {ocean: {nft: 1e3 for nft in allocs[137]}}}
+    owners = {137: {nft: "0x" + "00" * 20 for nft in allocs[137]}}
+    symbols = {137: {ocean: "OCEAN"}}
+
+    stakes = allocs_to_stakes(allocs, vebals)
+    # offline: no predictoor feeds
+    with patch(
+        "df_py.volume.reward_calculator.query_predictoor_contracts",
+        return_value={},
+    ):
+        calculator = RewardCalculator(
+            stakes,
+            stakes,
+            nftvols,
+            owners,
+            symbols,
+            {"OCEAN": 0.5},
+            60,
+            1e4,
+            True,
+            True,
+        )
+    rewardsperlp, _ = calculator.calculate()
+    return round(sum(sum(r.values()) for r in rewardsperlp.values()), 6)
+
+
+def _workloads(n: int) -> Dict[str, Callable]:
+    """[subsystem:workload] : function that does it"""
+    state: dict = {}
+
+    def predictions():
+        state["predictoors"] = _predictions(n)
+        return len(state["predictoors"])
+
+    return {
+        "predictoor:Prediction+add_prediction": predictions,
+        "predictoor:calc_predictoor_rewards": lambda: _predictoor_rewards(
+            state["predictoors"]
+        ),
+        "volume:_process_delegation": lambda: _delegations(n // 10),
+        "volume:Tok": lambda: _toks(n),
+        "volume:calc_rewards": lambda: _volume_rewards(n),
+        "util:calc_did": lambda: _dids(n // 10),
+    }
+
+
+# ========================================================================
+# processes
+
+
+def _run_child(n: int, enforce: bool) -> dict:
+    """Run the workloads in a fresh process. Return its _child() output"""
+    env = dict(os.environ, ENFORCE_TYPES="1" if enforce else "0")
+    cmd = [sys.executable, "-m", "df_py.util.enforce_types_bench"]
+    cmd += ["--n", str(n), "--child"]
+    out = subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def _child(n: int):
+    """Print json: dict of [subsystem:workload] : (secs, output)"""
+    # checks must be on iff asked for
+    assert df_py.enforce_types_enabled() == (os.getenv("ENFORCE_TYPES") != "0")
+
+    results = {}
+    for name, func in _workloads(n).items():
+        t0 = time.perf_counter()
+        out = func()
+        results[name] = (time.perf_counter() - t0, out)
+    print(json.dumps(results))
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000, help="# records")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.child:
+        _child(arguments.n)
+        return
+    print(bench_table(bench_enforce_types(arguments.n)))
+
+
+if __name__ == "__main__":
+    _main()
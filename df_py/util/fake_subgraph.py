@@ -0,0 +1,834 @@
+"""
+A local stand-in for the ocean subgraph, for benchmarks and tests that
+must not depend on barge or the network.
+
+It answers the GraphQL that df-py sends: collection fields with `first`,
+`skip`, `orderBy`, `orderDirection`, `where` (incl. `id_gt`, `_in`,
+`_not`, `_gt/_gte/_lt/_lte` and nested `field_: {..}` filters) and
+`block: {number: N}` snapshots, aliases, and `_meta`. Answers come from:
+1. recorded responses, replayed verbatim (see FakeSubgraphServer)
+2. a SubgraphDataset, whose records are versioned by block. Load one from
+   a file, or make a week-scale one with synthesize_dataset().
+
+Usage:
+  with FakeSubgraphServer(synthesize_dataset()) as server:
+      os.environ["DEVELOPMENT_SUBGRAPH_URI"] = server.url
+      ...
+Or from the command line: `dftool fake_subgraph PORT`.
+"""
+
+import bisect
+import gzip
+import json
+import operator
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from enforce_typing import enforce_types
+
+from df_py.util.constants import DEPLOYER_ADDRS, MAX_ALLOCATE
+from df_py.util.networkutil import DEV_CHAINID
+from df_py.util.query_cache import normalize_query
+
+DEFAULT_FIRST = 100  # graph-node's default for `first`
+MAX_FIRST = 1000  # graph-node's max for `first`
+
+# synthesize_dataset(): a week of 2-second blocks, ending at FIN_TS
+BLOCKS_PER_WEEK = 302400
+BLOCK_TIME = 2
+FIN_TS = 1700000000
+
+# basetoken of synthesized orders & swaps
+FAKE_OCEAN_ADDR = "0x" + "0cea" * 10
+
+_MAX_LOCK_TIME = 4 * 365 * 86400
+
+
+# ========================================================================
+# parsing
+
+# whitespace & commas are insignificant in GraphQL
+_TOKEN_RE = re.compile(
+    r'[\s,]+|#[^\n]*|(?P<str>"(?:[^"\\]|\\.)*")'
+    r"|(?P<num>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[_A-Za-z][_0-9A-Za-z]*)|(?P<punct>[{}()\[\]:])"
+)
+
+
+class Field:
+    """One field of a query: `alias: name(args) { selections }`"""
+
+    def __init__(
+        self, alias: str, name: str, args: dict, selections: Optional[List["Field"]]
+    ):
+        self.alias = alias
+        self.name = name
+        self.args = args
+        self.selections = selections
+
+
+@enforce_types
+def parse_query(query: str) -> List[Field]:
+    """
+    @description
+      Parse the subset of GraphQL that df-py sends: an (optionally named)
+      query of fields with arguments, aliases and selections. No variables,
+      fragments or directives.
+
+    @return
+      fields -- top-level fields of the query
+
+    @raises
+      ValueError -- if the query isn't in that subset
+    """
+    tokens = _tokenize(query)
+    pos = 0
+    if tokens and tokens[0] == ("name", "query"):
+        pos = 2 if len(tokens) > 1 and tokens[1][0] == "name" else 1
+    fields, pos = _parse_selections(tokens, pos)
+    if pos != len(tokens):
+        raise ValueError(f"Unexpected {tokens[pos][1]!r} after the query")
+    return fields
+
+
+def _tokenize(query: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    while pos < len(query):
+        match = _TOKEN_RE.match(query, pos)
+        if match is None:
+            raise ValueError(f"Unexpected character {query[pos]!r} at {pos}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind is None:  # whitespace or comment
+            continue
+        text = match.group(kind)
+        if kind == "str":
+            tokens.append(("value", json.loads(text)))
+        elif kind == "num":
+            number = float(text) if any(c in text for c in ".eE") else int(text)
+            tokens.append(("value", number))
+        else:
+            tokens.append((kind, text))
+    return tokens
+
+
+def _expect(tokens: list, pos: int, punct: str) -> int:
+    if pos >= len(tokens) or tokens[pos] != ("punct", punct):
+        got = tokens[pos][1] if pos < len(tokens) else "end of query"
+        raise ValueError(f"Expected {punct!r}, got {got!r}")
+    return pos + 1
+
+
+def _parse_selections(tokens: list, pos: int) -> Tuple[List[Field], int]:
+    pos = _expect(tokens, pos, "{")
+    fields = []
+    while pos < len(tokens) and tokens[pos] != ("punct", "}"):
+        field, pos = _parse_field(tokens, pos)
+        fields.append(field)
+    return fields, _expect(tokens, pos, "}")
+
+
+def _parse_field(tokens: list, pos: int) -> Tuple[Field, int]:
+    kind, name = tokens[pos]
+    if kind != "name":
+        raise ValueError(f"Expected a field name, got {name!r}")
+    pos += 1
+    alias = name
+    if pos < len(tokens) and tokens[pos] == ("punct", ":"):
+        kind, name = tokens[pos + 1]
+        if kind != "name":
+            raise ValueError(f"Expected a field name, got {name!r}")
+        pos += 2
+
+    args: dict = {}
+    if pos < len(tokens) and tokens[pos] == ("punct", "("):
+        pos += 1
+        while tokens[pos] != ("punct", ")"):
+            arg_name = tokens[pos][1]
+            pos = _expect(tokens, pos + 1, ":")
+            args[arg_name], pos = _parse_value(tokens, pos)
+        pos += 1
+
+    selections = None
+    if pos < len(tokens) and tokens[pos] == ("punct", "{"):
+        selections, pos = _parse_selections(tokens, pos)
+    return Field(alias, name, args, selections), pos
+
+
+def _parse_value(tokens: list, pos: int) -> Tuple[Any, int]:
+    kind, value = tokens[pos]
+    if kind == "value":
+        return value, pos + 1
+    if kind == "name":
+        literals = {"true": True, "false": False, "null": None}
+        return literals.get(value, value), pos + 1  # else an enum value
+    if value == "[":
+        items = []
+        pos += 1
+        while tokens[pos] != ("punct", "]"):
+            item, pos = _parse_value(tokens, pos)
+            items.append(item)
+        return items, pos + 1
+    if value == "{":
+        obj = {}
+        pos += 1
+        while tokens[pos] != ("punct", "}"):
+            key = tokens[pos][1]
+            pos = _expect(tokens, pos + 1, ":")
+            obj[key], pos = _parse_value(tokens, pos)
+        return obj, pos + 1
+    raise ValueError(f"Unexpected {value!r}")
+
+
+# ========================================================================
+# filtering
+
+# longest first, so that e.g. `_not_in` isn't read as `_in`
+_FILTER_OPS = ["_not_in", "_not", "_gte", "_lte", "_gt", "_lt", "_in"]
+
+
+@enforce_types
+def matches_where(record: dict, where: dict) -> bool:
+    """Does `record` pass the subgraph `where` filter?"""
+    for key, expected in where.items():
+        if key.endswith("_") and isinstance(expected, dict):
+            # nested filter on a related entity, e.g. `slot_: {status: ..}`
+            related = record.get(key[:-1])
+            if isinstance(related, list):
+                if not any(matches_where(item, expected) for item in related):
+                    return False
+            elif related is None or not matches_where(related, expected):
+                return False
+            continue
+
+        field, op = key, ""
+        for suffix in _FILTER_OPS:
+            if key.endswith(suffix) and key[: -len(suffix)] in record:
+                field, op = key[: -len(suffix)], suffix
+                break
+        if not _compare(_comparable(record.get(field)), op, expected):
+            return False
+    return True
+
+
+def _comparable(value: Any) -> Any:
+    """Entity references compare by id, like in the subgraph"""
+    if isinstance(value, dict):
+        return value.get("id")
+    return value
+
+
+def _compare(actual: Any, op: str, expected: Any) -> bool:
+    if op in _ORDER_OPS:
+        return _compare_order(actual, op, expected)
+    # "", "_not", "_in", "_not_in"
+    items = expected if op.endswith("_in") else [expected]
+    found = any(_equal(actual, item) for item in items)
+    return not found if op.startswith("_not") else found
+
+
+_ORDER_OPS = {
+    "_gt": operator.gt,
+    "_gte": operator.ge,
+    "_lt": operator.lt,
+    "_lte": operator.le,
+}
+
+
+def _compare_order(actual: Any, op: str, expected: Any) -> bool:
+    if actual is None or expected is None:
+        return False
+    return _ORDER_OPS[op](*_coerce(actual, expected))
+
+
+def _equal(actual: Any, expected: Any) -> bool:
+    if actual is None or expected is None:
+        return actual is expected
+    actual, expected = _coerce(actual, expected)
+    return actual == expected
+
+
+def _coerce(actual: Any, expected: Any) -> Tuple[Any, Any]:
+    """BigInt & BigDecimal come as strings; compare them as numbers"""
+    if isinstance(expected, (int, float)) and isinstance(actual, str):
+        return float(actual), expected
+    if isinstance(actual, (int, float)) and isinstance(expected, str):
+        return actual, float(expected)
+    return actual, expected
+
+
+def _order_and_slice(records: List[dict], args: dict) -> List[dict]:
+    """Apply `where`, `orderBy`, `orderDirection`, `skip` and `first`"""
+    where = args.get("where") or {}
+    if where:
+        records = [record for record in records if matches_where(record, where)]
+    order_by = args.get("orderBy", "id")
+    reverse = args.get("orderDirection", "asc") == "desc"
+    records = sorted(
+        records, key=lambda record: _sort_key(record.get(order_by)), reverse=reverse
+    )
+    skip = args.get("skip", 0)
+    return records[skip : skip + _first(args)]
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    value = _comparable(value)
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    try:
+        return (1, float(value))
+    except ValueError:
+        return (2, value)
+
+
+def _first(args: dict) -> int:
+    first = args.get("first", DEFAULT_FIRST)
+    if not 0 <= first <= MAX_FIRST:
+        raise ValueError(f"`first` must be between 0 and {MAX_FIRST}, got {first}")
+    return first
+
+
+def _select(record: dict, selections: Optional[List[Field]]) -> Any:
+    """Project a record onto a selection set, recursively"""
+    if selections is None or record is None:
+        return record
+    result = {}
+    for field in selections:
+        value = record.get(field.name)
+        if field.selections is not None and value is not None:
+            if isinstance(value, list):
+                items = _order_and_slice(value, field.args) if field.args else value
+                value = [_select(item, field.selections) for item in items]
+            else:
+                value = _select(value, field.selections)
+        result[field.alias] = value
+    return result
+
+
+# ========================================================================
+# data
+
+
+class SubgraphDataset:
+    """
+    Entity records, each versioned by the block it took that value at, so
+    that queries can be answered as of any block.
+    """
+
+    def __init__(self, head_block: int = 0):
+        self.head_block = head_block
+        # [entity][id] : (blocks, records); blocks ascending
+        self._versions: Dict[str, Dict[str, Tuple[List[int], List[dict]]]] = {}
+        # [entity] : sorted ids
+        self._sorted_ids: Dict[str, List[str]] = {}
+
+    @enforce_types
+    def add(self, entity: str, record: dict, block: int):
+        """
+        @description
+          Add `record` to collection `entity` (e.g. "orders"), as of
+          `block`. If a record with that id exists, this is its new value
+          from `block` on.
+        """
+        versions = self._versions.setdefault(entity, {})
+        blocks, records = versions.setdefault(record["id"], ([], []))
+        i = bisect.bisect_right(blocks, block)
+        blocks.insert(i, block)
+        records.insert(i, record)
+        self._sorted_ids.pop(entity, None)
+        self.head_block = max(self.head_block, block)
+
+    def entities(self) -> List[str]:
+        return sorted(self._versions)
+
+    def num_records(self, entity: str) -> int:
+        """# distinct ids in `entity`"""
+        return len(self._versions.get(entity, {}))
+
+    @enforce_types
+    def records_at(self, entity: str, block: Optional[int] = None) -> List[dict]:
+        """All records of `entity` as of `block` (default: head), by id"""
+        return list(self._iter_at(entity, block, ""))
+
+    def _iter_at(self, entity: str, block: Optional[int], after_id: str):
+        """Yield records of `entity` as of `block`, by id, from after_id on"""
+        if block is None:
+            block = self.head_block
+        versions = self._versions.get(entity, {})
+        ids = self._ids(entity)
+        for id_ in ids[bisect.bisect_right(ids, after_id) :]:
+            blocks, records = versions[id_]
+            i = bisect.bisect_right(blocks, block)
+            if i > 0:
+                yield records[i - 1]
+
+    def _ids(self, entity: str) -> List[str]:
+        if entity not in self._sorted_ids:
+            self._sorted_ids[entity] = sorted(self._versions.get(entity, {}))
+        return self._sorted_ids[entity]
+
+    @enforce_types
+    def execute(self, query: str) -> dict:
+        """
+        @description
+          Answer a query like the subgraph would.
+
+        @return
+          result -- {"data": {..}}, or {"errors": [..]} if the query isn't
+            understood or asks for a block that isn't "indexed" yet
+        """
+        try:
+            fields = parse_query(query)
+            data = {field.alias: self._resolve(field) for field in fields}
+        except (ValueError, KeyError) as e:
+            return {"errors": [{"message": str(e)}]}
+        return {"data": data}
+
+    def _resolve(self, field: Field) -> Any:
+        if field.name == "_meta":
+            meta = {
+                "block": {"number": self.head_block, "hash": None},
+                "deployment": "fake",
+                "hasIndexingErrors": False,
+            }
+            return _select(meta, field.selections)
+
+        block = (field.args.get("block") or {}).get("number")
+        if block is not None and block > self.head_block:
+            raise ValueError(
+                "Failed to decode `block.number` value: `subgraph fake has only "
+                f"indexed up to block number {self.head_block} and data for block "
+                f"number {block} is therefore not yet available`"
+            )
+
+        if field.name in self._versions:
+            records = self._collection(field.name, block, field.args)
+            return [_select(record, field.selections) for record in records]
+
+        # singular, e.g. `nft(id: "0x..")`
+        entity = field.name + "s"
+        if entity in self._versions and "id" in field.args:
+            for record in self._iter_at(entity, block, ""):
+                if record["id"] == field.args["id"]:
+                    return _select(record, field.selections)
+            return None
+
+        raise ValueError(f"Type `Query` has no field `{field.name}`")
+
+    def _collection(self, entity: str, block: Optional[int], args: dict) -> list:
+        where = dict(args.get("where") or {})
+        ordered_by_id = args.get("orderBy", "id") == "id"
+        if not (ordered_by_id and args.get("orderDirection", "asc") == "asc"):
+            return _order_and_slice(list(self._iter_at(entity, block, "")), args)
+
+        # fast path for cursor pagination: start right after id_gt, and
+        # stop once the page is full
+        after_id = where.pop("id_gt", "")
+        first, skip = _first(args), args.get("skip", 0)
+        page: List[dict] = []
+        for record in self._iter_at(entity, block, after_id):
+            if len(page) == skip + first:
+                break
+            if matches_where(record, where):
+                page.append(record)
+        return page[skip:]
+
+    @enforce_types
+    def save(self, path: str):
+        """Write to a JSON file, gzipped if `path` ends with .gz"""
+        content = {
+            "head_block": self.head_block,
+            "versions": {
+                entity: {
+                    id_: list(zip(blocks, records))
+                    for id_, (blocks, records) in versions.items()
+                }
+                for entity, versions in self._versions.items()
+            },
+        }
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt") as f:
+            json.dump(content, f)
+
+    @classmethod
+    @enforce_types
+    def load(cls, path: str) -> "SubgraphDataset":
+        """Read a file written by save()"""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            content = json.load(f)
+        dataset = cls(content["head_block"])
+        for entity, versions in content["versions"].items():
+            for id_versions in versions.values():
+                for block, record in id_versions:
+                    dataset.add(entity, record, block)
+        return dataset
+
+
+# ========================================================================
+# synthesis
+
+
+# pylint: disable=too-many-locals,too-many-statements
+@enforce_types
+def synthesize_dataset(
+    *,
+    chainID: int = DEV_CHAINID,
+    st_block: int = 0,
+    fin_block: int = BLOCKS_PER_WEEK,
+    n_nfts: int = 500,
+    n_lps: int = 1000,
+    n_orders: int = 20000,
+    n_swaps: int = 5000,
+    n_feeds: int = 10,
+    n_predictions: int = 20000,
+    seed: int = 0,
+) -> SubgraphDataset:
+    """
+    @description
+      Make a reproducible dataset that looks like a week of DF activity on
+      one chain: nfts & their orders and swaps, veOCEAN locks and
+      delegations that change during the week, veAllocations, and
+      predictoor feeds & predictions. Popular nfts get more orders, like in reality.
+
+      Block b is at timestamp FIN_TS - (fin_block - b) * BLOCK_TIME.
+
+    @arguments
+      chainID -- chain the records claim to be on
+      st_block, fin_block -- block range of the activity
+      n_* -- # records of each kind
+      seed -- same seed, same dataset
+
+    @return
+      dataset -- SubgraphDataset
+    """
+    assert 0 <= st_block < fin_block
+    rnd = random.Random(seed)
+    dataset = SubgraphDataset(fin_block)
+
+    def _addr() -> str:
+        return f"0x{rnd.getrandbits(160):040x}"
+
+    def _ts(block: int) -> int:
+        return FIN_TS - (fin_block - block) * BLOCK_TIME
+
+    def _block() -> int:
+        return rnd.randint(st_block, fin_block)
+
+    lps = [_addr() for _ in range(n_lps)]
+
+    # nfts, with a datatoken & fixed-rate exchange each
+    nfts = []
+    for i in range(n_nfts):
+        nft: Dict[str, Any] = {
+            "id": _addr(),
+            "symbol": f"DN-{i}",
+            "owner": {"id": rnd.choice(lps)},
+        }
+        datatoken = {"id": _addr(), "symbol": f"DT-{i}"}
+        exchange_id = _addr()
+        free = rnd.random() < 0.2
+        nfts.append((nft, datatoken, exchange_id, free))
+        dataset.add("nfts", nft, st_block)
+
+    # zipf-like popularity
+    popularity = [1.0 / (i + 1) for i in range(n_nfts)]
+
+    for _ in range(n_orders):
+        nft, datatoken, _, free = rnd.choices(nfts, popularity)[0]
+        block = _block()
+        tx = _addr() + _addr()[2:26]
+        order = {
+            "id": f"{tx}-{datatoken['id']}-{rnd.getrandbits(32)}",
+            "datatoken": {
+                "id": datatoken["id"],
+                "symbol": datatoken["symbol"],
+                "nft": {"id": nft["id"], "owner": {"id": nft["owner"]["id"]}},
+                "dispensers": [{"id": datatoken["id"]}] if free else [],
+            },
+            "lastPriceToken": {"id": FAKE_OCEAN_ADDR},
+            "lastPriceValue": "0" if free else str(round(rnd.uniform(1, 500), 4)),
+            "block": block,
+            "createdTimestamp": _ts(block),
+            "gasPrice": str(rnd.randint(1, 100) * 10**9),
+            "gasUsed": str(rnd.randint(50000, 300000)),
+            "tx": tx,
+        }
+        dataset.add("orders", order, block)
+
+    for _ in range(n_swaps):
+        nft, datatoken, exchange_id, _ = rnd.choices(nfts, popularity)[0]
+        block = _block()
+        swap = {
+            "id": f"{_addr()}-{rnd.getrandbits(32)}",
+            "baseTokenAmount": str(round(rnd.uniform(1, 2000), 4)),
+            "block": block,
+            "exchangeId": {
+                "id": exchange_id,
+                "baseToken": {"id": FAKE_OCEAN_ADDR},
+                "datatoken": {
+                    "id": datatoken["id"],
+                    "symbol": datatoken["symbol"],
+                    "nft": {"id": nft["id"]},
+                },
+            },
+        }
+        dataset.add("fixedRateExchangeSwaps", swap, block)
+
+    # veOCEANs: locked before the week; some change during it
+    for lp in lps:
+        block = rnd.randint(max(0, st_block - BLOCKS_PER_WEEK), st_block)
+        unlock_time = FIN_TS + rnd.randint(30 * 86400, _MAX_LOCK_TIME - 86400)
+        locked = rnd.uniform(10, 100000)
+        delegation: List[dict] = []
+        for n_change in range(1 + rnd.choice([0, 0, 0, 1, 1, 2])):
+            if n_change > 0:
+                block = rnd.randint(block + 1, max(block + 1, fin_block))
+            if n_change == 0 or rnd.random() < 0.5:
+                locked = locked + rnd.uniform(0, 10000) if n_change else locked
+            else:
+                receiver = rnd.choice(lps)
+                time_left = unlock_time - _ts(block)
+                # at most half of the lp's voting power
+                amount = rnd.uniform(0, 0.5) * locked * time_left / _MAX_LOCK_TIME
+                delegation = [
+                    {
+                        "id": f"{lp}-{receiver}",
+                        "receiver": {"id": receiver},
+                        "amount": str(amount),
+                        "expireTime": str(unlock_time),
+                        "timeLeftUnlock": time_left,
+                        "lockedAmount": str(locked),
+                        "updates": [
+                            {
+                                "timestamp": _ts(block),
+                                "sender": lp,
+                                "amount": str(amount),
+                                "type": 0,
+                            }
+                        ],
+                    }
+                ]
+            veOCEAN = {
+                "id": lp,
+                "lockedAmount": str(locked),
+                "unlockTime": str(unlock_time),
+                "delegation": delegation,
+            }
+            dataset.add("veOCEANs", veOCEAN, block)
+
+    # veAllocations: a few nfts per lp; some change during the week
+    for lp in lps:
+        n_allocs = min(rnd.randint(1, 5), n_nfts)
+        budget = MAX_ALLOCATE
+        for nft, _, _, _ in rnd.sample(nfts, n_allocs):
+            allocated = round(rnd.uniform(0, budget), 2)
+            budget -= allocated
+            allocation = {
+                "id": f"{lp}-{nft['id']}-{chainID}",
+                "allocated": str(allocated),
+                "chainId": str(chainID),
+                "nftAddress": nft["id"],
+                "allocationUser": {"id": lp},
+            }
+            dataset.add("veAllocations", allocation, st_block)
+            if rnd.random() < 0.2:
+                changed = dict(allocation, allocated=str(round(allocated / 2, 2)))
+                dataset.add("veAllocations", changed, _block())
+
+    # predictoor feeds & predictions
+    deployer = (DEPLOYER_ADDRS.get(chainID) or [_addr()])[0]
+    feeds = []
+    for i in range(n_feeds):
+        feed: Dict[str, Any] = {
+            "id": _addr(),
+            "token": {
+                "id": _addr(),
+                "name": f"PAIR{i}/USDT",
+                "symbol": f"P{i}",
+                "nft": {"id": _addr(), "owner": {"id": deployer}, "nftData": []},
+            },
+            "secondsPerEpoch": "300",
+            "secondsPerSubscription": "86400",
+            "truevalSubmitTimeout": "3600",
+        }
+        feeds.append(feed)
+        dataset.add("predictContracts", feed, st_block)
+
+    predictoors = lps[: max(1, n_lps // 10)]
+    n_epochs = max(1, (_ts(fin_block) - _ts(st_block)) // 300)
+    for _ in range(n_predictions if feeds else 0):
+        feed = rnd.choice(feeds)
+        user = rnd.choice(predictoors)
+        slot = _ts(st_block) // 300 * 300 + 300 * rnd.randint(1, n_epochs)
+        status = rnd.choices(["Paying", "Pending", "Canceled"], [4, 1, 1])[0]
+        stake = round(rnd.uniform(1, 10), 4)
+        payout = None
+        if status == "Paying":
+            payout = {
+                "id": f"{feed['id']}-{slot}-{user}",
+                "payout": str(round(stake * 1.8, 4) if rnd.random() < 0.55 else 0),
+            }
+        block = min(fin_block, max(st_block, fin_block - (FIN_TS - slot) // 2))
+        prediction = {
+            "id": f"{feed['id']}-{slot}-{user}",
+            "stake": str(stake),
+            "slot": {
+                "status": status,
+                "predictContract": {
+                    "id": feed["id"],
+                    "token": {"nft": feed["token"]["nft"]},
+                },
+                "slot": slot,
+            },
+            "user": {"id": user},
+            "payout": payout,
+            "block": block,
+        }
+        dataset.add("predictPredictions", prediction, block)
+
+    return dataset
+
+
+# ========================================================================
+# server
+
+
+class FakeSubgraphServer:
+    """
+    HTTP server that answers subgraph queries, on any path. Each query is
+    answered by the first of these that can:
+    1. `recordings_file`: recorded {"query", "response"} lines (JSON Lines),
+       matched on the normalized query, and replayed verbatim
+    2. `upstream_url`: a real subgraph; the response is also appended to
+       recordings_file, so that later runs can replay it offline
+    3. `dataset`: a SubgraphDataset
+    Responses are gzipped if the client accepts it, like graph-node's.
+    """
+
+    @enforce_types
+    def __init__(
+        self,
+        dataset: Optional[SubgraphDataset] = None,
+        recordings_file: Optional[str] = None,
+        upstream_url: Optional[str] = None,
+        port: int = 0,
+        host: str = "127.0.0.1",
+    ):
+        self.dataset = dataset
+        self.recordings_file = recordings_file
+        self.upstream_url = upstream_url
+        self.stats = {"requests": 0, "replayed": 0, "upstream": 0, "dataset": 0}
+        self._lock = threading.Lock()
+
+        # [normalized query] : response body
+        self._recordings: Dict[str, bytes] = {}
+        if recordings_file is not None:
+            try:
+                with open(recordings_file, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            recording = json.loads(line)
+                            self._add_recording(
+                                recording["query"], recording["response"]
+                            )
+            except FileNotFoundError:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _handler_class(self))
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.socket.getsockname()[:2]
+        return f"http://{host}:{port}/subgraphs/name/oceanprotocol/ocean-subgraph"
+
+    def start(self) -> "FakeSubgraphServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeSubgraphServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def answer(self, query: str) -> bytes:
+        """Return the response body for `query`. See class docstring"""
+        with self._lock:
+            self.stats["requests"] += 1
+            body = self._recordings.get(normalize_query(query))
+            if body is not None:
+                self.stats["replayed"] += 1
+                return body
+
+        if self.upstream_url is not None:
+            response = requests.post(
+                self.upstream_url, json={"query": query}, timeout=60
+            )
+            response.raise_for_status()
+            result: dict = response.json()
+            with self._lock:
+                self.stats["upstream"] += 1
+                self._record(query, result)
+            return json.dumps(result).encode()
+
+        if self.dataset is None:
+            result = {"errors": [{"message": "No recording for this query"}]}
+        else:
+            result = self.dataset.execute(query)
+            with self._lock:
+                self.stats["dataset"] += 1
+        return json.dumps(result).encode()
+
+    def _add_recording(self, query: str, response: dict):
+        self._recordings[normalize_query(query)] = json.dumps(response).encode()
+
+    def _record(self, query: str, response: dict):
+        self._add_recording(query, response)
+        if self.recordings_file is not None:
+            with open(self.recordings_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"query": query, "response": response}) + "\n")
+
+
+def _handler_class(fake_server: FakeSubgraphServer):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like graph-node
+
+        def do_POST(self):  # pylint: disable=invalid-name
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                query = json.loads(self.rfile.read(length))["query"]
+                body = fake_server.answer(query)
+                status = 200
+            except (ValueError, KeyError, requests.RequestException) as e:
+                body = json.dumps({"errors": [{"message": str(e)}]}).encode()
+                status = 400
+
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, compresslevel=1)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    return _Handler
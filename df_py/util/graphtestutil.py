@@ -0,0 +1,33 @@
+from typing import Callable, Union
+
+from df_py.util import graphutil
+
+
+def mock_stream_query(responses: Union[Callable, list]) -> Callable:
+    """
+    @description
+      Make a stand-in for graphutil.async_stream_query() that streams canned
+      subgraph results. Use like:
+        patch("df_py.util.graphutil.async_stream_query",
+              side_effect=mock_stream_query(responses))
+
+    @arguments
+      responses -- function of (query, chainID) returning a result dict,
+        or a list of result dicts to return in turn
+
+    @return
+      stream_query -- async generator function, like async_stream_query()
+    """
+    results = iter([] if callable(responses) else responses)
+
+    async def _stream_query(query: str, chainID: int):
+        if callable(responses):
+            result = responses(query, chainID)
+        else:
+            result = next(results, None)
+            if result is None:  # out of responses
+                return
+        for item in graphutil.result_records(result):
+            yield item
+
+    return _stream_query
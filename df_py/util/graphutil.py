@@ -1,25 +1,655 @@
+import asyncio
+import json
 import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
-import requests
+import aiohttp
+from enforce_typing import enforce_types
 
-from df_py.util import networkutil
+from df_py.util import networkutil, query_cache
+from df_py.util.concurrency import iterate_sync, ordered_map, run_sync
+from df_py.util.constants import (
+    SUBGRAPH_CACHE_CONFIRMATIONS,
+    SUBGRAPH_MAX_CONCURRENCY,
+)
+from df_py.util.jsonstream import ResponseDecoder
+from df_py.util.request import async_graphql_response, async_make_graphql_request
 
 MAX_WAIT = 60 * 15
+CHUNK_SIZE = 1000  # max for subgraph = 1000
+
+# query_snapshots(): target # records per batched request, and max # blocks
+MAX_RECORDS_PER_REQUEST = 5000
+MAX_SNAPSHOTS_PER_REQUEST = 10
+
+# async_submit_query(): retries on connection errors, timeouts and these
+# HTTP statuses. Delay doubles every retry
+RETRIES = 3
+RETRY_DELAY = 2.0  # seconds
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class SubgraphNoDataError(Exception):
+    """Subgraph returned no data, e.g. because the block isn't indexed"""
+
+
+class _RateLimiter:
+    """Spaces out wait() calls to at most `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self.next_time)
+        self.next_time = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class _ClientLimits:
+    """Global semaphore & per-chain rate limiters, for one event loop"""
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(SUBGRAPH_MAX_CONCURRENCY)
+        self.rate_limiters: Dict[int, _RateLimiter] = {}
+
+    def rate_limiter(self, chainID: int) -> _RateLimiter:
+        if chainID not in self.rate_limiters:
+            rate = networkutil.chain_id_to_subgraph_max_rps(chainID)
+            self.rate_limiters[chainID] = _RateLimiter(rate)
+        return self.rate_limiters[chainID]
+
+
+class _Slot:
+    """A semaphore slot that can be let go & taken again; at most one held"""
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self.semaphore = semaphore
+        self.held = False
+
+    async def acquire(self):
+        if not self.held:
+            await self.semaphore.acquire()
+            self.held = True
+
+    def release(self):
+        if self.held:
+            self.semaphore.release()
+            self.held = False
+
+
+# [loop] : _ClientLimits
+_client_limits: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _limits() -> _ClientLimits:
+    loop = asyncio.get_running_loop()
+    if loop not in _client_limits:
+        _client_limits[loop] = _ClientLimits()
+    return _client_limits[loop]
 
 
 def submit_query(query: str, chainID: int) -> dict:
-    subgraph_url = networkutil.chain_id_to_subgraph_uri(chainID)
-    request = requests.post(subgraph_url, "", json={"query": query}, timeout=30)
+    return run_sync(async_submit_query(query, chainID))
+
+
+@enforce_types
+async def async_submit_query(query: str, chainID: int) -> dict:
+    """
+    @description
+      Post a query to the chain's subgraph, and return the decoded result.
+
+      If the query cache is on (see query_cache.enable()) and the query is
+      pinned to a final block, the response comes from / goes to the cache.
+    """
+    cache = query_cache.get_cache()
+    block = await _cacheable_block(query, chainID)
+
+    if cache is not None and block is not None:
+        result = cache.get(chainID, query, block)
+        if result is not None:
+            return result
 
-    if request.status_code != 200:
-        # pylint: disable=broad-exception-raised
-        raise Exception(f"Query failed. Return code is {request.status_code}\n{query}")
+    result = await _async_post_query(query, chainID)
 
-    result = request.json()
+    if cache is not None and block is not None:
+        if "data" in result and "errors" not in result:
+            cache.put(chainID, query, block, result)
 
     return result
 
 
+@enforce_types
+async def async_stream_query(
+    query: str, chainID: int
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    @description
+      Like async_submit_query(), but decode the response as it arrives and
+      yield its records one by one, for queries whose fields are lists of
+      records, e.g. pages. Only the record being decoded is held in memory,
+      rather than the whole response.
+
+      The query cache is used like in async_submit_query(). To write a
+      response to the cache, its records are also kept until it ends.
+
+    @return
+      records -- async iterator of (alias, record), in response order.
+        `alias` is the field name, e.g. "orders" or "b0"
+
+    @raises
+      SubgraphNoDataError -- if the subgraph returns no data
+      AssertionError -- if the subgraph returns errors. Records that came
+        before the errors in the response may have been yielded already
+    """
+    cache = query_cache.get_cache()
+    block = await _cacheable_block(query, chainID)
+
+    if cache is not None and block is not None:
+        result = cache.get(chainID, query, block)
+        if result is not None:
+            for item in result_records(result):
+                yield item
+            return
+
+    # response so far, for the cache
+    data: Optional[Dict[str, Any]] = {} if block is not None else None
+    top_fields: Dict[str, Any] = {}
+    has_data = False
+
+    async for kind, path, value in _async_post_query_stream(query, chainID):
+        if kind == "record":
+            if data is not None:
+                data[path[1]].append(value)
+            yield path[1], value
+        elif kind == "list":
+            if data is not None:
+                data[path[1]] = []
+        elif len(path) == 2:  # non-list field of data, e.g. _meta
+            if data is not None:
+                data[path[1]] = value
+        else:
+            if kind == "begin":
+                has_data = True
+            else:  # e.g. "errors", or "data": null
+                top_fields[path[0]] = value
+            # like _result_data(): no data trumps errors
+            if has_data and "errors" in top_fields:
+                raise AssertionError(top_fields)
+
+    if not has_data:
+        raise SubgraphNoDataError(top_fields)
+
+    if cache is not None and block is not None and data is not None:
+        cache.put(chainID, query, block, {"data": data})
+
+
+@enforce_types
+def result_records(result: dict) -> Iterator[Tuple[str, dict]]:
+    """
+    @description
+      Records of a decoded subgraph result, as async_stream_query() would
+      stream them: (alias, record) for each record of each list field.
+
+    @raises
+      SubgraphNoDataError, AssertionError -- see _result_data()
+    """
+    data = _result_data(result)
+    if data is None:
+        raise SubgraphNoDataError(result)
+    for alias, records in data.items():
+        if isinstance(records, list):
+            for record in records:
+                yield alias, record
+
+
+@enforce_types
+async def _cacheable_block(query: str, chainID: int) -> Optional[int]:
+    """
+    @description
+      If the response to `query` can be cached, return the block it's
+      pinned to, else None: the cache is off, the query isn't pinned, or
+      it's pinned to a block that the subgraph may not have fully indexed,
+      or that could still be reorganized. E.g. a `block_lte: N` filter on
+      a subgraph lagging behind N would get a partial answer.
+    """
+    if query_cache.get_cache() is None:
+        return None
+    if chainID == networkutil.DEV_CHAINID:
+        return None  # ganache gets reset, so its blocks aren't immutable
+    if networkutil.subgraph_uri_is_overridden(chainID):
+        return None  # e.g. a fake_subgraph server; keep its data out
+    block = query_cache.pinned_block(query)
+    if block is not None and block > await _final_block(chainID):
+        return None  # could still change, so don't cache
+    return block
+
+
+# [chainID] : subgraph's indexed block - SUBGRAPH_CACHE_CONFIRMATIONS, as
+# first seen. It only grows, so a stale value errs on the safe side
+_final_blocks: Dict[int, int] = {}
+
+
+@enforce_types
+async def _final_block(chainID: int) -> int:
+    """
+    @description
+      Highest block that the chain's subgraph has indexed and that won't be
+      reorganized: its `_meta` block, less SUBGRAPH_CACHE_CONFIRMATIONS.
+      The subgraph lags the chain, so that's also final on the chain.
+      -1 if the subgraph doesn't say, so that nothing gets cached.
+    """
+    if chainID not in _final_blocks:
+        query = "{_meta { block { number } } }"
+        result = await _async_post_query(query, chainID)
+        try:
+            indexed = int(result["data"]["_meta"]["block"]["number"])
+        except (KeyError, TypeError, ValueError):
+            return -1
+        _final_blocks[chainID] = indexed - SUBGRAPH_CACHE_CONFIRMATIONS
+    return _final_blocks[chainID]
+
+
+@enforce_types
+async def _async_post_query(query: str, chainID: int) -> dict:
+    """
+    @description
+      Post a query to the chain's subgraph, and return the decoded result.
+
+      Requests share a global cap on requests in flight
+      (SUBGRAPH_MAX_CONCURRENCY) and a per-chain rate limit (see
+      networkutil.chain_id_to_subgraph_max_rps()). Transient failures are
+      retried with backoff. If the caller is cancelled, the request is
+      abandoned and nothing is retried.
+    """
+    subgraph_url = networkutil.chain_id_to_subgraph_uri(chainID)
+    pool_size = max(1, networkutil.chain_id_to_subgraph_max_workers(chainID))
+    limits = _limits()
+
+    for attempt in range(RETRIES + 1):
+        async with limits.semaphore:
+            await limits.rate_limiter(chainID).wait()
+            try:
+                status, body = await async_make_graphql_request(
+                    subgraph_url, query, pool_size
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                if status == 200:
+                    return json.loads(body)
+                error = f"Return code is {status}"
+                if status not in RETRY_STATUSES:
+                    break
+
+        if attempt < RETRIES:
+            print(f"Subgraph query failed, retry {attempt + 1}: {error}")
+            await asyncio.sleep(RETRY_DELAY * 2**attempt)
+
+    # pylint: disable=broad-exception-raised
+    raise Exception(f"Query failed. {error}\n{query}")
+
+
+@enforce_types
+async def _async_post_query_stream(
+    query: str, chainID: int
+) -> AsyncIterator[Tuple[str, tuple, Any]]:
+    """
+    @description
+      Like _async_post_query(), but yield the response's decoding events
+      as the body arrives. See jsonstream.ResponseDecoder.
+
+      The slot under SUBGRAPH_MAX_CONCURRENCY is held only while sending
+      the request and reading each chunk of the body, not while the
+      caller consumes the events. So a slow consumer doesn't hold up
+      other requests.
+
+      Failures are retried as in _async_post_query(), as long as nothing
+      has been yielded yet. A failure mid-stream is raised.
+    """
+    subgraph_url = networkutil.chain_id_to_subgraph_uri(chainID)
+    pool_size = max(1, networkutil.chain_id_to_subgraph_max_workers(chainID))
+    limits = _limits()
+
+    for attempt in range(RETRIES + 1):
+        streaming = False
+        slot = _Slot(limits.semaphore)
+        try:
+            await slot.acquire()
+            await limits.rate_limiter(chainID).wait()
+            async with async_graphql_response(
+                subgraph_url, query, pool_size
+            ) as response:
+                if response.status == 200:
+                    decoder = ResponseDecoder()
+                    while True:
+                        await slot.acquire()
+                        chunk = await response.content.readany()
+                        slot.release()
+                        events = decoder.feed(chunk) if chunk else decoder.close()
+                        for event in events:
+                            streaming = True
+                            yield event
+                        if not chunk:
+                            return
+
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if streaming:
+                raise
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = f"Return code is {status}"
+            if status not in RETRY_STATUSES:
+                break
+        finally:
+            slot.release()
+
+        if attempt < RETRIES:
+            print(f"Subgraph query failed, retry {attempt + 1}: {error}")
+            await asyncio.sleep(RETRY_DELAY * 2**attempt)
+
+    # pylint: disable=broad-exception-raised
+    raise Exception(f"Query failed. {error}\n{query}")
+
+
+@enforce_types
+def build_paginated_query(
+    entity: str,
+    fields: str,
+    last_id: str,
+    *,
+    where: str = "",
+    block: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """
+    @description
+      Build the query for one page of `entity`, ordered by id and starting
+      right after `last_id`.
+
+    @arguments
+      entity -- subgraph entity to query, e.g. "orders"
+      fields -- selection set for each record. Must include `id`
+      last_id -- id of the last record of the previous page, "" for the first
+      where -- extra filter arguments, e.g. "block_gte: 1, block_lte: 10"
+      block -- if given, query the snapshot at this block number
+      chunk_size -- max # records per page
+
+    @return
+      query -- str
+    """
+    page = _page_selection(
+        entity, fields, last_id, where=where, block=block, chunk_size=chunk_size
+    )
+    return "{\n%s\n}" % page
+
+
+@enforce_types
+def build_snapshots_query(
+    entity: str,
+    fields: str,
+    block_last_ids: List[Tuple[int, str]],
+    where: str = "",
+    chunk_size: int = CHUNK_SIZE,
+) -> str:
+    """
+    @description
+      Build one query that fetches a page of `entity` at each of several
+      blocks, using GraphQL aliases: `b0: entity(block: ..) {..} b1: ..`
+
+    @arguments
+      block_last_ids -- list of (block, last_id); alias bi is for item i
+      (others) -- see build_paginated_query()
+
+    @return
+      query -- str
+    """
+    pages = [
+        f"b{i}: "
+        + _page_selection(
+            entity, fields, last_id, where=where, block=block, chunk_size=chunk_size
+        )
+        for i, (block, last_id) in enumerate(block_last_ids)
+    ]
+    return "{\n%s\n}" % "\n".join(pages)
+
+
+@enforce_types
+def _page_selection(
+    entity: str,
+    fields: str,
+    last_id: str,
+    *,
+    where: str,
+    block: Optional[int],
+    chunk_size: int,
+) -> str:
+    """Return e.g. 'orders(first: 1000, where: {id_gt: ".."}) { id .. }'"""
+    where_args = f'id_gt: "{last_id}"'
+    if where:
+        where_args += f", {where}"
+
+    block_arg = ""
+    if block is not None:
+        block_arg = f", block: {{number: {block}}}"
+
+    selection = (
+        "%s(first: %d, orderBy: id, orderDirection: asc, where: {%s}%s) {%s}"
+        % (
+            entity,
+            chunk_size,
+            where_args,
+            block_arg,
+            fields,
+        )
+    )
+    return selection
+
+
+@enforce_types
+async def async_paginate_records(
+    entity: str,
+    fields: str,
+    chainID: int,
+    *,
+    where: str = "",
+    block: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncIterator[dict]:
+    """
+    @description
+      Walk all records of `entity` with cursor-based pagination, i.e.
+      `orderBy: id, where: {id_gt: last_id}`. Unlike `skip`, the cost of
+      each page doesn't grow with the number of records already fetched.
+      Records are yielded one by one, streamed from each response as it's
+      decoded. See async_stream_query().
+
+    @arguments
+      See build_paginated_query()
+
+    @return
+      records -- async iterator over all records, by ascending id
+
+    @raises
+      SubgraphNoDataError -- if the subgraph returns no data
+      AssertionError -- if the subgraph returns data alongside errors
+    """
+    last_id = ""
+    while True:
+        query = build_paginated_query(
+            entity, fields, last_id, where=where, block=block, chunk_size=chunk_size
+        )
+        n_records = 0
+        async for _, record in async_stream_query(query, chainID):
+            n_records += 1
+            last_id = record["id"]
+            yield record
+
+        if n_records == 0:
+            # means there are no records left
+            break
+
+
+@enforce_types
+def _result_data(result: dict) -> dict:
+    """Return result["data"], or raise if the subgraph reported a problem"""
+    if "data" not in result:
+        raise SubgraphNoDataError(result)
+    if "errors" in result:
+        raise AssertionError(result)
+    return result["data"]
+
+
+@enforce_types
+def query_snapshots(
+    entity: str,
+    fields: str,
+    chainID: int,
+    blocks: List[int],
+    *,
+    where: str = "",
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    transform: Optional[Callable] = None,
+) -> Iterator[list]:
+    """Sync version of async_query_snapshots()"""
+    return iterate_sync(
+        async_query_snapshots(
+            entity,
+            fields,
+            chainID,
+            blocks,
+            where=where,
+            max_workers=max_workers,
+            chunk_size=chunk_size,
+            transform=transform,
+        )
+    )
+
+
+@enforce_types
+async def async_query_snapshots(
+    entity: str,
+    fields: str,
+    chainID: int,
+    blocks: List[int],
+    *,
+    where: str = "",
+    max_workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    transform: Optional[Callable] = None,
+) -> AsyncIterator[list]:
+    """
+    @description
+      For each block, fetch all records of `entity` at that block.
+
+      Several blocks are packed into each request with aliases; how many
+      adapts to the size of the responses, aiming for about
+      MAX_RECORDS_PER_REQUEST records per request. Batches of blocks are
+      fetched concurrently, but snapshots are yielded in block order.
+
+      Responses are streamed (see async_stream_query()), and each record
+      goes through `transform` as soon as it's decoded. So a transform that
+      keeps just the needed fields bounds memory by the slimmed snapshots.
+
+    @arguments
+      blocks -- block numbers to take snapshots at
+      max_workers -- max # requests in flight. Default: per-chain setting
+      transform -- if given, snapshots hold transform(record) for each
+        record, rather than the record itself
+      (others) -- see build_paginated_query()
+
+    @return
+      snapshots -- async iterator of lists of records, one list per block
+    """
+    if max_workers is None:
+        max_workers = networkutil.chain_id_to_subgraph_max_workers(chainID)
+
+    # updated by each response; read when cutting the next batch
+    sizing = {"snapshots_per_request": 1, "largest_page": 0}
+
+    def _batches() -> Iterator[List[int]]:
+        i = 0
+        while i < len(blocks):
+            n = sizing["snapshots_per_request"]
+            yield blocks[i : i + n]
+            i += n
+
+    async def _fetch(batch: List[int]) -> List[list]:
+        return await _async_fetch_snapshot_batch(
+            entity,
+            fields,
+            chainID,
+            batch,
+            where=where,
+            chunk_size=chunk_size,
+            sizing=sizing,
+            transform=transform,
+        )
+
+    async for snapshots in ordered_map(_fetch, _batches(), max_workers):
+        for snapshot in snapshots:
+            yield snapshot
+
+
+@enforce_types
+async def _async_fetch_snapshot_batch(
+    entity: str,
+    fields: str,
+    chainID: int,
+    blocks: List[int],
+    *,
+    where: str,
+    chunk_size: int,
+    sizing: dict,
+    transform: Optional[Callable] = None,
+) -> List[list]:
+    """
+    @description
+      Fetch all records of `entity` at each of `blocks`, a page per block
+      per request, until every block's snapshot is complete.
+
+    @return
+      snapshots -- list of lists of records, one list per block
+    """
+    snapshots: List[list] = [[] for _ in blocks]
+    last_ids = ["" for _ in blocks]
+    pending = list(range(len(blocks)))
+
+    while pending:
+        block_last_ids = [(blocks[i], last_ids[i]) for i in pending]
+        query = build_snapshots_query(entity, fields, block_last_ids, where, chunk_size)
+
+        # [alias_i] : # records in this response
+        page_sizes = [0 for _ in pending]
+        async for alias, record in async_stream_query(query, chainID):
+            alias_i = int(alias[1:])  # "b3" -> 3
+            i = pending[alias_i]
+            page_sizes[alias_i] += 1
+            last_ids[i] = record["id"]
+            snapshots[i].append(record if transform is None else transform(record))
+
+        # full page, so maybe more records
+        pending = [i for i, n in zip(pending, page_sizes) if n == chunk_size]
+
+        # size by the largest page so far, not this response's: the short
+        # last page of a big snapshot doesn't make the next ones small
+        sizing["largest_page"] = max(sizing["largest_page"], *page_sizes)
+        sizing["snapshots_per_request"] = max(
+            1,
+            min(
+                MAX_SNAPSHOTS_PER_REQUEST,
+                MAX_RECORDS_PER_REQUEST // max(sizing["largest_page"], 1),
+            ),
+        )
+
+    return snapshots
+
+
 def get_last_block(chain_id: int) -> int:
     """Get the last block that was synced to the subgraph."""
     query = "{_meta { block { number } } }"
@@ -0,0 +1,175 @@
+"""
+Incremental decoding of subgraph responses, for streaming.
+
+A response looks like `{"data": {"alias": [record, ..], ..}, "errors": ..}`.
+ResponseDecoder is fed the raw body chunk by chunk, and hands back each
+record of each list in "data" as soon as it's complete. So only the record
+being decoded is held, never the whole body or the whole page.
+
+Each record is decoded with the stdlib json decoder, so it's identical to
+what json.loads() of the whole body would give.
+"""
+
+import codecs
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+
+_json_decoder = json.JSONDecoder()
+
+
+class _NeedMoreData(Exception):
+    """The buffer ends before the current token does"""
+
+
+class ResponseDecoder:
+    """
+    Push parser for GraphQL responses. Events returned by feed() & close():
+      ("begin", ("data",), None) -- "data" is an object; its fields follow
+      ("list", ("data", alias), None) -- a list field of "data" begins
+      ("record", ("data", alias), record) -- an item of that list
+      ("value", path, value) -- any other field, e.g. (("errors",), [..]),
+        (("data",), None) or (("data", "_meta"), {..})
+    """
+
+    def __init__(self):
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._final = False  # True once close() is called
+        self._key = ""  # current key of the top-level or "data" object
+        self._events: List[Tuple[str, tuple, Any]] = []
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, tuple, Any]]:
+        """Add the next chunk of the body. Return the events it completes"""
+        return self._feed(self._text_decoder.decode(chunk))
+
+    def close(self) -> List[Tuple[str, tuple, Any]]:
+        """Signal the end of the body. Raise ValueError if it's incomplete"""
+        self._final = True
+        events = self._feed(self._text_decoder.decode(b"", final=True))
+        if self._state != "done":
+            raise ValueError("Truncated JSON response")
+        return events
+
+    def _feed(self, text: str) -> List[Tuple[str, tuple, Any]]:
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        while self._state != "done":
+            step_pos = self._pos
+            try:
+                self._step()
+            except _NeedMoreData:
+                self._pos = step_pos  # redo the whole step on the next feed
+                break
+        events, self._events = self._events, []
+        return events
+
+    def _step(self):
+        """Consume one token. Raise _NeedMoreData if it's not all there"""
+        char = self._next_char()
+        getattr(self, f"_on_{self._state}")(char)
+
+    # one method per state; each consumes the token at self._pos
+
+    def _on_start(self, char: str):
+        self._expect(char, "{")
+        self._state = "top_key"
+
+    def _on_top_key(self, char: str):
+        if char == "}":
+            self._pos += 1
+            self._state = "done"
+        elif char == ",":
+            self._pos += 1
+        else:
+            self._key = self._decode_key()
+            self._state = "data_start" if self._key == "data" else "top_value"
+
+    def _on_top_value(self, char: str):  # pylint: disable=unused-argument
+        self._emit("value", (self._key,), self._decode_value())
+        self._state = "top_key"
+
+    def _on_data_start(self, char: str):
+        if char == "{":
+            self._pos += 1
+            self._emit("begin", ("data",), None)
+            self._state = "data_key"
+        else:  # e.g. null
+            self._emit("value", ("data",), self._decode_value())
+            self._state = "top_key"
+
+    def _on_data_key(self, char: str):
+        if char == "}":
+            self._pos += 1
+            self._state = "top_key"
+        elif char == ",":
+            self._pos += 1
+        else:
+            self._key = self._decode_key()
+            self._state = "data_value"
+
+    def _on_data_value(self, char: str):
+        if char == "[":
+            self._pos += 1
+            self._emit("list", ("data", self._key), None)
+            self._state = "records"
+        else:
+            self._emit("value", ("data", self._key), self._decode_value())
+            self._state = "data_key"
+
+    def _on_records(self, char: str):
+        if char == "]":
+            self._pos += 1
+            self._state = "data_key"
+        elif char == ",":
+            self._pos += 1
+        else:
+            self._emit("record", ("data", self._key), self._decode_value())
+
+    def _emit(self, kind: str, path: tuple, value: Any):
+        self._events.append((kind, path, value))
+
+    def _next_char(self) -> str:
+        """Skip whitespace, and return the char there without consuming it"""
+        buf = self._buf
+        while self._pos < len(buf) and buf[self._pos] in _WHITESPACE:
+            self._pos += 1
+        if self._pos >= len(buf):
+            raise _NeedMoreData()
+        return buf[self._pos]
+
+    def _expect(self, char: str, expected: str):
+        if char != expected:
+            got = self._buf[self._pos : self._pos + 20]
+            raise ValueError(f"Expected {expected!r} at {self._pos}, got {got!r}")
+        self._pos += 1
+
+    def _decode_key(self) -> str:
+        """Consume `"key" :` and return the key"""
+        key = self._decode_value()
+        if not isinstance(key, str):
+            raise ValueError(f"Expected an object key, got {key!r}")
+        self._expect(self._next_char(), ":")
+        return key
+
+    def _decode_value(self) -> Any:
+        """Consume one complete JSON value and return it"""
+        try:
+            value, end = _json_decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError as e:
+            if not self._final:
+                raise _NeedMoreData() from e  # likely cut short by the chunk
+            raise ValueError(f"Invalid JSON response: {e}") from e
+
+        # a number or literal may continue in the next chunk. In a valid
+        # body, a value is always followed by whitespace, `,` `:` `]` or `}`
+        if end >= len(self._buf) or self._buf[end] not in _DELIMITERS:
+            if not self._final:
+                raise _NeedMoreData()
+            raise ValueError(f"Invalid JSON response at {end}")
+        self._pos = end
+        return value
@@ -4,7 +4,11 @@ from typing import Union
 from enforce_typing import enforce_types
 from web3.main import Web3
 
-from df_py.util.constants import MULTISIG_ADDRS
+from df_py.util.constants import (
+    MULTISIG_ADDRS,
+    SUBGRAPH_MAX_RPS,
+    SUBGRAPH_MAX_WORKERS,
+)
 from df_py.util.web3 import get_rpc_url, get_web3
 
 _BARGE_ADDRESS_FILE = "~/.ocean/ocean-contracts/artifacts/address.json"
@@ -57,7 +61,15 @@ def chain_id_to_address_file(chainID: int) -> str:  # pylint: disable=unused-arg
 
 @enforce_types
 def chain_id_to_subgraph_uri(chainID: int) -> str:
-    """Returns the subgraph URI for a given chainID"""
+    """
+    Returns the subgraph URI for a given chainID.
+    Envvar <NETWORK>_SUBGRAPH_URI overrides it, e.g. to point at
+    a fake_subgraph server.
+    """
+    override = os.getenv(_subgraph_uri_envvar(chainID))
+    if override:
+        return override
+
     sg = "/subgraphs/name/oceanprotocol/ocean-subgraph"
     if chainID == DEV_CHAINID:
         return "http://127.0.0.1:9000" + sg
@@ -66,6 +78,33 @@ def chain_id_to_subgraph_uri(chainID: int) -> str:
     return f"https://v4.subgraph.{network_str}.oceanprotocol.com" + sg
 
 
+@enforce_types
+def subgraph_uri_is_overridden(chainID: int) -> bool:
+    """Is the subgraph URI for chainID set by envvar?"""
+    return bool(os.getenv(_subgraph_uri_envvar(chainID)))
+
+
+def _subgraph_uri_envvar(chainID: int) -> str:
+    network_str = chain_id_to_network(chainID)
+    return f"{network_str.upper().replace('-', '_')}_SUBGRAPH_URI"
+
+
+@enforce_types
+def chain_id_to_subgraph_max_workers(chainID: int) -> int:
+    """Returns the max # concurrent subgraph queries for a given chainID"""
+    network_str = chain_id_to_network(chainID)
+    envvar = f"{network_str.upper().replace('-', '_')}_SUBGRAPH_MAX_WORKERS"
+    return int(os.getenv(envvar, str(SUBGRAPH_MAX_WORKERS)))
+
+
+@enforce_types
+def chain_id_to_subgraph_max_rps(chainID: int) -> float:
+    """Returns the max # subgraph requests per second for a given chainID"""
+    network_str = chain_id_to_network(chainID)
+    envvar = f"{network_str.upper().replace('-', '_')}_SUBGRAPH_MAX_RPS"
+    return float(os.getenv(envvar, str(SUBGRAPH_MAX_RPS)))
+
+
 @enforce_types
 def chain_id_to_multisig_uri(chainID: int) -> str:
     """Returns the multisig API URI for a given chainID"""
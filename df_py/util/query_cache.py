@@ -0,0 +1,198 @@
+"""
+On-disk cache of subgraph responses, for queries whose answer can't change:
+those pinned to a block (`block: {number: N}` or `block_lte: N`) that the
+subgraph has indexed and that's final (see graphutil._cacheable_block()).
+Keyed by (chainID, normalized query, block). Stored in SQLite;
+least recently used entries are evicted to stay under a max size.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+from enforce_typing import enforce_types
+
+from df_py.util.constants import SUBGRAPH_CACHE_FILE, SUBGRAPH_CACHE_MAX_MB
+
+_PINNED_BLOCK_RE = re.compile(r"block:\s*{\s*number:\s*(\d+)\s*}|block_lte:\s*(\d+)")
+
+# the cache in use; None means disabled. Set by enable() & disable()
+_CACHE: Optional["QueryCache"] = None
+
+
+# a string literal, or whitespace around punctuation, or other whitespace
+_QUERY_TOKEN_RE = re.compile(r'("(?:[^"\\]|\\.)*")|\s*([{}()\[\]:,])\s*|\s+')
+
+
+@enforce_types
+def normalize_query(query: str) -> str:
+    """Drop insignificant whitespace, so formatting doesn't change the key"""
+
+    def _normalize_token(match) -> str:
+        literal, punctuation = match.group(1), match.group(2)
+        if literal is not None:
+            return literal
+        if punctuation is not None:
+            return punctuation
+        return " "
+
+    return _QUERY_TOKEN_RE.sub(_normalize_token, query).strip()
+
+
+@enforce_types
+def pinned_block(query: str) -> Optional[int]:
+    """
+    @description
+      Return the highest block the query is pinned to, via
+      `block: {number: N}` or `block_lte: N`. None if it's not pinned,
+      i.e. its answer depends on the subgraph's latest block.
+    """
+    blocks = [int(a or b) for a, b in _PINNED_BLOCK_RE.findall(query)]
+    if not blocks:
+        return None
+    return max(blocks)
+
+
+class QueryCache:
+    """Size-bounded LRU store of subgraph responses, in a SQLite file"""
+
+    @enforce_types
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.isolation_level = None  # autocommit
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, chain_id INTEGER, block INTEGER,"
+            " size INTEGER, last_used REAL, value BLOB)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+        self._total_bytes = self._sum_sizes()
+
+    @enforce_types
+    def get(self, chainID: int, query: str, block: int) -> Optional[dict]:
+        key = _key(chainID, query, block)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    @enforce_types
+    def put(self, chainID: int, query: str, block: int, result: dict):
+        key = _key(chainID, query, block)
+        value = zlib.compress(json.dumps(result).encode())
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, chainID, block, len(value), time.time(), value),
+            )
+            self._total_bytes += len(value) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def size_bytes(self) -> int:
+        return self._total_bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        """Drop least recently used entries until under max_bytes"""
+        # other processes may share the file, so re-measure first
+        self._total_bytes = self._sum_sizes()
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def _sum_sizes(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses")
+        return int(row.fetchone()[0])
+
+
+@enforce_types
+def _key(chainID: int, query: str, block: int) -> str:
+    """Content address of a (chainID, normalized query, block)"""
+    content = f"{chainID}\n{block}\n{normalize_query(query)}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@enforce_types
+def enable(path: Optional[str] = None, max_mb: Optional[int] = None) -> QueryCache:
+    """
+    @description
+      Turn on caching of subgraph responses, for this process.
+
+    @arguments
+      path -- SQLite file. Default: envvar SUBGRAPH_CACHE_FILE, else
+        constants.SUBGRAPH_CACHE_FILE
+      max_mb -- max size of cached responses, in MB. Default: envvar
+        SUBGRAPH_CACHE_MAX_MB, else constants.SUBGRAPH_CACHE_MAX_MB
+    """
+    global _CACHE
+    if path is None:
+        path = os.getenv("SUBGRAPH_CACHE_FILE", SUBGRAPH_CACHE_FILE)
+    if max_mb is None:
+        max_mb = int(os.getenv("SUBGRAPH_CACHE_MAX_MB", str(SUBGRAPH_CACHE_MAX_MB)))
+
+    disable()
+    _CACHE = QueryCache(os.path.expanduser(path), max_mb * 1024 * 1024)
+    return _CACHE
+
+
+def disable():
+    """Turn off caching of subgraph responses"""
+    global _CACHE
+    if _CACHE is not None:
+        _CACHE.close()
+    _CACHE = None
+
+
+def get_cache() -> Optional[QueryCache]:
+    """Return the cache in use, or None if caching is off"""
+    return _CACHE
+
+
+def print_cache_stats():
+    if _CACHE is None:
+        return
+    print(
+        f"Subgraph cache: {_CACHE.hits} hits, {_CACHE.misses} misses"
+        f", {_CACHE.size_bytes() / 1e6:.1f} MB at {_CACHE.path}"
+    )
@@ -5,12 +5,24 @@
 """
 This is copied from Web3 python library to control the `requests`
 session parameters.
+
+It also holds the aiohttp sessions used for subgraph queries.
 """
 
+import asyncio
+import atexit
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Tuple
+
+import aiohttp
 import lru
 import requests
 from requests.adapters import HTTPAdapter
 from web3._utils.caching import generate_cache_key
+from yarl import URL
+
+POOL_SIZE = 25
 
 
 # pylint: disable=unused-argument
@@ -47,3 +59,155 @@ def make_post_request(endpoint_uri, data, *args, **kwargs):
     response.raise_for_status()
 
     return response.content
+
+
+# aiohttp sessions are bound to the event loop they were made on:
+# [loop][(endpoint_uri, pool_size)] : session
+_async_session_cache: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+# [host] : {"requests": #, "connections": #}, over all aiohttp sessions
+_async_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _get_async_session(endpoint_uri: str, pool_size: int) -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    sessions = _async_session_cache.setdefault(loop, {})
+    cache_key = (endpoint_uri, pool_size)
+    session = sessions.get(cache_key)
+    if session is None or session.closed:
+        url = URL(endpoint_uri)
+        host = f"{url.scheme}://{url.host}:{url.port}"
+        host_stats = _async_stats.setdefault(host, {"requests": 0, "connections": 0})
+        # requests beyond pool_size wait for a free connection
+        connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size)
+        session = aiohttp.ClientSession(
+            connector=connector, trace_configs=[_stats_trace_config(host_stats)]
+        )
+        sessions[cache_key] = session
+    return session
+
+
+def _stats_trace_config(host_stats: Dict[str, int]) -> aiohttp.TraceConfig:
+    # pylint: disable=unused-argument
+    async def _on_request_start(session, ctx, params):
+        host_stats["requests"] += 1
+
+    # pylint: disable=unused-argument
+    async def _on_connection_create_end(session, ctx, params):
+        host_stats["connections"] += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    return trace_config
+
+
+async def async_make_graphql_request(
+    endpoint_uri: str, query: str, pool_size: int = POOL_SIZE, timeout: int = 30
+) -> Tuple[int, bytes]:
+    """
+    @description
+      Post a GraphQL query over a pooled keep-alive aiohttp session, so
+      that consecutive queries to the same host reuse their connections.
+      Responses are gzip/deflate-compressed if the server supports it.
+
+    @arguments
+      pool_size -- max # open connections to the host; further concurrent
+        requests wait for a free one
+
+    @return
+      status -- HTTP status code
+      body -- raw response body
+    """
+    session = _get_async_session(endpoint_uri, pool_size)
+    async with session.post(
+        endpoint_uri,
+        json={"query": query},
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as response:
+        return response.status, await response.read()
+
+
+@asynccontextmanager
+async def async_graphql_response(
+    endpoint_uri: str, query: str, pool_size: int = POOL_SIZE, timeout: int = 30
+) -> AsyncIterator[aiohttp.ClientResponse]:
+    """
+    @description
+      Like async_make_graphql_request(), but hand back the response before
+      its body is read, so it can be consumed chunk by chunk from
+      `response.content`. Here `timeout` bounds each read, not the whole
+      body, so a slow consumer doesn't time out a healthy stream.
+
+    @return
+      response -- aiohttp response, open until the context exits
+    """
+    session = _get_async_session(endpoint_uri, pool_size)
+    async with session.post(
+        endpoint_uri,
+        json={"query": query},
+        timeout=aiohttp.ClientTimeout(
+            total=None, sock_connect=timeout, sock_read=timeout
+        ),
+    ) as response:
+        yield response
+
+
+async def async_close_sessions():
+    """Close the aiohttp sessions of the running event loop"""
+    sessions = _async_session_cache.pop(asyncio.get_running_loop(), {})
+    for session in sessions.values():
+        await session.close()
+
+
+@atexit.register
+def _close_async_sessions_at_exit():
+    for loop in list(_async_session_cache.keys()):
+        if loop.is_running() and not loop.is_closed():
+            future = asyncio.run_coroutine_threadsafe(async_close_sessions(), loop)
+            future.result(timeout=5)
+
+
+def get_connection_stats() -> Dict[str, Dict[str, int]]:
+    """
+    @return
+      stats -- dict of [host] : {"requests": #, "connections": #,
+        "reused": #} over all pooled sessions, sync and async. Every
+        reused connection is a TCP + TLS handshake saved.
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+
+    def _host_stats(host: str) -> Dict[str, int]:
+        return stats.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})
+
+    for session in _session_cache.values():
+        for adapter in session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:  # evicted meanwhile
+                    continue
+                host_stats = _host_stats(f"{pool.scheme}://{pool.host}:{pool.port}")
+                host_stats["requests"] += pool.num_requests
+                host_stats["connections"] += pool.num_connections
+
+    for host, async_host_stats in _async_stats.items():
+        host_stats = _host_stats(host)
+        host_stats["requests"] += async_host_stats["requests"]
+        host_stats["connections"] += async_host_stats["connections"]
+
+    for host_stats in stats.values():
+        host_stats["reused"] = host_stats["requests"] - host_stats["connections"]
+
+    return stats
+
+
+def print_connection_stats():
+    """Print connection reuse per host. See get_connection_stats()"""
+    print("HTTP connection reuse:")
+    for host, host_stats in sorted(get_connection_stats().items()):
+        print(
+            f"  {host}: {host_stats['requests']} requests"
+            f", {host_stats['connections']} connections opened"
+            f", {host_stats['reused']} handshakes saved"
+        )
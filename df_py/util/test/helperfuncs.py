@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+from typing import Callable
+
+from web3.main import Web3
+
+T0 = 1_600_000_000  # timestamp of block 0, by default
+
+
+class FakeEth:
+    """Blocks 0..head, with timestamps from ts_of_block. Logs get_block()"""
+
+    def __init__(self, ts_of_block: Callable[[int], int], head: int, chain_id: int):
+        self.ts_of_block = ts_of_block
+        self.head = head
+        self.chain_id = chain_id
+        self.calls: list = []
+
+    def get_block(self, block):
+        self.calls.append(block)
+        number = self.head if block == "latest" else block
+        if not 0 <= number <= self.head:
+            raise ValueError(f"Block {number} not found")
+        return SimpleNamespace(number=number, timestamp=self.ts_of_block(number))
+
+
+class FakeWeb3(Web3):
+    """Just enough of a Web3 for blocktime.py, without a chain"""
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self,
+        ts_of_block: Callable[[int], int] = lambda n: T0 + 12 * n,
+        head: int = 300_000,
+        chain_id: int = 137,
+    ):
+        # a stand-in for web3's Eth, not a subclass of it
+        self.eth: FakeEth = FakeEth(  # type: ignore[assignment]
+            ts_of_block, head, chain_id
+        )
+
+    def block_calls(self) -> list:
+        """Numbers of the blocks fetched so far, excl. 'latest'"""
+        return [b for b in self.eth.calls if b != "latest"]
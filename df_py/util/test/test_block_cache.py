@@ -0,0 +1,123 @@
+import json
+import os
+from unittest.mock import Mock
+
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util import block_cache
+from df_py.util.block_cache import BlockTimestampCache, BlockTimestamps
+from df_py.util.blocktime import (
+    eth_find_closest_block,
+    timestamp_to_future_block,
+    timestr_to_block,
+    timestr_to_timestamp,
+)
+from df_py.util.test.helperfuncs import T0, FakeWeb3
+
+HEAD = 300_000
+
+
+def _web3(chain_id: int = 137):
+    return FakeWeb3(head=HEAD, chain_id=chain_id)
+
+
+@pytest.fixture(autouse=True, name="cache_dir")
+def fixture_cache_dir(tmp_path):
+    block_cache.enable(str(tmp_path))
+    yield str(tmp_path)
+    block_cache.disable()
+
+
+@enforce_types
+def test_second_conversion_is_free(cache_dir):
+    timestr = "2020-10-01"  # ~5 days after block 0
+    web3 = _web3()
+    block = timestr_to_block(web3, timestr)
+    assert T0 + 12 * block == pytest.approx(timestr_to_timestamp(timestr), abs=12)
+    assert len(web3.block_calls()) > 1
+
+    # same process, another web3
+    web3 = _web3()
+    assert timestr_to_block(web3, timestr) == block
+    assert web3.eth.calls == []
+
+    # another process: from the file
+    block_cache.disable()
+    block_cache.enable(cache_dir)
+    web3 = _web3()
+    assert timestr_to_block(web3, timestr) == block
+    assert web3.eth.calls == []
+    assert os.path.exists(os.path.join(cache_dir, "137.json"))
+
+    # other dates reuse the blocks fetched so far
+    web3 = _web3()
+    timestr_to_block(web3, "2020-10-01_00:01")
+    assert len(web3.eth.calls) < 10
+
+
+@enforce_types
+def test_eth_fetches_each_block_once():
+    web3 = _web3(1)
+    block = timestr_to_block(web3, "2020-10-01_00:00:06")
+    numbers = [b for b in web3.eth.calls if b != "latest"]
+    assert len(numbers) == len(set(numbers))
+    assert T0 + 12 * block == pytest.approx(
+        timestr_to_timestamp("2020-10-01_00:00:06"), abs=6
+    )
+
+    # and a BlockTimestamps can be shared across calls
+    blocks = BlockTimestamps(web3)
+    assert eth_find_closest_block(web3, block + 3, T0 + 12 * block, blocks) == block
+    n_calls = len(web3.eth.calls)
+    assert eth_find_closest_block(web3, block + 3, T0 + 12 * block, blocks) == block
+    assert len(web3.eth.calls) == n_calls
+
+
+@enforce_types
+def test_recent_blocks_not_cached(cache_dir):
+    web3 = _web3()
+    timestamp_to_future_block(web3, T0 + 12 * (HEAD + 100))
+
+    with open(os.path.join(cache_dir, "137.json"), encoding="utf-8") as f:
+        d = json.load(f)
+    assert d["head"] == HEAD
+    assert list(d["timestamps"]) == [str(HEAD - 40_000)]
+
+
+@enforce_types
+def test_not_cached_for_dev_chains_and_mocks():
+    assert block_cache.cache_for_web3(_web3(8996)) is None
+    assert block_cache.cache_for_web3(Mock()) is None
+    assert block_cache.cache_for_web3(_web3(137)) is block_cache.get_cache(137)
+
+
+@enforce_types
+def test_save_merges(tmp_path):
+    path = str(tmp_path / "x" / "1.json")
+    cache1 = BlockTimestampCache(1, path)
+    cache2 = BlockTimestampCache(1, path)
+    for cache, block in [(cache1, 10), (cache2, 20)]:
+        cache.note_head(1000)
+        cache.put_timestamp(block, block * 12)
+        cache.put_answer(f"closest:{block}", block)
+    cache.put_timestamp(999, 1)  # not final
+    cache1.save()
+    cache2.save()
+
+    cache = BlockTimestampCache(1, path)
+    assert cache.timestamps == {10: 120, 20: 240}
+    assert cache.answers == {"closest:10": 10, "closest:20": 20}
+    assert cache.head == 1000
+
+
+@enforce_types
+def test_unreadable_file(tmp_path):
+    path = str(tmp_path / "1.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    cache = BlockTimestampCache(1, path)
+    assert cache.timestamps == {}
+    cache.note_head(5)
+    cache.save()
+    assert BlockTimestampCache(1, path).head == 5
@@ -0,0 +1,153 @@
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util import block_cache
+from df_py.util.block_cache import BlockTimestamps
+from df_py.util.block_index import BlockIndex
+from df_py.util.blocktime import (
+    get_block_number_thursday,
+    timestamp_to_block,
+    timestr_to_block,
+)
+from df_py.util.test.helperfuncs import T0, FakeWeb3
+
+HEAD = 3_000_000
+
+
+@pytest.fixture(autouse=True, name="cache_dir")
+def fixture_cache_dir(tmp_path):
+    block_cache.enable(str(tmp_path))
+    yield str(tmp_path)
+    block_cache.disable()
+
+
+@enforce_types
+def test_block_index(tmp_path):
+    web3 = FakeWeb3(lambda b: T0 + 2 * b, HEAD)
+    blocks = BlockTimestamps(web3)
+    path = str(tmp_path / "137.idx")
+
+    index = BlockIndex(path, spacing=1000)
+    assert len(index) == 0 and index.bracket(T0 + 10) is None
+    assert index.anchor_at_or_before(99_999) is None
+
+    # the anchors around a block, if not there yet & not past final
+    assert index.add_around(blocks, 12_345, final=99_999) == 2
+    assert index.blocks.tolist() == [12_000, 13_000]
+    assert index.add_around(blocks, 13_000, final=99_999) == 0
+    assert index.add_around(blocks, 50_500, final=50_900) == 1
+    assert index.blocks.tolist() == [12_000, 13_000, 50_000]
+    assert len(web3.block_calls()) == 3
+
+    assert index.bracket(T0 + 2 * 12_500) == (12_000, T0 + 24_000, 13_000, T0 + 26_000)
+    assert index.bracket(T0 + 2 * 13_000) == (12_000, T0 + 24_000, 13_000, T0 + 26_000)
+    assert index.bracket(T0 + 2 * 20_000) == (13_000, T0 + 26_000, 50_000, T0 + 100_000)
+    assert index.bracket(T0 + 2 * 12_000) is None  # before 1st anchor
+    assert index.bracket(T0 + 2 * 50_001) is None  # after last
+    assert index.anchor_at_or_before(49_999) == (13_000, T0 + 26_000)
+    assert index.anchor_at_or_before(99_999) == (50_000, T0 + 100_000)
+    assert index.anchor_at_or_before(11_999) is None
+
+    # 16 bytes per anchor, + header
+    index.save()
+    assert os.path.getsize(path) == 16 + 16 * 3
+    index2 = BlockIndex(path, spacing=1000)
+    assert index2.blocks.tolist() == index.blocks.tolist()
+    assert index2.timestamps.tolist() == index.timestamps.tolist()
+
+    # saving keeps the anchors of both memory & file
+    index.add_around(blocks, 30_001, final=99_999)
+    index2.add_around(blocks, 70_001, final=99_999)
+    index.save()
+    index2.save()
+    index.save()  # nothing new: no write
+    anchors = [12_000, 13_000, 30_000, 31_000, 50_000, 70_000, 71_000]
+    assert BlockIndex(path, spacing=1000).blocks.tolist() == anchors
+
+    # other spacing, or a truncated file: start over
+    assert len(BlockIndex(path, spacing=500)) == 0
+    with open(path, "r+b") as f:
+        f.truncate(16 + 16 * 4 + 3)
+    assert len(BlockIndex(path, spacing=1000)) == 4
+    with open(path, "wb") as f:
+        f.write(b"junk")
+    assert len(BlockIndex(path, spacing=1000)) == 0
+
+
+@enforce_types
+def test_timestamp_to_block_by_index(cache_dir):
+    # block times drift, jump & jitter
+    rng = np.random.default_rng(3)
+    n_blocks = HEAD + 50_001  # the chain grows by 50K blocks, later
+    secs = 2.0 + (rng.random(n_blocks) < 0.1)
+    secs[HEAD // 2 :] *= rng.uniform(0.5, 1.5, n_blocks - HEAD // 2)
+    ts = (T0 + np.cumsum(np.floor(secs))).astype(int)
+    web3 = FakeWeb3(lambda b: int(ts[b]), HEAD)
+
+    # 1st lookup of each block: a search, & the anchors around the block
+    targets = rng.integers(HEAD - 290_000, HEAD - 20_000, 20).tolist()
+    for block in targets:
+        assert timestamp_to_block(web3, int(ts[block])) == block
+    index = block_cache.get_cache(137).index
+    assert len(index) <= 2 * len(targets)
+
+    # later lookups near those: ~2-5 RPC calls; no need for "latest"
+    n_calls = []
+    for block in targets:
+        blocks = BlockTimestamps(web3)
+        assert timestamp_to_block(web3, int(ts[block + 300]), blocks) == block + 300
+        n_calls.append(blocks.rpc_calls)
+    assert np.mean(n_calls) <= 5
+    assert "latest" not in web3.eth.calls[-max(n_calls) :]
+
+    # index is on disk; a later process adds to it
+    assert os.path.exists(os.path.join(cache_dir, "137.idx"))
+    block_cache.disable()
+    block_cache.enable(cache_dir)
+    web3 = FakeWeb3(lambda b: int(ts[b]), HEAD + 50_000)
+    assert timestamp_to_block(web3, int(ts[HEAD + 30_000])) == HEAD + 30_000
+    index = block_cache.get_cache(137).index
+    assert {HEAD + 20_000, HEAD + 30_000} <= set(index.blocks.tolist())
+    assert len(web3.eth.calls) <= 20
+
+
+@enforce_types
+def test_first_lookup_on_long_chain():
+    # the index doesn't fill in anchors between the lookups' blocks
+    head = 50_000_000
+    web3 = FakeWeb3(lambda b: T0 + 2 * b, head)
+    blocks = BlockTimestamps(web3)
+    assert timestamp_to_block(web3, T0 + 2 * 35_000_000, blocks) == 35_000_000
+    assert blocks.rpc_calls <= 8
+
+    blocks = BlockTimestamps(web3)
+    assert timestamp_to_block(web3, T0 + 2 * 45_000_123, blocks) == 45_000_123
+    assert blocks.rpc_calls <= 8
+    assert len(block_cache.get_cache(137).index) == 4
+
+
+@enforce_types
+def test_timestr_to_block_eth_by_index():
+    web3 = FakeWeb3(lambda b: T0 + 12 * b, HEAD, chain_id=1)
+    timestr_to_block(web3, "2021-09-01")  # starts the index
+
+    web3 = FakeWeb3(lambda b: T0 + 12 * b, HEAD, chain_id=1)
+    block = timestr_to_block(web3, "2021-09-02_12:00:05")
+    timestamp = datetime(2021, 9, 2, 12, 0, 5, tzinfo=timezone.utc).timestamp()
+    assert block == round((timestamp - T0) / 12)
+    assert len(web3.eth.calls) <= 5
+
+
+@enforce_types
+def test_get_block_number_thursday_by_index():
+    web3 = FakeWeb3(lambda b: T0 + 12 * b, HEAD)
+    block_ref = get_block_number_thursday(web3)
+    timestr_to_block(web3, "2021-09-01")  # starts the index
+
+    web3 = FakeWeb3(lambda b: T0 + 12 * b, HEAD)
+    assert get_block_number_thursday(web3) == block_ref
+    assert web3.block_calls() == []  # old block is an anchor
@@ -1,7 +1,8 @@
+import numpy
 import pytest
 from enforce_typing import enforce_types
 
-from df_py.util.blockrange import BlockRange
+from df_py.util.blockrange import BlockRange, sample_offsets
 
 
 @enforce_types
@@ -120,3 +121,51 @@ def test_no_sampling():
     # should return fin if num_samples is 1
     rng = BlockRange(st=10, fin=20, num_samples=1)
     assert rng.get_blocks() == [20]
+
+
+@enforce_types
+def test_rnd_seed_legacy():
+    # same blocks as before the Generator: numpy.random.choice, seeded
+    for seed, (st, fin, n) in [(42, (10, 5000, 100)), (1, (100, 200, 2))]:
+        numpy.random.seed(seed)
+        cand_blocks = list(range(st, fin + 1))
+        expected = sorted(numpy.random.choice(cand_blocks, n, replace=False))
+        r = BlockRange(st, fin, n, random_seed=seed, sampling="legacy")
+        assert r.get_blocks() == expected
+
+
+@enforce_types
+def test_sampling_envvar(monkeypatch):
+    r1 = BlockRange(st=10, fin=5000, num_samples=100, random_seed=42)
+    monkeypatch.setenv("BLOCKRANGE_SAMPLING", "legacy")
+    r2 = BlockRange(st=10, fin=5000, num_samples=100, random_seed=42)
+    r3 = BlockRange(10, 5000, 100, random_seed=42, sampling="legacy")
+    assert r1.get_blocks() != r2.get_blocks()
+    assert r2.get_blocks() == r3.get_blocks()
+
+    with pytest.raises(ValueError):
+        BlockRange(st=10, fin=20, num_samples=3, sampling="foo")
+
+
+@enforce_types
+def test_huge_range():
+    # a list of 10**12 blocks wouldn't fit in memory
+    r = BlockRange(st=10**12, fin=2 * 10**12, num_samples=50, random_seed=1)
+    blocks = r.get_blocks()
+    assert len(set(blocks)) == 50
+    assert 10**12 <= min(blocks) and max(blocks) <= 2 * 10**12
+    assert blocks == sorted(blocks)
+
+
+@enforce_types
+def test_sample_offsets():
+    rng = numpy.random.default_rng(0)
+    counts = numpy.zeros(10)
+    for _ in range(10_000):
+        offsets = sample_offsets(rng, 10, 3)
+        assert len(set(offsets)) == 3
+        counts[offsets] += 1
+    assert counts / 10_000 == pytest.approx(0.3, abs=0.03)  # uniform
+
+    assert sample_offsets(rng, 5, 0) == []
+    assert sorted(sample_offsets(rng, 5, 5)) == [0, 1, 2, 3, 4]
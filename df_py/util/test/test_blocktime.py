@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util.block_cache import BlockTimestamps
+from df_py.util.blocktime import (
+    eth_find_closest_block,
+    search_block,
+    timestamp_to_block,
+    timestr_to_block,
+    timestr_to_timestamp,
+)
+from df_py.util.test.helperfuncs import T0, FakeWeb3
+
+
+@enforce_types
+def test_search_block_steady():
+    # like Polygon: 50M blocks, 2 s each
+    head = 50_000_000
+    web3 = FakeWeb3(lambda n: T0 + 2 * n, head)
+    rng = np.random.default_rng(0)
+    for block in rng.integers(1, head, 50).tolist():
+        for timestamp in [T0 + 2 * block, T0 + 2 * block - 1]:
+            blocks = BlockTimestamps(web3)
+            found = search_block(blocks, timestamp, (0, T0, head, T0 + 2 * head))
+            assert found == block
+            assert blocks.rpc_calls <= 4  # vs 26 for bisection
+
+
+@enforce_types
+def test_search_block_irregular():
+    # block times drift, jump & jitter; some blocks share a timestamp
+    rng = np.random.default_rng(1)
+    n = 1_000_000
+    secs = np.concatenate([np.full(n // 2, 2.0), np.full(n // 4, 5.0), np.ones(n // 4)])
+    secs *= rng.uniform(0.0, 2.0, n)
+    ts = T0 + np.cumsum(np.floor(secs)).astype(int)
+    web3 = FakeWeb3(lambda b: int(ts[b]), n - 1)
+
+    n_calls = []
+    for timestamp in rng.integers(ts[0] + 1, ts[-1], 200).tolist():
+        blocks = BlockTimestamps(web3)
+        found = search_block(blocks, timestamp, (0, int(ts[0]), n - 1, int(ts[-1])))
+        assert found == np.searchsorted(ts, timestamp, side="left")
+        n_calls.append(blocks.rpc_calls)
+    assert max(n_calls) <= 3 * 20  # 20 = log2(# blocks)
+    assert np.mean(n_calls) < 15
+
+
+@enforce_types
+def test_search_block_not_monotonic():
+    # block 500's timestamp is wrong: way in the future
+    ts = [T0 + 10 * b for b in range(1000)]
+    ts[500] = T0 + 10 * 900
+    web3 = FakeWeb3(lambda b: ts[b], 999)
+
+    for timestamp in [T0 + 10 * 300, T0 + 10 * 700 + 5]:
+        blocks = BlockTimestamps(web3)
+        found = search_block(blocks, timestamp, (0, ts[0], 999, ts[999]))
+        assert ts[found - 1] < timestamp <= ts[found]
+        assert blocks.rpc_calls <= 3 * 10
+
+
+@enforce_types
+def test_timestamp_to_block_rpc_calls(capsys):
+    web3 = FakeWeb3(lambda n: T0 + 2 * n, 50_000_000)
+    blocks = BlockTimestamps(web3)
+    assert timestamp_to_block(web3, T0 + 2 * 1234567 - 1, blocks) == 1234567
+    assert blocks.rpc_calls == len(web3.eth.calls) <= 6
+    assert f"RPC calls {blocks.rpc_calls}" in capsys.readouterr().out
+
+    # corner cases
+    assert timestamp_to_block(web3, T0) == 0
+    assert timestamp_to_block(web3, T0 + 2 * 50_000_000 + 1) == 50_000_000
+    with pytest.raises(ValueError):
+        timestamp_to_block(web3, T0 - 1)
+
+
+@enforce_types
+def test_eth_find_closest_block_irregular():
+    # mainnet-like: 12 s slots, some missed; then a stretch of erratic times
+    rng = np.random.default_rng(2)
+    secs = 12 * (1 + (rng.random(20_000) < 0.05))
+    secs[8000:12000] = rng.integers(1, 40, 4000)
+    ts = (T0 + np.cumsum(secs)).tolist()
+    web3 = FakeWeb3(lambda b: ts[b], len(ts) - 1, chain_id=1)
+
+    for _ in range(300):
+        block = int(rng.integers(1000, 19_000))
+        start = block + int(rng.choice([0, 1, -1, 7, -30, 900, -900]))
+        timestamp = ts[block] + int(rng.integers(-15, 15))
+        blocks = BlockTimestamps(web3)
+        found = eth_find_closest_block(web3, start, timestamp, blocks)
+        assert found == _closest_by_walk(ts, start, timestamp)
+        distance = abs(start - found) + 2
+        assert blocks.rpc_calls <= 4 * np.log2(distance) + 4
+
+
+@enforce_types
+def test_eth_find_closest_block_ends():
+    ts = [T0 + 12 * b for b in range(100)]
+    web3 = FakeWeb3(lambda b: ts[b], 99, chain_id=1)
+    assert eth_find_closest_block(web3, 90, ts[99] - 5) == 99
+    assert eth_find_closest_block(web3, 5, ts[0] + 5) == 0
+    with pytest.raises(ValueError):
+        eth_find_closest_block(web3, 50, ts[99] + 60)
+    with pytest.raises(ValueError):
+        eth_find_closest_block(web3, 50, ts[0] - 60)
+
+
+@enforce_types
+def test_timestr_to_block_eth_slow_blocks():
+    # 30 s blocks: steps at the 12.06 s average overshoot, more each time
+    head = 1_000_000
+    web3 = FakeWeb3(lambda b: T0 + 30 * b, head, chain_id=1)
+    block = timestr_to_block(web3, "2020-10-01")
+    assert block == round((timestr_to_timestamp("2020-10-01") - T0) / 30)
+    assert len(web3.eth.calls) < 40
+
+
+def _closest_by_walk(ts: list, block: int, timestamp: int) -> int:
+    """eth_find_closest_block(), as it was: 1 block per step"""
+    found = block
+    if ts[block] > timestamp:
+        while True:
+            last = found
+            found -= 1
+            if ts[found] < timestamp:
+                break
+    else:
+        while True:
+            last = found
+            found += 1
+            if ts[found] > timestamp:
+                break
+    if abs(ts[last] - timestamp) < abs(ts[found] - timestamp):
+        found = last
+    return found
@@ -1,6 +1,6 @@
 from datetime import datetime
 from math import ceil
-from unittest.mock import Mock, patch
+from unittest.mock import Mock
 
 import pytest
 
@@ -9,6 +9,7 @@ from pytest import approx
 
 from df_py.util.blockrange import create_range
 from df_py.util.blocktime import (
+    eth_find_closest_block,
     get_block_number_thursday,
     get_next_thursday_timestamp,
     get_st_fin_blocks,
@@ -120,14 +121,36 @@ def test_timestamp_to_block(w3):
 
 
 @enforce_types
-@patch("df_py.util.blocktime.optimize.bisect")
-def test_timestamp_to_block_validation(mock_time_since):
-    mock_time_since.return_value = (1, None)
+def test_eth_find_closest_block_irregular(w3):
+    # mine 40 blocks, 1 to 60 s apart
+    provider = w3.provider
+    timestamp = w3.eth.get_block("latest").timestamp
+    for i in range(40):
+        timestamp += [1, 7, 60, 13, 2][i % 5]
+        provider.make_request("evm_mine", [timestamp])
+    block_hi = w3.eth.get_block("latest").number
+    block_lo = block_hi - 39
+    stamps = {b: w3.eth.get_block(b).timestamp for b in range(block_lo, block_hi + 1)}
+
+    for block in range(block_lo + 1, block_hi - 5, 3):
+        for target in [stamps[block] - 1, stamps[block], stamps[block] + 4]:
+            closest = min(stamps, key=lambda b, t=target: abs(stamps[b] - t))
+            for start in [block_lo, block, block_hi - 2]:
+                found = eth_find_closest_block(w3, start, target)
+                assert abs(stamps[found] - target) == abs(stamps[closest] - target)
+
+
+@enforce_types
+def test_timestamp_to_block_validation():
+    # blocks 0-19 at ts=100, then block 20 at ts=100000
     target_ts = 100 + 16 * 60
     web3 = Mock()
-    block_mock_1 = Mock(number=20, timestamp=100)
-    block_mock_2 = Mock(number=20, timestamp=100000)
-    web3.eth.get_block.side_effect = [block_mock_1, block_mock_2] * 4
+
+    def get_block(block):
+        number = 20 if block == "latest" else block
+        return Mock(number=number, timestamp=100 if number < 20 else 100000)
+
+    web3.eth.get_block.side_effect = get_block
 
     with pytest.raises(ValueError) as err:
         timestamp_to_block(web3, target_ts)
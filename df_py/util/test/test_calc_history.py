@@ -0,0 +1,199 @@
+import os
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.predictoor import csvs as predictoor_csvs
+from df_py.predictoor.models import PredictContract, Prediction, Predictoor
+from df_py.util import calc_history as ch
+from df_py.volume import csvs
+from df_py.volume.calc_rewards import calc_volume_rewards_from_csvs
+
+QUERY_PATH = "df_py.volume.reward_calculator.query_predictoor_contracts"
+CHAINID = 137
+OCEAN_ADDR = "0x282d8efce846a88b159800bd4130ad77443fa1a1"
+NFT_ADDR = "0x" + "a" * 40
+LP_ADDRS = ["0x" + c * 40 for c in "123"]
+CONTRACT_ADDR = "0x" + "c" * 40
+
+
+@patch(QUERY_PATH, MagicMock(side_effect=AssertionError("queried contracts")))
+@enforce_types
+def test_calc_history(tmp_path):
+    history_dir = str(tmp_path)
+    for week in ["2023-11-16", "2023-11-23", "2023-11-30"]:
+        _save_week(os.path.join(history_dir, week), 1.0 if week[-2:] != "30" else 2.0)
+    os.mkdir(os.path.join(history_dir, "2023-12-07"))  # no csvs, so fails
+    with open(os.path.join(history_dir, "notes.txt"), "w"):  # not a week
+        pass
+
+    timings = ch.calc_history(history_dir, 1000.0, 500.0, n_workers=1)
+    assert [os.path.basename(t["week"]) for t in timings] == [
+        "2023-11-16",
+        "2023-11-23",
+        "2023-11-30",
+        "2023-12-07",
+    ]
+    for t in timings[:3]:
+        assert t["error"] is None
+        assert t["volume_s"] > 0.0 and t["predictoor_s"] > 0.0
+        assert t["total_s"] >= t["volume_s"] + t["predictoor_s"]
+        week_dir = t["week"]
+        assert os.path.exists(csvs.volume_rewards_csv_filename(week_dir))
+        assert os.path.exists(csvs.volume_rewardsinfo_csv_filename(week_dir))
+        assert os.path.exists(predictoor_csvs.predictoor_rewards_csv_filename(week_dir))
+    assert timings[3]["error"]
+
+    # same as calc'ing one week on its own
+    week_dir = timings[0]["week"]
+    rewards = csvs.load_volume_rewards_csv(week_dir)
+    pdr_rewards = predictoor_csvs.load_predictoor_rewards_csv(week_dir)
+    for filename in [
+        csvs.volume_rewards_csv_filename(week_dir),
+        csvs.volume_rewardsinfo_csv_filename(week_dir),
+        predictoor_csvs.predictoor_rewards_csv_filename(week_dir),
+    ]:
+        os.remove(filename)
+    calc_volume_rewards_from_csvs(
+        week_dir,
+        datetime(2023, 11, 16),
+        1000.0,
+        wait_for_subgraph=False,
+        predictoor_feed_addrs={},
+    )
+    assert csvs.load_volume_rewards_csv(week_dir) == rewards
+    assert sum(sum(r.values()) for r in pdr_rewards.values()) == 500.0
+
+    # 2nd run skips weeks that are done, unless overwrite
+    timings = ch.calc_history(history_dir, 1000.0, 500.0, n_workers=1)
+    assert timings[0]["volume_s"] is None and timings[0]["predictoor_s"] > 0.0
+    assert timings[1]["volume_s"] is None and timings[1]["predictoor_s"] is None
+    timings = ch.calc_history(history_dir, 1000.0, 0.0, n_workers=1, overwrite=True)
+    assert timings[1]["volume_s"] > 0.0 and timings[1]["predictoor_s"] is None
+
+    table = ch.history_table(timings)
+    assert "2023-11-16" in table
+    assert "4 weeks, 1 failed" in table
+
+
+@enforce_types
+def test_calc_history_workers(tmp_path):
+    history_dir = str(tmp_path)
+    for week in ["2023-11-16", "2023-11-23", "2023-11-30"]:
+        _save_week(os.path.join(history_dir, week), 1.0)
+
+    # no queries, so no patching needed in other processes
+    timings = ch.calc_history(history_dir, 1000.0, 300.0, n_workers=2)
+    assert [t["error"] for t in timings] == [None] * 3
+    rewards = [csvs.load_volume_rewards_csv(t["week"]) for t in timings]
+    pdr_rewards = [
+        predictoor_csvs.load_predictoor_rewards_csv(t["week"]) for t in timings
+    ]
+
+    # same as in this process
+    timings = ch.calc_history(history_dir, 1000.0, 300.0, 1, overwrite=True)
+    assert [t["error"] for t in timings] == [None] * 3
+    for t, rewards1, pdr_rewards1 in zip(timings, rewards, pdr_rewards):
+        assert csvs.load_volume_rewards_csv(t["week"]) == rewards1
+        assert predictoor_csvs.load_predictoor_rewards_csv(t["week"]) == pdr_rewards1
+
+
+@patch(QUERY_PATH, MagicMock(side_effect=AssertionError("queried contracts")))
+@enforce_types
+def test_calc_history_predictoor_feeds_of_the_week(tmp_path):
+    # the nft was a predictoor feed in week 2 only: higher DCV multiplier
+    week_dirs = [os.path.join(str(tmp_path), w) for w in ["2023-11-16", "2023-11-23"]]
+    _save_week(week_dirs[0], 1.0)
+    _save_week(week_dirs[1], 1.0, feed_chainid=CHAINID, feed_addr=NFT_ADDR)
+    assert ch._predictoor_feed_addrs(week_dirs[1]) == {CHAINID: [NFT_ADDR]}
+
+    timings = ch.calc_history(str(tmp_path), 1000.0, 0.0, n_workers=1)
+    assert [t["error"] for t in timings] == [None] * 2
+    week1, week2 = [csvs.load_volume_rewards_csv(d) for d in week_dirs]
+    assert sum(week2[CHAINID].values()) > sum(week1[CHAINID].values())
+
+
+@patch(QUERY_PATH, MagicMock(side_effect=AssertionError("queried contracts")))
+@enforce_types
+def test_calc_history_without_predictoor_contracts_csv(tmp_path):
+    # e.g. a week from before Predictoor
+    week_dir = os.path.join(str(tmp_path), "2023-11-16")
+    _save_week(week_dir, 1.0)
+    os.remove(predictoor_csvs.predictoor_contracts_csv_filename(week_dir))
+    assert ch._predictoor_feed_addrs(week_dir) == {}
+
+    # volume rewards: no predictoor feeds
+    timings = ch.calc_history(str(tmp_path), 1000.0, 0.0, n_workers=1)
+    assert timings[0]["error"] is None
+    rewards = csvs.load_volume_rewards_csv(week_dir)
+    os.remove(csvs.volume_rewards_csv_filename(week_dir))
+    os.remove(csvs.volume_rewardsinfo_csv_filename(week_dir))
+    calc_volume_rewards_from_csvs(
+        week_dir,
+        datetime(2023, 11, 16),
+        1000.0,
+        wait_for_subgraph=False,
+        predictoor_feed_addrs={},
+    )
+    assert csvs.load_volume_rewards_csv(week_dir) == rewards
+
+    # predictoor rewards need the week's contracts
+    timings = ch.calc_history(str(tmp_path), 0.0, 300.0, n_workers=1)
+    assert "FileNotFoundError" in timings[0]["error"]
+    assert "predictoor_contracts.csv" in timings[0]["error"]
+    with pytest.raises(FileNotFoundError):
+        ch._calc_predictoor_week(week_dir, 300.0)
+
+
+@enforce_types
+def test_symbols_and_rates_shared(tmp_path):
+    week_dirs = [os.path.join(str(tmp_path), week) for week in ["w1", "w2", "w3"]]
+    for week_dir, rate in zip(week_dirs, [1.0, 1.0, 2.0]):
+        _save_week(week_dir, rate)
+
+    shared = ch._load_symbols_and_rates(week_dirs)
+    assert shared[week_dirs[0]][0] is shared[week_dirs[2]][0]  # same symbols
+    assert shared[week_dirs[0]][1] is shared[week_dirs[1]][1]  # same rates
+    assert shared[week_dirs[0]][1] is not shared[week_dirs[2]][1]
+    assert shared[week_dirs[2]][1]["OCEAN"] == 2.0
+
+
+@enforce_types
+def test_week_start_date():
+    assert ch.week_start_date("/x/2023-11-16") == datetime(2023, 11, 16)
+    assert ch.week_start_date("/x/df64_2023-11-16/") == datetime(2023, 11, 16)
+    assert ch.week_start_date("/x/week64") is None
+
+
+# ========================================================================
+# support functions
+
+
+@enforce_types
+def _save_week(
+    week_dir: str,
+    ocean_rate: float,
+    feed_chainid: int = 8996,
+    feed_addr: str = CONTRACT_ADDR,
+):
+    os.mkdir(week_dir)
+    allocs = {CHAINID: {NFT_ADDR: {LP: 0.5 for LP in LP_ADDRS}}}
+    vebals = {LP: 1e3 * (i + 1) for i, LP in enumerate(LP_ADDRS)}
+    csvs.save_allocation_csv(allocs, week_dir)
+    csvs.save_vebals_csv(vebals, vebals, {LP: 1 for LP in LP_ADDRS}, week_dir)
+    csvs.save_nftvols_csv({OCEAN_ADDR: {NFT_ADDR: 1e4}}, week_dir, CHAINID)
+    csvs.save_owners_csv({NFT_ADDR: LP_ADDRS[0]}, week_dir, CHAINID)
+    csvs.save_symbols_csv({OCEAN_ADDR: "OCEAN"}, week_dir, CHAINID)
+    csvs.save_rate_csv("OCEAN", ocean_rate, week_dir)
+
+    predictoors = {}
+    for i, LP in enumerate(LP_ADDRS):
+        predictoors[LP] = Predictoor(LP)
+        predictoors[LP].add_prediction(Prediction(1, 2.0 + i, 1.0, CONTRACT_ADDR))
+    predictoor_csvs.save_predictoor_data_csv(predictoors, week_dir)
+    contract = PredictContract(
+        feed_chainid, feed_addr, "ETH/USDT", "ETH/USDT", 300, 86400
+    )
+    predictoor_csvs.save_predictoor_contracts_csv({feed_addr: contract}, week_dir)
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util.concurrency import iterate_sync, ordered_map, run_in_thread, run_sync
+
+
+async def _collect(agen) -> list:
+    return [item async for item in agen]
+
+
+async def _double(x):
+    return x * 2
+
+
+@enforce_types
+def test_run_sync():
+    assert run_sync(_double(3)) == 6
+    assert run_sync(run_in_thread(sum, [1, 2, 3])) == 6
+
+
+@enforce_types
+def test_run_sync_from_own_loop():
+    async def _nested():
+        coro = _double(1)
+        try:
+            return run_sync(coro)
+        finally:
+            coro.close()
+
+    with pytest.raises(RuntimeError):
+        run_sync(_nested())
+
+
+@enforce_types
+def test_iterate_sync_closes_generator():
+    state = {"closed": False}
+
+    async def _agen():
+        try:
+            for i in range(10):
+                yield i
+        finally:
+            state["closed"] = True
+
+    items = iterate_sync(_agen())
+    assert next(items) == 0
+    assert next(items) == 1
+    items.close()
+    assert state["closed"]
+
+
+@enforce_types
+def test_ordered_map_serial():
+    assert run_sync(_collect(ordered_map(_double, [3, 1, 2], 1))) == [6, 2, 4]
+    assert run_sync(_collect(ordered_map(_double, [], 4))) == []
+
+
+@enforce_types
+def test_ordered_map_keeps_order():
+    async def slow_first(x):
+        # earlier items finish last
+        await asyncio.sleep(0.01 * (5 - x))
+        return x
+
+    results = run_sync(_collect(ordered_map(slow_first, list(range(5)), 5)))
+    assert results == list(range(5))
+
+
+@enforce_types
+def test_ordered_map_bounded():
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    async def func(x):
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return x
+
+    results = run_sync(_collect(ordered_map(func, list(range(20)), 3)))
+    assert results == list(range(20))
+    assert 1 < state["max_in_flight"] <= 3
+
+
+@enforce_types
+def test_ordered_map_raises():
+    cancelled = []
+
+    async def func(x):
+        if x == 0:
+            raise ValueError("bad item")
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(x)
+            raise
+        return x
+
+    with pytest.raises(ValueError):
+        run_sync(_collect(ordered_map(func, list(range(5)), 4)))
+
+    # calls still in flight were cancelled, not left running
+    assert sorted(cancelled) == [1, 2, 3]
@@ -22,6 +22,7 @@ from df_py.util import dftool_module, networkutil, oceantestutil, oceanutil
 from df_py.util.base18 import from_wei, to_wei
 from df_py.util.contract_base import ContractBase
 from df_py.util.dftool_module import do_predictoor_data
+from df_py.util.graphtestutil import mock_stream_query
 from df_py.volume import csvs
 
 PREV, DFTOOL_ACCT = {}, None
@@ -147,8 +148,10 @@ def test_predictoor_data(tmp_path):
         mock_query_response, users, stats = create_mock_responses(100)
 
         with sysargs_context(sys_argv):
-            with patch("df_py.predictoor.queries.submit_query") as mock_submit_query:
-                mock_submit_query.side_effect = mock_query_response
+            with patch(
+                "df_py.util.graphutil.async_stream_query",
+                side_effect=mock_stream_query(mock_query_response),
+            ):
                 do_predictoor_data()
 
         # test result
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+from enforce_typing import enforce_types
+
+from df_py.util.enforce_types_bench import bench_enforce_types, bench_table
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..")
+
+# a Tok with a float chainID: a TypeError, if checked
+BAD_TOK = "from df_py.volume.models import Tok; Tok(1.5, '0xa', 'OCEAN')"
+
+
+@enforce_types
+def test_enforce_types_switch():
+    assert _run(BAD_TOK, {}).returncode != 0
+    assert "TypeError" in _run(BAD_TOK, {"ENFORCE_TYPES": "1"}).stderr
+    assert _run(BAD_TOK, {"ENFORCE_TYPES": "0"}).returncode == 0
+
+
+@enforce_types
+def test_dftool_fast():
+    # --fast works anywhere in the command line, and is removed from it
+    code = (
+        "import runpy, sys; sys.argv = ['dftool', 'help', '--fast'];"
+        "runpy.run_path('dftool', run_name='not_main');"
+        "import df_py; assert not df_py.enforce_types_enabled();"
+        "assert sys.argv == ['dftool', 'help']"
+    )
+    assert _run(code, {}).returncode == 0
+
+
+@enforce_types
+def test_bench_enforce_types():
+    results = bench_enforce_types(n=200)
+    assert {r["subsystem"] for r in results} == {"predictoor", "volume", "util"}
+    for r in results:
+        assert r["checked_s"] > 0.0 and r["unchecked_s"] > 0.0
+
+    table = bench_table(results)
+    assert len(table.splitlines()) == len(results) + 1
+    assert "Prediction+add_prediction" in table
+
+
+def _run(code: str, envvars: dict) -> subprocess.CompletedProcess:
+    """Run python code in a fresh process, from the repo's root dir"""
+    env = dict(os.environ)
+    env.pop("ENFORCE_TYPES", None)
+    env.update(envvars)
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
@@ -0,0 +1,274 @@
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from enforce_typing import enforce_types
+
+from df_py.predictoor.queries import query_predictoors
+from df_py.util import fake_subgraph
+from df_py.util.blockrange import BlockRange
+from df_py.util.concurrency import iterate_sync
+from df_py.util.fake_subgraph import (
+    FakeSubgraphServer,
+    SubgraphDataset,
+    matches_where,
+    parse_query,
+    synthesize_dataset,
+)
+from df_py.util.graphutil import async_paginate_records
+from df_py.util.networkutil import DEV_CHAINID
+from df_py.volume import queries
+
+FIN_BLOCK = fake_subgraph.BLOCKS_PER_WEEK
+
+
+@pytest.fixture(scope="module", name="dataset")
+def fixture_dataset():
+    return synthesize_dataset(
+        n_nfts=50, n_lps=100, n_orders=2500, n_swaps=1200, n_predictions=1500, seed=1
+    )
+
+
+@pytest.fixture(name="server_url")
+def fixture_server_url(dataset, monkeypatch):
+    with FakeSubgraphServer(dataset) as server:
+        monkeypatch.setenv("DEVELOPMENT_SUBGRAPH_URI", server.url)
+        yield server.url
+
+
+@enforce_types
+def test_parse_query():
+    fields = parse_query("""query {
+          b3: veOCEANs(first: 2, where: {id_in: ["0xa", "0xb"], x_gt: -1.5},
+                       block: {number: 7}) {
+            id
+            updates(orderBy: timestamp, orderDirection: desc) { amount }
+          }
+          _meta { block { number } }
+        }""")
+    assert [(f.alias, f.name) for f in fields] == [
+        ("b3", "veOCEANs"),
+        ("_meta", "_meta"),
+    ]
+    assert fields[0].args == {
+        "first": 2,
+        "where": {"id_in": ["0xa", "0xb"], "x_gt": -1.5},
+        "block": {"number": 7},
+    }
+    updates = fields[0].selections[1]
+    assert updates.args == {"orderBy": "timestamp", "orderDirection": "desc"}
+    assert updates.selections[0].name == "amount"
+
+    with pytest.raises(ValueError):
+        parse_query("{ orders { id }")
+
+
+@enforce_types
+def test_matches_where():
+    record = {
+        "id": "0xb",
+        "allocated": "12.5",
+        "block": 10,
+        "payout": None,
+        "slot": {"slot": 300, "status": "Paying"},
+        "user": {"id": "0xu"},
+    }
+    assert matches_where(record, {})
+    assert matches_where(record, {"id_gt": "0xa", "id_in": ["0xb", "0xc"]})
+    assert not matches_where(record, {"id_not_in": ["0xb"]})
+    assert matches_where(record, {"allocated_not": "0", "allocated_gt": 12})
+    assert matches_where(record, {"block_gte": 10, "block_lte": 10})
+    assert not matches_where(record, {"block_lt": 10})
+    assert matches_where(record, {"user": "0xu"})  # references compare by id
+    assert matches_where(record, {"slot_": {"slot_gt": 0, "status": "Paying"}})
+    assert not matches_where(record, {"slot_": {"status": "Pending"}})
+    assert not matches_where(record, {"payout_not": None})
+    assert matches_where(record, {"payout": None})
+
+
+@enforce_types
+def test_pagination():
+    dataset = SubgraphDataset()
+    for i in range(25):
+        dataset.add("nfts", {"id": f"0x{i:02x}", "n": i}, block=1)
+
+    # cursor pagination sees every record once, in id order
+    ids, last_id = [], ""
+    while True:
+        query = f'{{ nfts(first: 10, where: {{id_gt: "{last_id}"}}) {{ id }} }}'
+        page = dataset.execute(query)["data"]["nfts"]
+        if not page:
+            break
+        ids += [record["id"] for record in page]
+        last_id = ids[-1]
+    assert ids == sorted(f"0x{i:02x}" for i in range(25))
+
+    result = dataset.execute(
+        "{ a: nfts(first: 3, skip: 2, orderBy: n, orderDirection: desc) { n } "
+        'b: nfts(where: {n_lt: 3}) { id } c: nft(id: "0x01") { n } }'
+    )
+    assert result["data"]["a"] == [{"n": 22}, {"n": 21}, {"n": 20}]
+    assert len(result["data"]["b"]) == 3
+    assert result["data"]["c"] == {"n": 1}
+
+    assert "errors" in dataset.execute("{ nfts(first: 5000) { id } }")
+    assert "errors" in dataset.execute("{ users { id } }")
+
+
+@enforce_types
+def test_snapshots():
+    dataset = SubgraphDataset()
+    dataset.add("veOCEANs", {"id": "0xa", "lockedAmount": "1"}, block=10)
+    dataset.add("veOCEANs", {"id": "0xa", "lockedAmount": "2"}, block=20)
+    dataset.add("veOCEANs", {"id": "0xb", "lockedAmount": "5"}, block=15)
+
+    def _locked(block: int) -> list:
+        query = f"{{ veOCEANs(block: {{number: {block}}}) {{ lockedAmount }} }}"
+        return [r["lockedAmount"] for r in dataset.execute(query)["data"]["veOCEANs"]]
+
+    assert _locked(9) == []
+    assert _locked(10) == ["1"]
+    assert _locked(19) == ["1", "5"]
+    assert _locked(20) == ["2", "5"]
+
+    # not indexed yet, like graph-node
+    result = dataset.execute("{ veOCEANs(block: {number: 21}) { id } }")
+    assert "data" not in result and "not yet available" in str(result["errors"])
+
+    meta = dataset.execute("{ _meta { block { number } } }")
+    assert meta["data"]["_meta"] == {"block": {"number": 20}}
+
+
+@enforce_types
+@pytest.mark.parametrize("filename", ["dataset.json", "dataset.json.gz"])
+def test_save_load(dataset, tmp_path, filename):
+    path = str(tmp_path / filename)
+    dataset.save(path)
+    loaded = SubgraphDataset.load(path)
+
+    assert loaded.head_block == dataset.head_block
+    query = "{ veOCEANs(first: 1000, block: {number: 1000}) { id delegation { id } } }"
+    assert loaded.execute(query) == dataset.execute(query)
+    for entity in dataset.entities():
+        assert loaded.records_at(entity) == dataset.records_at(entity)
+
+
+@enforce_types
+def test_synthesize_dataset(dataset):
+    again = synthesize_dataset(
+        n_nfts=50, n_lps=100, n_orders=2500, n_swaps=1200, n_predictions=1500, seed=1
+    )
+    assert again.records_at("orders") == dataset.records_at("orders")
+    assert synthesize_dataset(n_orders=10, seed=2).records_at("orders") != (
+        dataset.records_at("orders")[:10]
+    )
+
+    assert dataset.num_records("orders") == 2500
+    assert dataset.num_records("nfts") == 50
+    assert dataset.num_records("veOCEANs") == 100
+
+    # each LP allocates at most 100%
+    allocated: dict = {}
+    for allocation in dataset.records_at("veAllocations"):
+        lp = allocation["allocationUser"]["id"]
+        allocated[lp] = allocated.get(lp, 0.0) + float(allocation["allocated"])
+    assert max(allocated.values()) <= fake_subgraph.MAX_ALLOCATE
+
+    # popular nfts get more orders
+    n_orders: dict = {}
+    for order in dataset.records_at("orders"):
+        nft = order["datatoken"]["nft"]["id"]
+        n_orders[nft] = n_orders.get(nft, 0) + 1
+    counts = sorted(n_orders.values())
+    assert counts[-1] > 10 * counts[0]
+
+
+@enforce_types
+def test_server_replay_and_record(dataset, tmp_path):
+    recordings_file = str(tmp_path / "recordings.jsonl")
+    query = '{ nfts(first: 5, where: {id_gt: ""}) { id symbol } }'
+
+    with FakeSubgraphServer(dataset) as upstream:
+        # 1st run: not recorded, so ask upstream, and record
+        with FakeSubgraphServer(
+            recordings_file=recordings_file, upstream_url=upstream.url
+        ) as server:
+            response = requests.post(server.url, json={"query": query}, timeout=10)
+            assert server.stats["upstream"] == 1
+    expected = dataset.execute(query)
+    assert response.json() == expected
+
+    # 2nd run: offline. Formatting doesn't matter
+    with FakeSubgraphServer(recordings_file=recordings_file) as server:
+        reformatted = query.replace(" ", "\n  ")
+        response = requests.post(
+            server.url,
+            json={"query": reformatted},
+            headers={"Accept-Encoding": "gzip"},
+            timeout=10,
+        )
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.json() == expected
+        assert server.stats == {
+            "requests": 1,
+            "replayed": 1,
+            "upstream": 0,
+            "dataset": 0,
+        }
+
+        # not recorded, and no dataset or upstream to fall back to
+        response = requests.post(
+            server.url, json={"query": "{ orders { id } }"}, timeout=10
+        )
+        assert "errors" in response.json()
+
+    with open(recordings_file, encoding="utf-8") as f:
+        assert json.loads(f.readline())["response"] == expected
+
+
+@enforce_types
+def test_queries_end_to_end(dataset, server_url):  # pylint: disable=unused-argument
+    st, fin = 0, FIN_BLOCK
+
+    # orders & swaps, paginated over HTTP
+    vols, owners, _ = queries._queryVolsOwners(st, fin, DEV_CHAINID)
+    orders = dataset.records_at("orders")
+    assert sum(vols[fake_subgraph.FAKE_OCEAN_ADDR].values()) == pytest.approx(
+        sum(float(order["lastPriceValue"]) for order in orders)
+    )
+    assert len(owners) == len({order["datatoken"]["nft"]["id"] for order in orders})
+
+    swaps = queries._querySwaps(st, fin, DEV_CHAINID)
+    assert len(swaps[fake_subgraph.FAKE_OCEAN_ADDR]) > 0
+
+    records = list(
+        iterate_sync(async_paginate_records("nfts", "id", DEV_CHAINID, chunk_size=7))
+    )
+    assert len(records) == dataset.num_records("nfts")
+
+    # snapshots at sampled blocks
+    rng = BlockRange(st=st, fin=fin, num_samples=20, random_seed=3)
+    allocations = queries.queryAllocations(rng, DEV_CHAINID)
+    lp_sums: dict = {}
+    for nfts in allocations[DEV_CHAINID].values():
+        for lp, percent in nfts.items():
+            lp_sums[lp] = lp_sums.get(lp, 0.0) + percent
+    assert 0 < max(lp_sums.values()) <= 1.0 + 1e-9
+
+    web3 = Mock()
+    web3.eth.get_block.return_value.timestamp = fake_subgraph.FIN_TS
+    with patch("df_py.util.networkutil.chain_id_to_web3", return_value=web3):
+        vebals = queries.queryVebalances(rng, DEV_CHAINID)
+    assert len(vebals[0]) == dataset.num_records("veOCEANs")
+
+    # predictoor feeds & predictions
+    st_ts = fake_subgraph.FIN_TS - FIN_BLOCK * fake_subgraph.BLOCK_TIME
+    predictoors = query_predictoors(st_ts, fake_subgraph.FIN_TS, DEV_CHAINID)
+    paying = [
+        prediction
+        for prediction in dataset.records_at("predictPredictions")
+        if prediction["slot"]["status"] == "Paying"
+    ]
+    n_predictions = sum(p.prediction_count for p in predictoors.values())
+    assert n_predictions == len(paying)
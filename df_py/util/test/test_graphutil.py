@@ -1,8 +1,18 @@
-from unittest.mock import patch
+import asyncio
+import re
+import threading
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
 
+import aiohttp
 import pytest
 
-from df_py.util import graphutil
+from df_py.util import graphutil, networkutil, query_cache
+from df_py.util.concurrency import run_sync
+from df_py.util.graphtestutil import mock_stream_query
+from df_py.util.constants import SUBGRAPH_MAX_CONCURRENCY
 
 
 def test_get_last_block():
@@ -43,3 +53,453 @@ def test_obsolete_chain_id():
         # obsolete chain id so nothing gets called
         graphutil.wait_to_latest_block(246, 4)
         assert mock.call_count == 0
+
+
+def test_build_paginated_query():
+    query = graphutil.build_paginated_query(
+        "orders", "id", "0xabc", where="block_gte: 1", block=10, chunk_size=5
+    )
+    assert "orders(first: 5, orderBy: id, orderDirection: asc" in query
+    assert 'where: {id_gt: "0xabc", block_gte: 1}' in query
+    assert "block: {number: 10}" in query
+    assert "skip" not in query
+
+    query = graphutil.build_paginated_query("nfts", "id", "")
+    assert 'where: {id_gt: ""}' in query
+    assert "block:" not in query
+
+
+def test_paginate_records_no_data(monkeypatch):
+    body = b'{"errors": [{"message": "block not indexed"}]}'
+    monkeypatch.setattr(
+        graphutil, "async_graphql_response", _fake_graphql_response([(200, body)])
+    )
+    with pytest.raises(graphutil.SubgraphNoDataError):
+        run_sync(
+            _collect(graphutil.async_paginate_records("nfts", "id", 8996, block=1))
+        )
+
+
+def test_build_snapshots_query():
+    query = graphutil.build_snapshots_query(
+        "veOCEANs", "id", [(10, ""), (20, "0xabc")], chunk_size=5
+    )
+    assert "b0: veOCEANs(first: 5" in query
+    assert 'where: {id_gt: ""}, block: {number: 10}' in query
+    assert "b1: veOCEANs(first: 5" in query
+    assert 'where: {id_gt: "0xabc"}, block: {number: 20}' in query
+
+
+def _fake_nft_snapshot(block: int) -> list:
+    return [{"id": f"0x{block}-{i:02d}"} for i in range(block % 7)]
+
+
+def _fake_snapshots_submit_query(query: str, chainID: int) -> dict:
+    # pylint: disable=unused-argument
+    data = {}
+    aliased_pages = re.findall(
+        r'(b\d+): nfts\(first: (\d+).*?id_gt: "([^"]*)"}, block: {number: (\d+)}',
+        query,
+    )
+    for alias, first, last_id, block in aliased_pages:
+        records = [r for r in _fake_nft_snapshot(int(block)) if r["id"] > last_id]
+        data[alias] = records[: int(first)]
+    return {"data": data}
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_query_snapshots(max_workers):
+    blocks = list(range(100, 140))
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(_fake_snapshots_submit_query),
+    ) as stream_query_mock:
+        snapshots = list(
+            graphutil.query_snapshots(
+                "nfts", "id", 8996, blocks, max_workers=max_workers, chunk_size=2
+            )
+        )
+
+    # one complete snapshot per block, in block order
+    assert snapshots == [_fake_nft_snapshot(block) for block in blocks]
+
+    # several blocks are packed into later requests
+    queries = [call.args[0] for call in stream_query_mock.call_args_list]
+    n_aliases = [query.count("nfts(") for query in queries]
+    assert n_aliases[0] == 1
+    assert max(n_aliases) > 1
+    assert max(n_aliases) <= graphutil.MAX_SNAPSHOTS_PER_REQUEST
+
+    n_pages = sum(max(1, len(_fake_nft_snapshot(b)) // 2 + 1) for b in blocks)
+    assert len(queries) < n_pages
+
+
+def test_query_snapshots_sizing(monkeypatch):
+    # 25 records per block: pages of 10, 10, then 5
+    monkeypatch.setattr(graphutil, "MAX_RECORDS_PER_REQUEST", 40)
+    blocks = list(range(30))
+
+    def _submit_query(query: str, chainID: int) -> dict:
+        # pylint: disable=unused-argument
+        data = {}
+        for alias, last_id in re.findall(r'(b\d+): .*?id_gt: "([^"]*)"', query):
+            records = [{"id": f"0x{i:02d}"} for i in range(25)]
+            data[alias] = [r for r in records if r["id"] > last_id][:10]
+        return {"data": data}
+
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(_submit_query),
+    ) as stream_query_mock:
+        snapshots = list(
+            graphutil.query_snapshots(
+                "nfts", "id", 8996, blocks, max_workers=1, chunk_size=10
+            )
+        )
+
+    assert [len(snapshot) for snapshot in snapshots] == [25] * 30
+    # 40 // 10 blocks per request, throughout; not 40 // 5 after a last page
+    queries = [call.args[0] for call in stream_query_mock.call_args_list]
+    assert max(query.count("nfts(") for query in queries) == 4
+
+
+def test_query_snapshots_no_data():
+    no_data = {"errors": [{"message": "block not indexed"}]}
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(lambda query, chainID: no_data),
+    ):
+        with pytest.raises(graphutil.SubgraphNoDataError):
+            list(graphutil.query_snapshots("nfts", "id", 8996, [1, 2, 3]))
+
+
+def test_async_submit_query_retries(monkeypatch):
+    monkeypatch.setattr(graphutil, "RETRY_DELAY", 0.0)
+    responses = [
+        (503, b""),
+        aiohttp.ClientConnectionError("connection reset"),
+        (200, b'{"data": {"nfts": []}}'),
+    ]
+    with patch(
+        "df_py.util.graphutil.async_make_graphql_request", new_callable=AsyncMock
+    ) as request_mock:
+        request_mock.side_effect = responses
+        result = graphutil.submit_query("{nfts {id}}", 8996)
+
+    assert result == {"data": {"nfts": []}}
+    assert request_mock.call_count == 3
+
+
+def test_async_submit_query_fails(monkeypatch):
+    monkeypatch.setattr(graphutil, "RETRY_DELAY", 0.0)
+    with patch(
+        "df_py.util.graphutil.async_make_graphql_request", new_callable=AsyncMock
+    ) as request_mock:
+        # not retried
+        request_mock.return_value = (400, b"bad query")
+        with pytest.raises(Exception, match="Return code is 400"):
+            graphutil.submit_query("{nfts {id}}", 8996)
+        assert request_mock.call_count == 1
+
+        # retried, then given up
+        request_mock.reset_mock()
+        request_mock.return_value = (502, b"")
+        with pytest.raises(Exception, match="Return code is 502"):
+            graphutil.submit_query("{nfts {id}}", 8996)
+        assert request_mock.call_count == graphutil.RETRIES + 1
+
+
+def test_async_submit_query_cancelled():
+    started = asyncio.Event()
+
+    async def _hang(*args):  # pylint: disable=unused-argument
+        started.set()
+        await asyncio.sleep(60)
+
+    async def _cancel_query():
+        task = asyncio.ensure_future(graphutil.async_submit_query("{}", 8996))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # semaphore slot is given back
+        limits = graphutil._limits()
+        assert limits.semaphore._value == SUBGRAPH_MAX_CONCURRENCY
+
+    with patch(
+        "df_py.util.graphutil.async_make_graphql_request", new_callable=AsyncMock
+    ) as request_mock:
+        request_mock.side_effect = _hang
+        asyncio.run(_cancel_query())
+
+    # cancelled, so not retried
+    assert request_mock.call_count == 1
+
+
+def test_rate_limiter():
+    async def _waits():
+        limiter = graphutil._RateLimiter(50.0)
+        loop = asyncio.get_running_loop()
+        st = loop.time()
+        for _ in range(6):
+            await limiter.wait()
+        return loop.time() - st
+
+    assert asyncio.run(_waits()) >= 5 / 50.0 * 0.9
+
+
+def test_chains_share_event_loop():
+    blocks = list(range(100, 110))
+
+    async def _both_chains():
+        return await asyncio.gather(
+            _collect(graphutil.async_query_snapshots("nfts", "id", 8996, blocks)),
+            _collect(graphutil.async_query_snapshots("nfts", "id", 137, blocks)),
+        )
+
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(_fake_snapshots_submit_query),
+    ) as stream_query_mock:
+        snapshots_dev, snapshots_polygon = asyncio.run(_both_chains())
+
+    expected = [_fake_nft_snapshot(block) for block in blocks]
+    assert snapshots_dev == expected
+    assert snapshots_polygon == expected
+    chain_ids = {call.args[1] for call in stream_query_mock.call_args_list}
+    assert chain_ids == {8996, 137}
+
+
+async def _collect(agen) -> list:
+    return [item async for item in agen]
+
+
+def test_submit_query_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(graphutil, "_final_blocks", {137: 1000})
+    response = (200, b'{"data": {"nfts": [{"id": "0x1"}]}}')
+    query_cache.enable(str(tmp_path / "cache.db"))
+    try:
+        with patch(
+            "df_py.util.graphutil.async_make_graphql_request", new_callable=AsyncMock
+        ) as request_mock:
+            request_mock.return_value = response
+
+            # pinned to a final block: fetched once, then from the cache
+            for _ in range(3):
+                result = graphutil.submit_query(
+                    "{nfts(block: {number: 900}) {id}}", 137
+                )
+                assert result == {"data": {"nfts": [{"id": "0x1"}]}}
+            assert request_mock.call_count == 1
+
+            # not pinned, or pinned too close to the head: always fetched
+            request_mock.reset_mock()
+            for _ in range(2):
+                graphutil.submit_query("{nfts {id}}", 137)
+                graphutil.submit_query("{nfts(block: {number: 1001}) {id}}", 137)
+            assert request_mock.call_count == 4
+
+            # errors aren't cached
+            request_mock.reset_mock()
+            request_mock.return_value = (200, b'{"errors": [{"message": "x"}]}')
+            for _ in range(2):
+                graphutil.submit_query("{nfts(block: {number: 800}) {id}}", 137)
+            assert request_mock.call_count == 2
+    finally:
+        query_cache.disable()
+
+
+def test_cache_only_blocks_the_subgraph_indexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(graphutil, "_final_blocks", {})
+    meta = b'{"data": {"_meta": {"block": {"number": 1256}}}}'
+    orders = b'{"data": {"orders": [{"id": "0x1"}]}}'
+    query_cache.enable(str(tmp_path / "cache.db"))
+    try:
+        with patch(
+            "df_py.util.graphutil.async_make_graphql_request", new_callable=AsyncMock
+        ) as request_mock:
+            request_mock.side_effect = lambda url, query, *args: (
+                (200, meta) if "_meta" in query else (200, orders)
+            )
+
+            # subgraph is at 1256, so blocks <= 1000 are final; the chain's
+            # head doesn't matter
+            for _ in range(2):
+                graphutil.submit_query("{orders(where: {block_lte: 1000}) {id}}", 137)
+                graphutil.submit_query("{orders(where: {block_lte: 1001}) {id}}", 137)
+            queries = [call.args[1] for call in request_mock.call_args_list]
+            assert len([q for q in queries if "_meta" in q]) == 1
+            assert len([q for q in queries if "1000" in q]) == 1
+            assert len([q for q in queries if "1001" in q]) == 2
+            assert graphutil._final_blocks == {137: 1000}
+
+            # no _meta: nothing is cached
+            graphutil._final_blocks.clear()
+            request_mock.reset_mock()
+            request_mock.side_effect = None
+            request_mock.return_value = (200, b'{"errors": [{"message": "x"}]}')
+            graphutil.submit_query("{orders(where: {block_lte: 10}) {id}}", 1)
+            assert graphutil._final_blocks == {}
+    finally:
+        query_cache.disable()
+
+
+class _StreamingHandler(BaseHTTPRequestHandler):
+    """Sends the first record, then the rest once the client has it"""
+
+    protocol_version = "HTTP/1.1"
+    first_record_seen = threading.Event()
+    client_was_streaming = False
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        self._write_chunk(b'{"data": {"nfts": [{"id": "0x1"}, ')
+        _StreamingHandler.client_was_streaming = self.first_record_seen.wait(5)
+        self._write_chunk(b'{"id": "0x2"}]}}')
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def test_stream_query_yields_records_as_they_arrive(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/subgraphs/name/test"
+    monkeypatch.setattr(networkutil, "chain_id_to_subgraph_uri", lambda chainID: url)
+
+    async def _consume() -> list:
+        items = []
+        async for item in graphutil.async_stream_query("{nfts {id}}", 137):
+            items.append(item)
+            _StreamingHandler.first_record_seen.set()
+        return items
+
+    try:
+        items = run_sync(_consume())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert items == [("nfts", {"id": "0x1"}), ("nfts", {"id": "0x2"})]
+    # the 1st record was handed over before the response was complete
+    assert _StreamingHandler.client_was_streaming
+
+
+def _fake_graphql_response(responses: list):
+    """Stand-in for request.async_graphql_response(), from (status, body)s"""
+    items = list(responses)
+
+    @asynccontextmanager
+    async def _response(*args):  # pylint: disable=unused-argument
+        item = items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        status, body = item
+
+        chunks = [body, b""]
+
+        async def _readany():
+            return chunks.pop(0)
+
+        yield SimpleNamespace(status=status, content=SimpleNamespace(readany=_readany))
+
+    return _response
+
+
+def _stream_query_items(query: str, chainID: int) -> list:
+    async def _collect_items():
+        return [item async for item in graphutil.async_stream_query(query, chainID)]
+
+    return run_sync(_collect_items())
+
+
+def test_stream_query_retries_and_errors(monkeypatch):
+    monkeypatch.setattr(graphutil, "RETRY_DELAY", 0.0)
+    responses = [
+        (503, b""),
+        aiohttp.ClientConnectionError("connection reset"),
+        (200, b'{"data": {"nfts": [{"id": "0x1"}]}}'),
+        (200, b'{"errors": [{"message": "block not indexed"}]}'),
+        (200, b'{"data": {"nfts": []}, "errors": [{"message": "x"}]}'),
+    ]
+    monkeypatch.setattr(
+        graphutil, "async_graphql_response", _fake_graphql_response(responses)
+    )
+
+    assert _stream_query_items("{nfts {id}}", 8996) == [("nfts", {"id": "0x1"})]
+    with pytest.raises(graphutil.SubgraphNoDataError):
+        _stream_query_items("{nfts {id}}", 8996)
+    with pytest.raises(AssertionError):
+        _stream_query_items("{nfts {id}}", 8996)
+
+
+def test_stream_query_frees_slot_while_consumer_works(monkeypatch):
+    body = b'{"data": {"nfts": [{"id": "0x1"}, {"id": "0x2"}]}}'
+    monkeypatch.setattr(
+        graphutil, "async_graphql_response", _fake_graphql_response([(200, body)])
+    )
+
+    async def _consume() -> list:
+        limits = graphutil._limits()
+        values = []
+        async for _ in graphutil.async_stream_query("{nfts {id}}", 8996):
+            values.append(limits.semaphore._value)
+        values.append(limits.semaphore._value)
+        return values
+
+    # no slot is held while a record is with the consumer, nor after
+    assert asyncio.run(_consume()) == [SUBGRAPH_MAX_CONCURRENCY] * 3
+
+
+def test_stream_query_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(graphutil, "_final_blocks", {137: 1000})
+    body = b'{"data": {"nfts": [{"id": "0x1"}, {"id": "0x2"}], "empty": []}}'
+    monkeypatch.setattr(
+        graphutil, "async_graphql_response", _fake_graphql_response([(200, body)])
+    )
+    query = "{nfts(block: {number: 900}) {id} empty(block: {number: 900}) {id}}"
+    query_cache.enable(str(tmp_path / "cache.db"))
+    try:
+        # streamed once, then from the cache
+        for _ in range(3):
+            items = _stream_query_items(query, 137)
+            assert items == [("nfts", {"id": "0x1"}), ("nfts", {"id": "0x2"})]
+
+        # cached like async_submit_query() would
+        result = graphutil.submit_query(query, 137)
+        assert result == {"data": {"nfts": [{"id": "0x1"}, {"id": "0x2"}], "empty": []}}
+    finally:
+        query_cache.disable()
+
+
+def test_paginate_records():
+    pages = [
+        {"data": {"nfts": [{"id": "0x1"}, {"id": "0x2"}]}},
+        {"data": {"nfts": [{"id": "0x3"}]}},
+        {"data": {"nfts": []}},
+    ]
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(pages),
+    ) as stream_query_mock:
+        records = run_sync(
+            _collect(graphutil.async_paginate_records("nfts", "id", 8996, chunk_size=2))
+        )
+
+    assert records == [{"id": "0x1"}, {"id": "0x2"}, {"id": "0x3"}]
+    # each page continues from the last id of the previous one
+    queries = [call.args[0] for call in stream_query_mock.call_args_list]
+    assert 'id_gt: ""' in queries[0]
+    assert 'id_gt: "0x2"' in queries[1]
+    assert 'id_gt: "0x3"' in queries[2]
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util.jsonstream import ResponseDecoder
+
+RESPONSE = {
+    "data": {
+        "b0": [
+            {"id": "0x1", "amount": "1.5", "nested": {"list": [1, 2.5e-3, None]}},
+            {"id": "0x2", "text": 'é "quoted" ]}', "flag": True},
+        ],
+        "b1": [],
+        "_meta": {"block": {"number": 12}},
+    },
+    "errors": [{"message": "oops"}],
+}
+
+
+def _decode(body: bytes, chunk_size: int) -> list:
+    decoder = ResponseDecoder()
+    events = []
+    for i in range(0, len(body), chunk_size):
+        events += decoder.feed(body[i : i + chunk_size])
+    events += decoder.close()
+    return events
+
+
+@enforce_types
+def test_events():
+    body = json.dumps(RESPONSE).encode()
+    assert _decode(body, len(body)) == [
+        ("begin", ("data",), None),
+        ("list", ("data", "b0"), None),
+        ("record", ("data", "b0"), RESPONSE["data"]["b0"][0]),
+        ("record", ("data", "b0"), RESPONSE["data"]["b0"][1]),
+        ("list", ("data", "b1"), None),
+        ("value", ("data", "_meta"), {"block": {"number": 12}}),
+        ("value", ("errors",), [{"message": "oops"}]),
+    ]
+
+
+@enforce_types
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_any_chunking(chunk_size):
+    # multi-byte chars & numbers get split across chunks too
+    body = json.dumps(RESPONSE, indent=2, ensure_ascii=False).encode()
+    assert _decode(body, chunk_size) == _decode(body, len(body))
+
+
+@enforce_types
+def test_records_as_they_complete():
+    decoder = ResponseDecoder()
+    events = decoder.feed(b'{"data": {"nfts": [{"id": "0x1"}, {"id": "0x')
+    assert events[-1] == ("record", ("data", "nfts"), {"id": "0x1"})
+
+    events = decoder.feed(b'2"}]}}')
+    assert events == [("record", ("data", "nfts"), {"id": "0x2"})]
+    assert decoder.close() == []
+
+
+@enforce_types
+def test_no_data():
+    assert _decode(b'{"data": null}', 1) == [("value", ("data",), None)]
+
+    errors = [{"message": "block not indexed"}]
+    body = json.dumps({"errors": errors}).encode()
+    assert _decode(body, 5) == [("value", ("errors",), errors)]
+
+
+@enforce_types
+@pytest.mark.parametrize(
+    "body",
+    [b'{"data": {"nfts": [{"id": "0x1"}', b'{"data": {"nfts": [1.x]}}', b"[]", b""],
+)
+def test_bad_response(body):
+    with pytest.raises(ValueError):
+        _decode(body, 3)
@@ -25,3 +25,41 @@ def test_network_to_chain_id():
     assert networkutil.network_to_chain_id("development") == 8996
     assert networkutil.network_to_chain_id("mainnet") == 1
     assert networkutil.network_to_chain_id("polygon") == 137
+
+
+@enforce_types
+def test_chain_id_to_subgraph_max_workers(monkeypatch):
+    monkeypatch.delenv("POLYGON_SUBGRAPH_MAX_WORKERS", raising=False)
+    default = networkutil.chain_id_to_subgraph_max_workers(137)
+    assert default == networkutil.SUBGRAPH_MAX_WORKERS
+
+    monkeypatch.setenv("POLYGON_SUBGRAPH_MAX_WORKERS", "2")
+    assert networkutil.chain_id_to_subgraph_max_workers(137) == 2
+    assert networkutil.chain_id_to_subgraph_max_workers(1) == default
+
+    monkeypatch.setenv("SAPPHIRE_MAINNET_SUBGRAPH_MAX_WORKERS", "1")
+    assert networkutil.chain_id_to_subgraph_max_workers(23294) == 1
+
+
+@enforce_types
+def test_chain_id_to_subgraph_max_rps(monkeypatch):
+    monkeypatch.delenv("POLYGON_SUBGRAPH_MAX_RPS", raising=False)
+    default = networkutil.chain_id_to_subgraph_max_rps(137)
+    assert default == networkutil.SUBGRAPH_MAX_RPS
+
+    monkeypatch.setenv("POLYGON_SUBGRAPH_MAX_RPS", "2.5")
+    assert networkutil.chain_id_to_subgraph_max_rps(137) == 2.5
+    assert networkutil.chain_id_to_subgraph_max_rps(1) == default
+
+
+@enforce_types
+def test_subgraph_uri_override(monkeypatch):
+    monkeypatch.delenv("POLYGON_SUBGRAPH_URI", raising=False)
+    default = networkutil.chain_id_to_subgraph_uri(137)
+    assert not networkutil.subgraph_uri_is_overridden(137)
+
+    monkeypatch.setenv("POLYGON_SUBGRAPH_URI", "http://localhost:9999/sg")
+    assert networkutil.chain_id_to_subgraph_uri(137) == "http://localhost:9999/sg"
+    assert networkutil.subgraph_uri_is_overridden(137)
+    assert networkutil.chain_id_to_subgraph_uri(1) != default
+    assert not networkutil.subgraph_uri_is_overridden(1)
@@ -0,0 +1,75 @@
+from enforce_typing import enforce_types
+
+from df_py.util import query_cache
+from df_py.util.query_cache import QueryCache
+
+
+@enforce_types
+def test_pinned_block():
+    assert query_cache.pinned_block("{nfts(block: {number: 12}) {id}}") == 12
+    assert query_cache.pinned_block("{orders(where: {block_lte: 30}) {id}}") == 30
+    query = "{b0: x(block: {number: 5}) {id} b1: x(block: {number: 9}) {id}}"
+    assert query_cache.pinned_block(query) == 9
+
+    # answer depends on latest block
+    assert query_cache.pinned_block("{_meta {block {number}}}") is None
+    assert query_cache.pinned_block("{orders(where: {block_gte: 30}) {id}}") is None
+
+
+@enforce_types
+def test_get_put(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.db"), 10**6)
+    result = {"data": {"nfts": [{"id": "0x1"}]}}
+
+    assert cache.get(137, "{nfts {id}}", 10) is None
+    cache.put(137, "{nfts {id}}", 10, result)
+
+    assert cache.get(137, "{nfts {id}}", 10) == result
+    assert cache.get(137, "{\n  nfts  {\n id }\n}", 10) == result  # normalized
+    assert cache.get(1, "{nfts {id}}", 10) is None
+    assert cache.get(137, "{nfts {id}}", 11) is None
+    assert (cache.hits, cache.misses) == (2, 3)
+    cache.close()
+
+    # persists on disk
+    cache = QueryCache(str(tmp_path / "cache.db"), 10**6)
+    assert cache.get(137, "{nfts {id}}", 10) == result
+    cache.close()
+
+
+@enforce_types
+def test_lru_eviction(tmp_path):
+    def _result(i: int) -> dict:
+        return {
+            "data": {"nfts": [{"id": f"{i}-{j}-{hash((i, j))}"} for j in range(40)]}
+        }
+
+    cache = QueryCache(str(tmp_path / "cache.db"), 10**6)
+    cache.put(137, "q0", 1, _result(0))
+    entry_size = cache.size_bytes()
+    cache.max_bytes = 3 * entry_size + entry_size // 2  # room for 3 entries
+
+    cache.put(137, "q1", 1, _result(1))
+    cache.put(137, "q2", 1, _result(2))
+    assert cache.get(137, "q0", 1) is not None  # q0 is now most recently used
+
+    cache.put(137, "q3", 1, _result(3))
+
+    assert cache.size_bytes() <= cache.max_bytes
+    assert cache.get(137, "q1", 1) is None  # least recently used went first
+    assert cache.get(137, "q0", 1) == _result(0)
+    assert cache.get(137, "q3", 1) == _result(3)
+    cache.close()
+
+
+@enforce_types
+def test_enable_disable(tmp_path, monkeypatch):
+    monkeypatch.setenv("SUBGRAPH_CACHE_FILE", str(tmp_path / "sub" / "cache.db"))
+    try:
+        cache = query_cache.enable()
+        assert query_cache.get_cache() is cache
+        assert cache.path == str(tmp_path / "sub" / "cache.db")
+        query_cache.print_cache_stats()
+    finally:
+        query_cache.disable()
+    assert query_cache.get_cache() is None
@@ -0,0 +1,65 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.util import request
+from df_py.util.concurrency import run_sync
+
+
+class _GraphQLHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    accept_encodings: list = []
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        length = int(self.headers["Content-Length"])
+        query = json.loads(self.rfile.read(length))["query"]
+        body = json.dumps({"data": {"echo": query}}).encode()
+
+        accept_encoding = self.headers.get("Accept-Encoding", "")
+        self.accept_encodings.append(accept_encoding)
+        if "gzip" in accept_encoding:
+            body = gzip.compress(body)
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="graphql_url")
+def fixture_graphql_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GraphQLHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/subgraphs/name/test"
+    server.shutdown()
+    server.server_close()
+
+
+@enforce_types
+def test_async_make_graphql_request_reuses_connection(graphql_url):
+    host = graphql_url.split("/subgraphs")[0]
+    _GraphQLHandler.accept_encodings = []
+    for i in range(5):
+        status, body = run_sync(
+            request.async_make_graphql_request(graphql_url, f"q{i}", pool_size=2)
+        )
+        assert status == 200
+        assert json.loads(body) == {"data": {"echo": f"q{i}"}}
+
+    assert all("gzip" in enc for enc in _GraphQLHandler.accept_encodings)
+
+    stats = request.get_connection_stats()
+    assert stats[host] == {"requests": 5, "connections": 1, "reused": 4}
+
+    request.print_connection_stats()
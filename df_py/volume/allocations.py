@@ -1,8 +1,11 @@
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 from enforce_typing import enforce_types
+from web3.main import Web3
 
-from df_py.volume import cleancase, csvs
+from df_py.volume import columnar, csvs
+from df_py.volume.columnar import NO_KEY
 
 
 @enforce_types
@@ -18,20 +21,9 @@ def allocs_to_stakes(allocs: dict, vebals: dict) -> dict:
     @return
       stakes - dict of [chainID][nft_addr][LP_addr] : veOCEAN_float - abs alloc
     """
-
-    allocs = cleancase.mod_allocations(allocs)
-    vebals = cleancase.mod_vebals(vebals)
-
-    stakes = allocs.copy()  # we'll be changing the values
-    for chainID in allocs:
-        for nft_addr in allocs[chainID]:
-            for LP_addr, perc_alloc in allocs[chainID][nft_addr].items():
-                vebal = vebals.get(LP_addr, 0.0)
-                stake = perc_alloc * vebal
-                stakes[chainID][nft_addr][LP_addr] = stake
-
-    cleancase.assert_stakes(stakes)
-    return stakes
+    allocs_table = columnar.allocations_from_dict(allocs)
+    vebals_table = columnar.vebals_from_dict(vebals)
+    return _allocs_to_stakes(allocs_table, vebals_table).to_dict()
 
 
 @enforce_types
@@ -43,8 +35,80 @@ def load_stakes(csv_dir: str) -> Tuple[dict, dict]:
       stakes - dict of [chainID][nft_addr][LP_addr] : veOCEAN_float - abs alloc
       locked_amts_per_nft - dict of [chainID][nft_addr][LP_addr] : OCEAN_float - abs alloc
     """
-    allocs = csvs.load_allocation_csvs(csv_dir)
-    vebals, locked_amts, _ = csvs.load_vebals_csv(csv_dir)
-    stakes = allocs_to_stakes(allocs, vebals)
-    locked_amts_per_nft = allocs_to_stakes(allocs, locked_amts)
+    stakes, locked_amts_per_nft = load_stakes_tables(csv_dir)
+    return stakes.to_dict(), locked_amts_per_nft.to_dict()
+
+
+@enforce_types
+def load_stakes_tables(csv_dir: str) -> Tuple[columnar.Table, columnar.Table]:
+    """
+    @description
+      Like load_stakes(), but return columnar.Tables. Reads allocations.csv
+      and vebals.csv just once, and makes stakes and locked amts together.
+
+    @notes
+      Each distinct address is validated just once, across both csvs,
+      rather than once per row.
+    """
+    alloc_rows = csvs.load_allocation_csv_rows(csv_dir)
+    vebal_rows = csvs.load_vebals_csv_rows(csv_dir)
+
+    # [LP_addr as in csv] : LP_addr, validated & lowercase
+    valid_LP_addrs: dict = {}
+
+    def _LP_addr(s: str) -> str:
+        if s not in valid_LP_addrs:
+            valid_LP_addrs[s] = Web3.to_checksum_address(s.lower()).lower()
+        return valid_LP_addrs[s]
+
+    # allocs, dictionary-encoded
+    nft_index: Dict[Optional[str], int] = {None: NO_KEY}
+    LP_index: Dict[Optional[str], int] = {None: NO_KEY}
+    chainIDs, nft_addrs, LP_addrs, percents = list(zip(*alloc_rows)) or [()] * 4
+    columns = [
+        np.array(chainIDs, dtype=np.int64),
+        [nft_index.setdefault(s, len(nft_index) - 1) for s in nft_addrs],
+        [LP_index.setdefault(s, len(LP_index) - 1) for s in LP_addrs],
+        np.array(percents, dtype=np.float64),
+    ]
+    for s in LP_index:
+        if s is not None:  # None is the code of no LP
+            _LP_addr(s)
+    allocs = columnar.from_columns(
+        columns, [nft_index, LP_index], columnar.ALLOCATIONS_DTYPE
+    )
+    allocs = columnar.without_duplicates(allocs)  # later rows win
+    columnar.assert_allocations(allocs)
+
+    # [LP_addr] : (vebal, locked_amt)
+    bals = {
+        _LP_addr(LP_addr): (float(balance), float(locked_amt))
+        for LP_addr, balance, locked_amt, _ in vebal_rows
+    }
+
+    # stakes and locked amts, in one pass
+    bals_of_code = np.array(
+        [bals.get(s, (0.0, 0.0)) for s in allocs.strs.tolist()] + [(0.0, 0.0)]
+    ).reshape(-1, 2)
+    bals_of_row = bals_of_code[allocs.rows["LP_addr"]]  # NO_KEY picks the last
+    stakes = _with_values(allocs, allocs.rows["alloc"] * bals_of_row[:, 0])
+    locked_amts_per_nft = _with_values(allocs, allocs.rows["alloc"] * bals_of_row[:, 1])
     return stakes, locked_amts_per_nft
+
+
+@enforce_types
+def _allocs_to_stakes(allocs: columnar.Table, vebals: columnar.Table) -> columnar.Table:
+    """Like allocs_to_stakes(), for Tables"""
+    bals = columnar.lookup(vebals, allocs, "LP_addr")
+    return _with_values(allocs, allocs.rows["alloc"] * bals)
+
+
+@enforce_types
+def _with_values(allocs: columnar.Table, stakes: np.ndarray) -> columnar.Table:
+    """Table of stakes, with the keys of allocs"""
+    rows = np.empty(len(allocs), dtype=columnar.STAKES_DTYPE)
+    rows["chainID"] = allocs.rows["chainID"]
+    rows["nft_addr"] = allocs.rows["nft_addr"]
+    rows["LP_addr"] = allocs.rows["LP_addr"]
+    rows["stake"] = stakes
+    return columnar.Table(rows, allocs.strs)
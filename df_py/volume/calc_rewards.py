@@ -1,13 +1,14 @@
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Union
 
 from enforce_typing import enforce_types
 
 from df_py.util.constants import DO_PUBREWARDS, DO_RANK
 from df_py.util.dcv_multiplier import get_df_week_number
 from df_py.util.graphutil import wait_to_latest_block
-from df_py.volume import allocations, csvs
+from df_py.volume import allocations, csvs, sweep
+from df_py.volume.columnar import Table
 from df_py.volume.reward_calculator import RewardCalculator
 
 
@@ -18,18 +19,36 @@ def calc_volume_rewards_from_csvs(
     tot_ocean: Optional[float] = 0.0,
     do_pubrewards: Optional[bool] = DO_PUBREWARDS,
     do_rank: Optional[bool] = DO_RANK,
+    *,
+    SYM: Optional[dict] = None,
+    R: Optional[dict] = None,
+    wait_for_subgraph: bool = True,
+    predictoor_feed_addrs: Optional[dict] = None,
 ):
-    S, L = allocations.load_stakes(csv_dir)
+    """
+    @arguments
+      csv_dir -- input dir for stakes/etc csvs, output dir for rewards csvs
+      SYM, R -- symbols & rates, if already loaded from csv_dir's csvs
+      wait_for_subgraph -- wait until each chain's subgraph is synced?
+        Not needed when recomputing past weeks
+      predictoor_feed_addrs -- dict of [chainID] : list of predictoor feed
+        nft_addrs. If None, query today's feeds. See RewardCalculator
+    """
+    S, L = allocations.load_stakes_tables(csv_dir)
     V = csvs.load_nftvols_csvs(csv_dir)
     C = csvs.load_owners_csvs(csv_dir)
-    SYM = csvs.load_symbols_csvs(csv_dir)
-    R = csvs.load_rate_csvs(csv_dir)
+    if SYM is None:
+        SYM = csvs.load_symbols_csvs(csv_dir)
+    if R is None:
+        R = csvs.load_rate_csvs(csv_dir)
 
-    chains = list(S.keys())
-    for chain in chains:
-        wait_to_latest_block(chain)
+    if wait_for_subgraph:
+        chains = list(dict.fromkeys(S.rows["chainID"].tolist()))
+        for chain in chains:
+            wait_to_latest_block(chain)
 
-    rewperlp, rewinfo = calc_volume_rewards(
+    # stream rewards into the csvs, without building nested dicts
+    vol_calculator = _volume_reward_calculator(
         S,
         L,
         V,
@@ -40,10 +59,54 @@ def calc_volume_rewards_from_csvs(
         tot_ocean,
         do_pubrewards,
         do_rank,
+        predictoor_feed_addrs=predictoor_feed_addrs,
+    )
+    rewperlp_rows, rewinfo_rows = vol_calculator.calculate_rows()
+
+    csvs.save_volume_rewards_csv_rows(rewperlp_rows, str(csv_dir))
+    csvs.save_volume_rewardsinfo_csv_rows(rewinfo_rows, str(csv_dir))
+
+
+@enforce_types
+def sweep_volume_rewards_from_csvs(
+    csv_dir: Union[str, Path],
+    start_date: Optional[datetime] = None,
+    tot_ocean: Optional[float] = 0.0,
+    *,
+    rank_scale_ops: Optional[list] = None,
+    max_n_rank_assets: Optional[list] = None,
+    target_wpys: Optional[list] = None,
+    do_pubrewards: Optional[list] = None,
+    top_k: int = 5,
+    n_workers: int = 1,
+) -> List[dict]:
+    """
+    @description
+      Like calc_volume_rewards_from_csvs(), but for each combination of
+      reward parameters. Output a summary csv rather than rewards csvs.
+      See sweep.sweep_volume_rewards() for details.
+    """
+    S, L = allocations.load_stakes_tables(csv_dir)
+    V = csvs.load_nftvols_csvs(csv_dir)
+    C = csvs.load_owners_csvs(csv_dir)
+    SYM = csvs.load_symbols_csvs(csv_dir)
+    R = csvs.load_rate_csvs(csv_dir)
+
+    vol_calculator = _volume_reward_calculator(
+        S, L, V, C, SYM, R, start_date, tot_ocean
+    )
+    results = sweep.sweep_volume_rewards(
+        vol_calculator,
+        rank_scale_ops,
+        max_n_rank_assets,
+        target_wpys,
+        do_pubrewards,
+        top_k=top_k,
+        n_workers=n_workers,
     )
 
-    csvs.save_volume_rewards_csv(rewperlp, str(csv_dir))
-    csvs.save_volume_rewardsinfo_csv(rewinfo, str(csv_dir))
+    csvs.save_volume_sweep_csv(results, str(csv_dir))
+    return results
 
 
 @enforce_types
@@ -59,6 +122,29 @@ def calc_volume_rewards(
     do_pubrewards: Optional[bool] = DO_PUBREWARDS,
     do_rank: Optional[bool] = DO_RANK,
 ):
+    vol_calculator = _volume_reward_calculator(
+        S, L, V, C, SYM, R, start_date, tot_ocean, do_pubrewards, do_rank
+    )
+
+    return vol_calculator.calculate()
+
+
+# same positional arguments, in the same order, as calc_volume_rewards()
+@enforce_types
+def _volume_reward_calculator(  # pylint: disable=too-many-positional-arguments
+    S: Union[dict, Table],
+    L: Union[dict, Table],
+    V: Dict[int, Dict[str, Dict[str, float]]],
+    C: Dict[int, Dict[str, str]],
+    SYM: Dict[int, Dict[str, str]],
+    R: Dict[str, float],
+    start_date: Optional[datetime] = None,
+    tot_ocean: Optional[float] = 0.0,
+    do_pubrewards: Optional[bool] = DO_PUBREWARDS,
+    do_rank: Optional[bool] = DO_RANK,
+    *,
+    predictoor_feed_addrs: Optional[dict] = None,
+) -> RewardCalculator:
     prev_week = 0
     if start_date is None:
         cur_week = get_df_week_number(datetime.now())
@@ -86,6 +172,7 @@ def calc_volume_rewards(
         tot_ocean,
         do_pubrewards,
         do_rank,
+        predictoor_feed_addrs=predictoor_feed_addrs,
     )
 
-    return vol_calculator.calculate()
+    return vol_calculator
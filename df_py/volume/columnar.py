@@ -0,0 +1,330 @@
+"""Columnar versions of the volume pipeline's nested dicts.
+
+Eg stakes -- dict of [chainID][nft_addr][LP_addr] : stake -- becomes a Table
+with one row per (chainID, nft_addr, LP_addr, stake). Rows are a NumPy
+structured array. Address columns hold int codes into the table's
+`strs` array, so each distinct string is stored, normalized and validated
+just once.
+
+The `*_from_dict()` functions normalize and validate a dict in one pass,
+following the same rules as cleancase.py. Table.to_dict() converts back.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+from enforce_typing import enforce_types
+
+# code of a missing key. Eg an nft with no LPs gives a row with LP_addr=-1,
+# so that to_dict() can restore the nft's (empty) dict
+NO_KEY = -1
+
+STR_CODE = np.int32
+
+ALLOCATIONS_DTYPE = np.dtype(
+    [
+        ("chainID", np.int64),
+        ("nft_addr", STR_CODE),
+        ("LP_addr", STR_CODE),
+        ("alloc", np.float64),
+    ]
+)
+STAKES_DTYPE = np.dtype(
+    [
+        ("chainID", np.int64),
+        ("nft_addr", STR_CODE),
+        ("LP_addr", STR_CODE),
+        ("stake", np.float64),
+    ]
+)
+VEBALS_DTYPE = np.dtype([("LP_addr", STR_CODE), ("bal", np.float64)])
+
+# value fields that must be floats, like cleancase.assert_allocations() and
+# assert_stakes() require
+FLOAT_FIELDS = ("alloc", "stake")
+
+
+class Table:
+    """
+    @description
+      Rows of a nested dict, as columns. The last field is the dict's
+      values; the fields before it are its keys, outermost first.
+
+    @attributes
+      rows -- NumPy structured array, in the dict's iteration order
+      strs -- 1d array of str -- decodes the str (int code) fields
+    """
+
+    @enforce_types
+    def __init__(self, rows: np.ndarray, strs: np.ndarray):
+        self.rows = rows
+        self.strs = strs
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, Table)
+            and self.rows.dtype == other.rows.dtype
+            and self.to_dict() == other.to_dict()
+        )
+
+    @enforce_types
+    def to_dict(self) -> dict:
+        """
+        @return
+          d -- nested dict, like the one the table was made from
+        """
+        rows, fields = self.rows, _field_names(self.rows.dtype)
+        strs = np.append(self.strs.astype(object), [None])  # NO_KEY picks None
+        columns = [
+            (strs[rows[field]] if _is_str_field(rows.dtype, field) else rows[field])
+            for field in fields
+        ]
+
+        if len(fields) == 2:
+            d = dict(zip(columns[0].tolist(), columns[1].tolist()))
+            d.pop(None, None)
+            return d
+
+        # rows with the same outer keys are (usually) in runs. Fill the
+        # innermost dict a run at a time
+        n_outer = len(fields) - 2
+        is_start = np.ones(len(rows), dtype=bool)
+        is_start[1:] = False
+        for field in fields[:n_outer]:
+            is_start[1:] |= rows[field][1:] != rows[field][:-1]
+        starts = np.flatnonzero(is_start).tolist() + [len(rows)]
+
+        outer = [column.tolist() for column in columns[:n_outer]]
+        keys, values = columns[-2].tolist(), columns[-1].tolist()
+        d = {}
+        for st, fin in zip(starts[:-1], starts[1:]):
+            inner = d.setdefault(outer[0][st], {})
+            if n_outer == 2:
+                if outer[1][st] is None:
+                    continue
+                inner = inner.setdefault(outer[1][st], {})
+            inner.update(zip(keys[st:fin], values[st:fin]))
+            inner.pop(None, None)
+        return d
+
+
+@enforce_types
+def allocations_from_dict(allocs: dict) -> Table:
+    """
+    @arguments
+      allocs -- dict of [chainID][nft_addr][LP_addr] : LP's % alloc
+
+    @notes
+      Like cleancase.mod_allocations(): also checks that each LP allocates
+      at most 100% in total.
+    """
+    table = _from_dict(allocs, ALLOCATIONS_DTYPE)
+    assert_allocations(table)
+    return table
+
+
+@enforce_types
+def assert_allocations(table: Table):
+    """Assert that each LP allocates at most 100% in total"""
+    rows = table.rows[table.rows["LP_addr"] != NO_KEY]
+    lpsum = np.bincount(rows["LP_addr"], rows["alloc"], minlength=len(table.strs))
+    for code in np.flatnonzero(lpsum > 1.0 + 1e-5):
+        LP_addr = table.strs[code]
+        raise AssertionError(f"LP {LP_addr} has {lpsum[code]}% allocation, > 1.0%")
+
+
+@enforce_types
+def stakes_from_dict(stakes: dict) -> Table:
+    """stakes -- dict of [chainID][nft_addr][LP_addr] : stake"""
+    return _from_dict(stakes, STAKES_DTYPE)
+
+
+@enforce_types
+def vebals_from_dict(vebals: dict) -> Table:
+    """vebals -- dict of [LP_addr] : LP's ve balance"""
+    return _from_dict(vebals, VEBALS_DTYPE)
+
+
+@enforce_types
+def lookup(table: Table, keys: Table, key_field: str) -> np.ndarray:
+    """
+    @description
+      Join: for each row of `keys`, find the value of the `table` row with
+      the same key_field. Eg each allocation's LP's vebal.
+
+    @arguments
+      table -- Table with 2 fields, (key_field, value)
+      keys -- Table that has key_field
+
+    @return
+      values -- 1d array -- value for each row of keys; 0.0 if none
+    """
+    key, value_field = _field_names(table.rows.dtype)
+    assert key == key_field, (key, key_field)
+
+    # codes are per table, so match via the strs. Just once per str
+    value_of_str = dict(
+        zip(table.strs[table.rows[key]].tolist(), table.rows[value_field].tolist())
+    )
+    value_of_code = np.array(
+        [value_of_str.get(s, 0.0) for s in keys.strs.tolist()] + [0.0]
+    )
+    return value_of_code[keys.rows[key_field]]  # NO_KEY picks the last
+
+
+@enforce_types
+def without_duplicates(table: Table) -> Table:
+    """
+    @description
+      Table with one row per key, where the key is all fields but the last.
+      Like loading the rows into a dict: if a key is in many rows, the
+      last row's value wins, at the first row's place.
+    """
+    rows, fields = table.rows, _field_names(table.rows.dtype)
+    keys = [rows[field] for field in reversed(fields[:-1])]
+    I = np.lexsort(keys)  # stable, so each key's rows stay in order
+    is_start = np.ones(len(rows), dtype=bool)
+    is_start[1:] = False
+    for key in keys:
+        is_start[1:] |= key[I][1:] != key[I][:-1]
+    starts = np.flatnonzero(is_start)
+    if len(starts) == len(rows):
+        return table
+
+    ends = np.append(starts[1:], len(rows)) - 1
+    first, last = I[starts], I[ends]
+    order = np.argsort(first)
+    deduped = rows[first[order]]
+    deduped[fields[-1]] = rows[fields[-1]][last[order]]
+    return Table(deduped, table.strs)
+
+
+@enforce_types
+def from_columns(columns: list, indexes: List[dict], dtype: np.dtype) -> Table:
+    """
+    @description
+      Make a Table from columns of a dtype's fields. Normalize and validate
+      each str column, like cleancase.py: addresses to lowercase & must
+      start with "0x". Values become floats; those in FLOAT_FIELDS must be
+      floats already.
+
+    @arguments
+      columns -- list of list or array, one per field of dtype. Str fields
+        hold codes: a str's code is its position in the field's index
+      indexes -- list of dict, one per str field, of [str] : code. Each
+        starts with {None: NO_KEY}, then codes 0, 1, 2, ..
+
+    @notes
+      Each distinct str is normalized & validated just once.
+    """
+    fields = _field_names(dtype)
+    str_fields = [field for field in fields if _is_str_field(dtype, field)]
+    rows = np.empty(len(columns[0]), dtype=dtype)
+
+    # normalize each field's distinct strs, into one dictionary. Normalizing
+    # may map different strs to the same one, so codes get remapped
+    code_of_str: dict = {}
+    for field, index in zip(str_fields, indexes):
+        normalized = _normalize(list(index)[1:])
+        remap = [code_of_str.setdefault(s, len(code_of_str)) for s in normalized]
+        codes = np.array(columns[fields.index(field)], dtype=STR_CODE)
+        rows[field] = np.array(remap + [NO_KEY], dtype=STR_CODE)[codes]
+
+    for field, column in zip(fields, columns):
+        if field == "chainID":
+            rows[field] = np.array(column, dtype=np.int64)
+        elif field not in str_fields:
+            if field in FLOAT_FIELDS:
+                _assert_floats(column, rows[fields[-2]])
+            rows[field] = np.array(column, dtype=np.float64)
+
+    return Table(rows, np.array(list(code_of_str), dtype=str))
+
+
+# ========================================================================
+# helpers
+
+
+@enforce_types
+def _from_dict(d: dict, dtype: np.dtype) -> Table:
+    """Flatten d into rows, then make a Table of them. See from_columns()"""
+    fields = _field_names(dtype)
+    n_str_fields = sum(_is_str_field(dtype, field) for field in fields)
+    columns: List[list] = [[] for _ in fields]
+    indexes: List[dict] = [{None: NO_KEY} for _ in range(n_str_fields)]
+    _flatten(d, columns, indexes)
+
+    # keys that differ only by case become the same key; the later one wins,
+    # like cleancase.py
+    return without_duplicates(from_columns(columns, indexes, dtype))
+
+
+def _flatten(d: dict, columns: List[list], indexes: List[dict]):
+    """
+    @description
+      Append a row to columns for each leaf of d, and each empty dict.
+      Strs go in as their code in the field's index, which grows as needed
+    """
+    if len(columns) == 2:  # [str] : float
+        columns[0].extend(_codes(indexes[0], d))
+        columns[1].extend(d.values())
+        return
+
+    # [chainID][str][str] : float
+    for chainID, d2 in d.items():
+        d2 = d2 or {None: {}}
+        for key2, d3 in d2.items():
+            d3 = d3 or {None: None}
+            columns[0].extend([chainID] * len(d3))
+            columns[1].extend([_codes(indexes[0], [key2])[0]] * len(d3))
+            columns[2].extend(_codes(indexes[1], d3))
+            columns[3].extend(d3.values())
+
+
+def _codes(index: dict, strs) -> list:
+    """Code of each str in index; add the ones that aren't there yet"""
+    return [
+        index[s] if s in index else index.setdefault(s, len(index) - 1) for s in strs
+    ]
+
+
+@enforce_types
+def _field_names(dtype: np.dtype) -> Tuple[str, ...]:
+    """Fields of a structured dtype, eg ("LP_addr", "bal")"""
+    names = dtype.names
+    assert names is not None, f"not a structured dtype: {dtype}"
+    return names
+
+
+def _assert_floats(values, keys: np.ndarray):
+    """
+    @description
+      Assert that each value is a float, like cleancase does. Except
+      for rows without a key (NO_KEY), which stand for an empty dict.
+
+    @arguments
+      values -- list, or 1d array
+      keys -- 1d array of str codes, one per value
+    """
+    if isinstance(values, np.ndarray):
+        assert values.dtype.kind == "f", values.dtype
+        return
+    for value, key in zip(values, keys.tolist()):
+        if key != NO_KEY:
+            assert isinstance(value, float), value
+
+
+@enforce_types
+def _normalize(strs: list) -> list:
+    """Addresses to lowercase. Each must start with 0x"""
+    strs = [s.lower() for s in strs]
+    bad = [s for s in strs if s[:2] != "0x"]
+    assert not bad, bad[0]
+    return strs
+
+
+def _is_str_field(dtype: np.dtype, field: str) -> bool:
+    return dtype[field] == STR_CODE
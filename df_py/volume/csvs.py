@@ -1,7 +1,7 @@
 import csv
 import glob
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 
 from enforce_typing import enforce_types
 from web3.main import Web3
@@ -55,34 +55,45 @@ def load_allocation_csvs(csv_dir: str) -> Dict[int, Dict[str, Dict[str, float]]]
     @return
       allocs -- dict of [chainID][basetoken_addr][nft_addr][LP_addr] : perc_flt
     """
-    csv_file = allocation_csv_filename(csv_dir)
     allocs: Dict[int, Dict[str, Dict[str, float]]] = {}
-    with open(csv_file, "r") as f:
-        reader = csv.reader(f)
-        for row_i, row in enumerate(reader):
-            if row_i == 0:
-                assert row == ["chainID", "nft_addr", "LP_addr", "percent"]
-                continue
-            _chainID, nft_addr, LP_addr, _percent = row
+    for _chainID, nft_addr, LP_addr, _percent in load_allocation_csv_rows(csv_dir):
+        chainID = int(_chainID)
+        nft_addr = nft_addr.lower()
+        LP_addr = Web3.to_checksum_address(LP_addr.lower())
+        percent = float(_percent)
 
-            chainID = int(_chainID)
-            nft_addr = nft_addr.lower()
-            LP_addr = Web3.to_checksum_address(LP_addr.lower())
-            percent = float(_percent)
+        assert_is_eth_addr(nft_addr)
+        assert_is_eth_addr(LP_addr)
 
-            assert_is_eth_addr(nft_addr)
-            assert_is_eth_addr(LP_addr)
+        if chainID not in allocs:
+            allocs[chainID] = {}
 
-            if chainID not in allocs:
-                allocs[chainID] = {}
+        if nft_addr not in allocs[chainID]:
+            allocs[chainID][nft_addr] = {}
 
-            if nft_addr not in allocs[chainID]:
-                allocs[chainID][nft_addr] = {}
+        allocs[chainID][nft_addr][LP_addr] = percent
+
+    return allocs
+
+
+@enforce_types
+def load_allocation_csv_rows(csv_dir: str) -> List[List[str]]:
+    """
+    @description
+      Load allocation csv as is: not converted, normalized or validated
 
-            allocs[chainID][nft_addr][LP_addr] = percent
+    @return
+      rows -- list of [chainID, nft_addr, LP_addr, percent] -- all strs
+    """
+    csv_file = allocation_csv_filename(csv_dir)
+    with open(csv_file, "r") as f:
+        rows = list(csv.reader(f))
     print(f"Loaded {csv_file}")
 
-    return allocs
+    if not rows:
+        return []
+    assert rows[0] == ["chainID", "nft_addr", "LP_addr", "percent"]
+    return rows[1:]
 
 
 @enforce_types
@@ -140,33 +151,46 @@ def load_vebals_csv(
     @return
       vebals -- dict of [LP_addr] : balance
     """
-    csv_file = vebals_csv_filename(csv_dir, sampled)
     vebals: Dict[str, float] = {}
     locked_amts: Dict[str, float] = {}
     unlock_times: Dict[str, int] = {}
-    with open(csv_file, "r") as f:
-        reader = csv.reader(f)
-        for row_i, row in enumerate(reader):
-            if row_i == 0:
-                assert row == ["LP_addr", "balance", "locked_amt", "unlock_time"]
-                continue
-            LP_addr, _balance, _locked_amt, _unlock_time = row
+    for row in load_vebals_csv_rows(csv_dir, sampled):
+        LP_addr, _balance, _locked_amt, _unlock_time = row
 
-            LP_addr = Web3.to_checksum_address(LP_addr.lower())
-            balance = float(_balance)
-            locked_amt = float(_locked_amt)
-            unlock_time = int(_unlock_time)
+        LP_addr = Web3.to_checksum_address(LP_addr.lower())
+        balance = float(_balance)
+        locked_amt = float(_locked_amt)
+        unlock_time = int(_unlock_time)
 
-            assert_is_eth_addr(LP_addr)
+        assert_is_eth_addr(LP_addr)
 
-            vebals[LP_addr] = balance
-            locked_amts[LP_addr] = locked_amt
-            unlock_times[LP_addr] = unlock_time
+        vebals[LP_addr] = balance
+        locked_amts[LP_addr] = locked_amt
+        unlock_times[LP_addr] = unlock_time
 
-    print(f"Loaded {csv_file}")
     return vebals, locked_amts, unlock_times
 
 
+@enforce_types
+def load_vebals_csv_rows(csv_dir: str, sampled=True) -> List[List[str]]:
+    """
+    @description
+      Load veOCEAN balances csv as is: not converted, normalized or validated
+
+    @return
+      rows -- list of [LP_addr, balance, locked_amt, unlock_time] -- all strs
+    """
+    csv_file = vebals_csv_filename(csv_dir, sampled)
+    with open(csv_file, "r") as f:
+        rows = list(csv.reader(f))
+    print(f"Loaded {csv_file}")
+
+    if not rows:
+        return []
+    assert rows[0] == ["LP_addr", "balance", "locked_amt", "unlock_time"]
+    return rows[1:]
+
+
 @enforce_types
 def vebals_csv_filename(csv_dir: str, sampled=True) -> str:
     """Returns the vebals filename"""
@@ -731,6 +755,28 @@ def save_volume_rewards_csv(
       rewards -- dict of [chainID][LP_addr] : value (float, *not* integers / wei)
       ..
     """
+    rows = (
+        (chainID, LP_addr, value)
+        for chainID, innerdict in rewards.items()
+        for LP_addr, value in innerdict.items()
+    )
+    save_volume_rewards_csv_rows(rows, csv_dir)
+
+
+@enforce_types
+def save_volume_rewards_csv_rows(
+    rows: Iterable[Tuple[int, str, float]],
+    csv_dir: str,
+):
+    """
+    @description
+      Like save_volume_rewards_csv(), but writes rows as they come, without
+      needing them all in a dict. E.g. from RewardCalculator.calculate_rows()
+
+    @arguments
+      rows -- iterable of (chainID, LP_addr, value)
+      ..
+    """
     csv_file = volume_rewards_csv_filename(csv_dir)
     assert not os.path.exists(csv_file), f"{csv_file} can't already exist"
     with open(csv_file, "w") as f:
@@ -739,11 +785,10 @@ def save_volume_rewards_csv(
         header = ["chainID", "LP_addr", "OCEAN_amt"]
         writer.writerow(header)
 
-        for chainID, innerdict in rewards.items():
-            for LP_addr, value in innerdict.items():
-                assert_is_eth_addr(LP_addr)
-                row = [chainID, LP_addr.lower(), value]
-                writer.writerow(row)
+        for chainID, LP_addr, value in rows:
+            assert_is_eth_addr(LP_addr)
+            row = [chainID, LP_addr.lower(), value]
+            writer.writerow(row)
     print(f"Created {csv_file}")
 
 
@@ -797,6 +842,29 @@ def save_volume_rewardsinfo_csv(
       rewards -- dict of [chainID][nft_addr][LP_addr] : value (float, *not* base 18)
       ..
     """
+    rows = (
+        (chainID, nft_addr, LP_addr, value)
+        for chainID, innerdict in rewards.items()
+        for nft_addr, innerdict2 in innerdict.items()
+        for LP_addr, value in innerdict2.items()
+    )
+    save_volume_rewardsinfo_csv_rows(rows, csv_dir)
+
+
+@enforce_types
+def save_volume_rewardsinfo_csv_rows(
+    rows: Iterable[Tuple[int, str, str, float]], csv_dir: str
+):
+    """
+    @description
+      Like save_volume_rewardsinfo_csv(), but writes rows as they come,
+      without needing them all in a dict. E.g. from
+      RewardCalculator.calculate_rows()
+
+    @arguments
+      rows -- iterable of (chainID, nft_addr, LP_addr, value)
+      ..
+    """
     csv_file = volume_rewardsinfo_csv_filename(csv_dir)
     assert not os.path.exists(csv_file), f"{csv_file} can't already exist"
     with open(csv_file, "w") as f:
@@ -805,19 +873,17 @@ def save_volume_rewardsinfo_csv(
         header = ["chainID", "nft_addr", "LP_addr", "amt", "token"]
         writer.writerow(header)
 
-        for chainID, innerdict in rewards.items():
-            for LP_addr, innerdict2 in innerdict.items():
-                assert_is_eth_addr(LP_addr)
-                for nft_addr, value in innerdict2.items():
-                    assert_is_eth_addr(nft_addr)
-                    row = [
-                        chainID,
-                        LP_addr.lower(),
-                        nft_addr.lower(),
-                        value,
-                        "OCEAN",
-                    ]
-                    writer.writerow(row)
+        for chainID, nft_addr, LP_addr, value in rows:
+            assert_is_eth_addr(nft_addr)
+            assert_is_eth_addr(LP_addr)
+            row = [
+                chainID,
+                nft_addr.lower(),
+                LP_addr.lower(),
+                value,
+                "OCEAN",
+            ]
+            writer.writerow(row)
     print(f"Created {csv_file}")
 
 
@@ -860,3 +926,50 @@ def load_volume_rewardsinfo_csv(csv_dir: str) -> Dict[int, Dict[str, Dict[str, A
     print(f"Loaded {csv_file}")
 
     return rewardsinfo
+
+
+# ========================================================================
+# sweep csvs
+
+
+@enforce_types
+def save_volume_sweep_csv(results: List[dict], csv_dir: str):
+    """
+    @description
+      Save the results of a reward parameter sweep, one row per combination
+      of parameters.
+
+    @arguments
+      results -- list of dict, from sweep.sweep_volume_rewards()
+      ..
+    """
+    assert os.path.exists(csv_dir), csv_dir
+    csv_file = volume_sweep_csv_filename(csv_dir)
+    assert not os.path.exists(csv_file), csv_file
+
+    with open(csv_file, "w") as f:
+        writer = csv.writer(f)
+        header = [
+            "RANK_SCALE_OP",
+            "MAX_N_RANK_ASSETS",
+            "TARGET_WPY",
+            "DO_PUBREWARDS",
+            "total_OCEAN",
+            "n_LPs",
+            "gini",
+            "top_LP_addrs",
+            "top_OCEAN_amts",
+        ]
+        writer.writerow(header)
+
+        for r in results:
+            row = [r[key] for key in header[:7]]
+            row.append(" ".join(LP_addr.lower() for LP_addr, _ in r["top"]))
+            row.append(" ".join(str(amt) for _, amt in r["top"]))
+            writer.writerow(row)
+    print(f"Created {csv_file}")
+
+
+@enforce_types
+def volume_sweep_csv_filename(csv_dir: str) -> str:
+    return os.path.join(csv_dir, "volume_sweep.csv")
@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import Dict, List, Tuple
 
@@ -5,21 +6,113 @@ import requests
 from enforce_typing import enforce_types
 from web3.main import Web3
 
-from df_py.predictoor.queries import query_predictoor_contracts
+from df_py.predictoor.queries import (
+    async_query_predictoor_contracts,
+    query_predictoor_contracts,
+)
 from df_py.util import networkutil, oceanutil
 from df_py.util.base18 import from_wei
 from df_py.util.blockrange import BlockRange
 from df_py.util.constants import AQUARIUS_BASE_URL, MAX_ALLOCATE
 from df_py.util.contract_base import ContractBase
-from df_py.util.graphutil import submit_query
+from df_py.util.concurrency import run_in_thread, run_sync
+from df_py.util.graphutil import (
+    SubgraphNoDataError,
+    async_paginate_records,
+    async_query_snapshots,
+)
 from df_py.volume.models import SimpleDataNft, TokSet
 
 MAX_TIME = 4 * 365 * 86400  # max lock time
 
+# selection sets for async_paginate_records(); each must include `id`
+VEOCEAN_FIELDS = """
+  id
+  lockedAmount
+  unlockTime
+  delegation {
+    receiver {
+      id
+    }
+    amount
+    expireTime
+    timeLeftUnlock
+  }
+"""
+
+VEALLOCATION_FIELDS = """
+  id
+  allocated
+  chainId
+  nftAddress
+  allocationUser {
+    id
+  }
+"""
+
+NFT_FIELDS = """
+  id
+  symbol
+  owner {
+    id
+  }
+"""
+
+ORDER_FIELDS = """
+  id
+  datatoken {
+    id
+    symbol
+    nft {
+      id
+      owner {
+        id
+      }
+    }
+    dispensers {
+      id
+    }
+  }
+  lastPriceToken {
+    id
+  }
+  lastPriceValue
+  block
+  gasPrice
+  gasUsed
+  tx
+"""
+
+SWAP_FIELDS = """
+  id
+  baseTokenAmount
+  block
+  exchangeId {
+    id
+    baseToken {
+      id
+    }
+    datatoken {
+      id
+      symbol
+      nft {
+        id
+      }
+    }
+  }
+"""
 
 @enforce_types
 def queryVolsOwnersSymbols(
     rng: BlockRange, chainID: int
+) -> Tuple[Dict[str, Dict[str, float]], Dict[str, str], Dict[str, str]]:
+    """Sync version of async_queryVolsOwnersSymbols()"""
+    return run_sync(async_queryVolsOwnersSymbols(rng, chainID))
+
+
+@enforce_types
+async def async_queryVolsOwnersSymbols(
+    rng: BlockRange, chainID: int
 ) -> Tuple[Dict[str, Dict[str, float]], Dict[str, str], Dict[str, str]]:
     """
     @description
@@ -34,9 +127,21 @@ def queryVolsOwnersSymbols(
       A stake or nftvol value is denominated in basetoken (amt of OCEAN, H2O).
       Basetoken symbols are full uppercase, addresses are full lowercase.
     """
-    Vi_unfiltered, Ci, gasvols = _queryVolsOwners(rng.st, rng.fin, chainID)
-    swaps = _querySwaps(rng.st, rng.fin, chainID)
-    Vi = _filterNftvols(Vi_unfiltered, chainID)
+    # The I/O streams run concurrently, as far as their inputs allow:
+    #   orders --> Aquarius & purgatory filter --+--> merge --> symbol() calls
+    #   swaps -----------------------------------+
+    swaps_task = asyncio.ensure_future(_async_querySwaps(rng.st, rng.fin, chainID))
+    try:
+        Vi_unfiltered, Ci, gasvols = await _async_queryVolsOwners(
+            rng.st, rng.fin, chainID
+        )
+        Vi, swaps = await asyncio.gather(
+            run_in_thread(_filterNftvols, Vi_unfiltered, chainID), swaps_task
+        )
+    except BaseException:
+        swaps_task.cancel()
+        raise
+
     Vi = _filterbyMaxVolume(Vi, swaps)
 
     # merge Vi and gasvols
@@ -48,10 +153,12 @@ def queryVolsOwnersSymbols(
                 Vi[basetoken][nft] = 0.0
             Vi[basetoken][nft] += gasvols[basetoken][nft]
 
-    # get all basetokens from Vi
+    # get all basetokens from Vi; only these need a symbol() call
     basetokens = TokSet()
-    for basetoken in Vi:
-        _symbol = symbol(rng.web3, basetoken)
+    _symbols = await asyncio.gather(
+        *[run_in_thread(symbol, rng.web3, basetoken) for basetoken in Vi]
+    )
+    for basetoken, _symbol in zip(Vi, _symbols):
         basetokens.add(chainID, basetoken, _symbol)
     SYMi = getSymbols(basetokens, chainID)
     return (Vi, Ci, SYMi)
@@ -94,6 +201,14 @@ def _process_delegation(
 @enforce_types
 def queryVebalances(
     rng: BlockRange, CHAINID: int
+) -> Tuple[Dict[str, float], Dict[str, float], Dict[str, int]]:
+    """Sync version of async_queryVebalances()"""
+    return run_sync(async_queryVebalances(rng, CHAINID))
+
+
+@enforce_types
+async def async_queryVebalances(
+    rng: BlockRange, CHAINID: int
 ) -> Tuple[Dict[str, float], Dict[str, float], Dict[str, int]]:
     """
     @description
@@ -114,58 +229,20 @@ def queryVebalances(
     unlock_times: Dict[str, int] = {}
 
     web3 = networkutil.chain_id_to_web3(CHAINID)
-    unixEpochTime = web3.eth.get_block("latest").timestamp
+    unixEpochTime = (await run_in_thread(web3.eth.get_block, "latest")).timestamp
     n_blocks = rng.num_blocks()
     n_blocks_sampled = 0
-    blocks = rng.get_blocks()
+    blocks = [int(block) for block in rng.get_blocks()]
     print("queryVebalances: begin")
 
-    for block_i, block in enumerate(blocks):
-        if (block_i % 50) == 0 or (block_i == n_blocks - 1):
-            print(f"  {(block_i+1) / float(n_blocks) * 100.0:.1f}% done")
-        chunk_size = 1000
-        offset = 0
-        while True:
-            query = """
-              {
-                veOCEANs(first: %d, skip: %d,block:{number: %d}) {
-                  id
-                  lockedAmount
-                  unlockTime
-                  delegation {
-                    id
-                    receiver {
-                      id
-                    }
-                    amount
-                    expireTime
-                    timeLeftUnlock
-                    lockedAmount
-                    updates(orderBy:timestamp orderDirection:asc){
-                      timestamp
-                      sender
-                      amount
-                      type
-                    }
-                  }
-                }
-              }
-            """ % (
-                chunk_size,
-                offset,
-                block,
-            )
-
-            result = submit_query(query, CHAINID)
-            if "data" in result:
-                assert "veOCEANs" in result["data"]
-                veOCEANs = result["data"]["veOCEANs"]
-            else:
-                return ({}, {}, {})
-
-            if len(veOCEANs) == 0:
-                # means there are no records left
-                break
+    snapshots = async_query_snapshots(
+        "veOCEANs", VEOCEAN_FIELDS, CHAINID, blocks, transform=_slim_veOCEAN
+    )
+    try:
+        async for veOCEANs in snapshots:
+            block_i = n_blocks_sampled
+            if (block_i % 50) == 0 or (block_i == n_blocks - 1):
+                print(f"  {(block_i+1) / float(n_blocks) * 100.0:.1f}% done")
 
             for user in veOCEANs:
                 ve_unlock_time = int(user["unlockTime"])
@@ -209,10 +286,10 @@ def queryVebalances(
 
                 # set unlock time
                 unlock_times[LP_addr] = ve_unlock_time
-
-            # increase offset
-            offset += chunk_size
-        n_blocks_sampled += 1
+            n_blocks_sampled += 1
+    except SubgraphNoDataError:
+        # no data at a sampled block, e.g. not indexed by the subgraph
+        return ({}, {}, {})
 
     # TO DO: this assertion doesn't work with nsamples = 1, failing in test_queries all
     # assert n_blocks_sampled > 0
@@ -226,9 +303,41 @@ def queryVebalances(
     return vebals, locked_amts, unlock_times
 
 
+@enforce_types
+def _slim_veOCEAN(record: dict) -> dict:
+    """
+    @description
+      Keep just the fields of a veOCEAN record that queryVebalances() reads.
+      VEOCEAN_FIELDS selects just those already; this drops any others,
+      e.g. from a cached response to an older selection.
+    """
+    return {
+        "id": record["id"],
+        "lockedAmount": record["lockedAmount"],
+        "unlockTime": record["unlockTime"],
+        "delegation": [
+            {
+                "receiver": {"id": delegation["receiver"]["id"]},
+                "amount": delegation["amount"],
+                "expireTime": delegation["expireTime"],
+                "timeLeftUnlock": delegation["timeLeftUnlock"],
+            }
+            for delegation in record["delegation"]
+        ],
+    }
+
+
 @enforce_types
 def queryAllocations(
     rng: BlockRange, CHAINID: int
+) -> Dict[int, Dict[str, Dict[str, float]]]:
+    """Sync version of async_queryAllocations()"""
+    return run_sync(async_queryAllocations(rng, CHAINID))
+
+
+@enforce_types
+async def async_queryAllocations(
+    rng: BlockRange, CHAINID: int
 ) -> Dict[int, Dict[str, Dict[str, float]]]:
     """
     @description
@@ -243,47 +352,20 @@ def queryAllocations(
 
     n_blocks = rng.num_blocks()
     n_blocks_sampled = 0
-    blocks = rng.get_blocks()
-
-    for block_i, block in enumerate(blocks):
-        if (block_i % 50) == 0 or (block_i == n_blocks - 1):
-            print(f"  {(block_i+1) / float(n_blocks) * 100.0:.1f}% done")
-
-        offset = 0
-        chunk_size = 1000
-        while True:
-            query = """
-            {
-              veAllocations(
-                first: %d, skip: %d, block:{number:%d}, 
-                    where:{
-                      allocated_not:"0"
-                    }
-                  ) {
-                    id
-                    allocated
-                    chainId
-                    nftAddress
-                    allocationUser {
-                      id
-                    }
-                  }
-              }
-          """ % (
-                chunk_size,
-                offset,
-                block,
-            )
-            result = submit_query(query, CHAINID)
-            if "data" in result:
-                assert "veAllocations" in result["data"]
-                _allocs = result["data"]["veAllocations"]
-            else:
-                return {}
-
-            if len(_allocs) == 0:
-                # means there are no records left
-                break
+    blocks = [int(block) for block in rng.get_blocks()]
+
+    snapshots = async_query_snapshots(
+        "veAllocations",
+        VEALLOCATION_FIELDS,
+        CHAINID,
+        blocks,
+        where='allocated_not: "0"',
+    )
+    try:
+        async for _allocs in snapshots:
+            block_i = n_blocks_sampled
+            if (block_i % 50) == 0 or (block_i == n_blocks - 1):
+                print(f"  {(block_i+1) / float(n_blocks) * 100.0:.1f}% done")
 
             for allocation in _allocs:
                 LP_addr = str(
@@ -305,12 +387,10 @@ def queryAllocations(
                     allocs[chain_id][nft_addr][LP_addr] = allocated
                 else:
                     allocs[chain_id][nft_addr][LP_addr] += allocated
-
-            if len(_allocs) < chunk_size:
-                # means there are no records left
-                break
-            offset += chunk_size
-        n_blocks_sampled += 1
+            n_blocks_sampled += 1
+    except SubgraphNoDataError:
+        # no data at a sampled block, e.g. not indexed by the subgraph
+        return {}
 
     # TO DO: this assertion doesn't work with nsamples = 1, failing in test_queries all
     # assert n_blocks_sampled > 0
@@ -348,6 +428,12 @@ def queryAllocations(
 
 @enforce_types
 def queryNftinfo(chainID, endBlock="latest") -> List[SimpleDataNft]:
+    """Sync version of async_queryNftinfo()"""
+    return run_sync(async_queryNftinfo(chainID, endBlock))
+
+
+@enforce_types
+async def async_queryNftinfo(chainID, endBlock="latest") -> List[SimpleDataNft]:
     """
     @description
       Fetch, filter and return all NFTs on the chain
@@ -356,22 +442,22 @@ def queryNftinfo(chainID, endBlock="latest") -> List[SimpleDataNft]:
       nftInfo -- list of SimpleDataNft objects
     """
 
-    nftinfo = _queryNftinfo(chainID, endBlock)
+    nftinfo = await _async_queryNftinfo(chainID, endBlock)
 
     if chainID == networkutil.network_to_chain_id(
         "sapphire-mainnet"
     ) or chainID == networkutil.network_to_chain_id("sapphire-testnet"):
-        opf_contracts = query_predictoor_contracts(chainID)
-        nftinfo = _markPurgatoryNfts(nftinfo)
+        opf_contracts = await async_query_predictoor_contracts(chainID)
+        nftinfo = await run_in_thread(_markPurgatoryNfts, nftinfo)
         nftinfo = [i for i in nftinfo if i.nft_addr in opf_contracts]
         for nft in nftinfo:
             nft.set_name("Predictoor Asset: " + opf_contracts[nft.nft_addr].name)
 
     elif chainID != networkutil.DEV_CHAINID:
         # filter if not on dev chain
-        nftinfo = _filterNftinfos(nftinfo)
-        nftinfo = _markPurgatoryNfts(nftinfo)
-        nftinfo = _populateNftAssetNames(nftinfo)
+        nftinfo = await run_in_thread(_filterNftinfos, nftinfo)
+        nftinfo = await run_in_thread(_markPurgatoryNfts, nftinfo)
+        nftinfo = await run_in_thread(_populateNftAssetNames, nftinfo)
 
     return nftinfo
 
@@ -396,7 +482,7 @@ def _populateNftAssetNames(nftInfo: List[SimpleDataNft]) -> List[SimpleDataNft]:
 
 
 @enforce_types
-def _queryNftinfo(chainID, endBlock) -> List[SimpleDataNft]:
+async def _async_queryNftinfo(chainID, endBlock) -> List[SimpleDataNft]:
     """
     @description
       Return all NFTs on the chain
@@ -405,48 +491,24 @@ def _queryNftinfo(chainID, endBlock) -> List[SimpleDataNft]:
       nftInfo -- list of SimpleDataNft objects
     """
     nftinfo = []
-    chunk_size = 1000
-    offset = 0
 
     if endBlock == "latest":
         w3 = networkutil.chain_id_to_web3(chainID)
-        endBlock = w3.eth.get_block("latest").number
-
-    while True:
-        query = """
-      {
-         nfts(first: %d, skip: %d, block:{number:%d}) {
-            id
-            symbol
-            owner {
-              id
-            }
-        }
-      }
-      """ % (
-            chunk_size,
-            offset,
-            endBlock,
+        endBlock = (await run_in_thread(w3.eth.get_block, "latest")).number
+
+    async for nft_record in async_paginate_records(
+        "nfts", NFT_FIELDS, chainID, block=endBlock
+    ):
+        nft_addr = nft_record["id"]
+        _symbol = nft_record["symbol"]
+        owner_addr = nft_record["owner"]["id"]
+        simple_data_nft = SimpleDataNft(
+            chain_id=chainID,
+            nft_addr=nft_addr,
+            _symbol=_symbol,
+            owner_addr=owner_addr,
         )
-        result = submit_query(query, chainID)
-        nft_records = result["data"]["nfts"]
-        if len(nft_records) == 0:
-            # means there are no records left
-            break
-
-        for nft_record in nft_records:
-            nft_addr = nft_record["id"]
-            _symbol = nft_record["symbol"]
-            owner_addr = nft_record["owner"]["id"]
-            simple_data_nft = SimpleDataNft(
-                chain_id=chainID,
-                nft_addr=nft_addr,
-                _symbol=_symbol,
-                owner_addr=owner_addr,
-            )
-            nftinfo.append(simple_data_nft)
-
-        offset += chunk_size
+        nftinfo.append(simple_data_nft)
 
     return nftinfo
 
@@ -483,6 +545,14 @@ def _calculate_gas_vols(
 @enforce_types
 def _queryVolsOwners(
     st_block: int, end_block: int, chainID: int
+) -> Tuple[Dict[str, Dict[str, float]], Dict[str, float], Dict[str, Dict[str, float]]]:
+    """Sync version of _async_queryVolsOwners()"""
+    return run_sync(_async_queryVolsOwners(st_block, end_block, chainID))
+
+
+@enforce_types
+async def _async_queryVolsOwners(
+    st_block: int, end_block: int, chainID: int
 ) -> Tuple[Dict[str, Dict[str, float]], Dict[str, float], Dict[str, Dict[str, float]]]:
     """
     @description
@@ -500,85 +570,44 @@ def _queryVolsOwners(
     txgascost: Dict[str, Dict[str, float]] = {}  # tx hash : gas cost
     native_token_addr = networkutil._CHAINID_TO_ADDRS[chainID].lower()
 
-    chunk_size = 1000  # max for subgraph = 1000
-    offset = 0
-    while True:
-        query = """
-        {
-          orders(where: {block_gte:%s, block_lte:%s}, skip:%s, first:%s) {
-            id,
-            datatoken {
-              id
-              symbol
-              nft {
-                id
-                owner{
-                  id
-                }
-              }
-              dispensers {
-                id
-              }
-            },
-            lastPriceToken{
-              id
-            },
-            lastPriceValue,
-            block,
-            gasPrice,
-            gasUsed,
-            tx
-          }
-        }
-        """ % (
-            st_block,
-            end_block,
-            offset,
-            chunk_size,
-        )
-        offset += chunk_size
-        result = submit_query(query, chainID)
-        if "errors" in result:
-            raise AssertionError(result)
-        new_orders = result["data"]["orders"]
-
-        if new_orders == []:
-            break
-        for order in new_orders:
-            lastPriceValue = float(order["lastPriceValue"])
-            if len(order["datatoken"]["dispensers"]) == 0 and lastPriceValue == 0:
-                continue
-            basetoken_addr = order["lastPriceToken"]["id"].lower()
-            nft_addr = order["datatoken"]["nft"]["id"].lower()
-            owner_addr = order["datatoken"]["nft"]["owner"]["id"].lower()
-
-            # add owner
-            owners[nft_addr] = owner_addr
-
-            # Calculate gas cost
-            gasCostWei = int(order["gasPrice"]) * int(order["gasUsed"])
-
-            # deduct 1 wei so it's not profitable for free assets
-            gasCost = from_wei(gasCostWei - 1)
-
-            # add gas cost value
-            if gasCost > 0:
-                if order["tx"] not in txgascost:
-                    txgascost[order["tx"]] = {}
-                if nft_addr not in txgascost[order["tx"]]:
-                    txgascost[order["tx"]][nft_addr] = 0
-                txgascost[order["tx"]][nft_addr] = gasCost
-
-            if lastPriceValue == 0:
-                continue
-
-            # add lastPriceValue
-            if basetoken_addr not in vols:
-                vols[basetoken_addr] = {}
-
-            if nft_addr not in vols[basetoken_addr]:
-                vols[basetoken_addr][nft_addr] = 0.0
-            vols[basetoken_addr][nft_addr] += lastPriceValue
+    where = f"block_gte: {st_block}, block_lte: {end_block}"
+    async for order in async_paginate_records(
+        "orders", ORDER_FIELDS, chainID, where=where
+    ):
+        lastPriceValue = float(order["lastPriceValue"])
+        if len(order["datatoken"]["dispensers"]) == 0 and lastPriceValue == 0:
+            continue
+        basetoken_addr = order["lastPriceToken"]["id"].lower()
+        nft_addr = order["datatoken"]["nft"]["id"].lower()
+        owner_addr = order["datatoken"]["nft"]["owner"]["id"].lower()
+
+        # add owner
+        owners[nft_addr] = owner_addr
+
+        # Calculate gas cost
+        gasCostWei = int(order["gasPrice"]) * int(order["gasUsed"])
+
+        # deduct 1 wei so it's not profitable for free assets
+        gasCost = from_wei(gasCostWei - 1)
+
+        # add gas cost value
+        if gasCost > 0:
+            if order["tx"] not in txgascost:
+                txgascost[order["tx"]] = {}
+            if nft_addr not in txgascost[order["tx"]]:
+                txgascost[order["tx"]][nft_addr] = 0
+            txgascost[order["tx"]][nft_addr] = gasCost
+
+        if lastPriceValue == 0:
+            continue
+
+        # add lastPriceValue
+        if basetoken_addr not in vols:
+            vols[basetoken_addr] = {}
+
+        if nft_addr not in vols[basetoken_addr]:
+            vols[basetoken_addr][nft_addr] = 0.0
+        vols[basetoken_addr][nft_addr] += lastPriceValue
 
     # calculate gas vols
     gasvols = _calculate_gas_vols(txgascost, native_token_addr)
@@ -590,6 +619,14 @@ def _queryVolsOwners(
 @enforce_types
 def _querySwaps(
     st_block: int, end_block: int, chainID: int
+) -> Dict[str, Dict[str, float]]:
+    """Sync version of _async_querySwaps()"""
+    return run_sync(_async_querySwaps(st_block, end_block, chainID))
+
+
+@enforce_types
+async def _async_querySwaps(
+    st_block: int, end_block: int, chainID: int
 ) -> Dict[str, Dict[str, float]]:
     """
     @description
@@ -604,54 +641,20 @@ def _querySwaps(
     # base token, nft addr, vol
     swaps: Dict[str, Dict[str, float]] = {}
 
-    chunk_size = 1000  # max for subgraph = 1000
-    offset = 0
-    while True:
-        query = """
-        {
-          fixedRateExchangeSwaps(where: {block_gte:%s, block_lte:%s}, skip:%s, first:%s) {
-            id
-            baseTokenAmount
-            block
-            exchangeId {
-              id
-              baseToken {
-                id
-              }
-              datatoken {
-                id
-                symbol
-                nft {
-                  id
-                }
-              }
-            }
-          }
-        }
-        """ % (
-            st_block,
-            end_block,
-            offset,
-            chunk_size,
-        )
-        offset += chunk_size
-        result = submit_query(query, chainID)
-        if "errors" in result:
-            raise AssertionError(result)
-        new_swaps = result["data"]["fixedRateExchangeSwaps"]
-        if new_swaps == []:
-            break
-        for swap in new_swaps:
-            amt = float(swap["baseTokenAmount"])
-            if amt == 0:
-                continue
-            nft_addr = swap["exchangeId"]["datatoken"]["nft"]["id"].lower()
-            basetoken_addr = swap["exchangeId"]["baseToken"]["id"].lower()
-            if basetoken_addr not in swaps:
-                swaps[basetoken_addr] = {}
-            if nft_addr not in swaps[basetoken_addr]:
-                swaps[basetoken_addr][nft_addr] = 0.0
-            swaps[basetoken_addr][nft_addr] += amt
+    where = f"block_gte: {st_block}, block_lte: {end_block}"
+    async for swap in async_paginate_records(
+        "fixedRateExchangeSwaps", SWAP_FIELDS, chainID, where=where
+    ):
+        amt = float(swap["baseTokenAmount"])
+        if amt == 0:
+            continue
+        nft_addr = swap["exchangeId"]["datatoken"]["nft"]["id"].lower()
+        basetoken_addr = swap["exchangeId"]["baseToken"]["id"].lower()
+        if basetoken_addr not in swaps:
+            swaps[basetoken_addr] = {}
+        if nft_addr not in swaps[basetoken_addr]:
+            swaps[basetoken_addr][nft_addr] = 0.0
+        swaps[basetoken_addr][nft_addr] += amt
 
     print("_querySwaps(): done")
     return swaps
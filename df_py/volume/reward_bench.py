@@ -0,0 +1,350 @@
+"""Benchmark RewardCalculator on synthetic worlds, stage by stage.
+
+Usage: python -m df_py.volume.reward_bench [--scales tiny,small,..]
+  [--out FILE.json] [--compare BASELINE.json]
+
+Each scale runs in a fresh process, so that its peak memory is its own.
+Save the JSON of one commit with --out, then pass it to --compare on
+another commit to see the ratio of each stage's time. Needs no network.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+import scipy.stats  # pylint: disable=unused-import
+from enforce_typing import enforce_types
+
+from df_py.volume import cleancase, reward_calculator
+from df_py.volume.reward_calculator import RewardCalculator
+
+# name : (# LPs, # assets)
+SCALES = {
+    "tiny": (100, 100),
+    "small": (1_000, 500),
+    "medium": (10_000, 2_000),
+    "large": (100_000, 20_000),
+}
+
+# the stages of RewardCalculator that get timed, in order
+STAGES = [
+    "cleancase",
+    "nft_vols_to_usd",
+    "matrix_build",
+    "rank_based_allocate",
+    "calc_rewards__usd",
+    "dict_export",
+]
+
+CHAINIDS = [1, 137]
+OCEAN_ADDRS = {
+    1: "0x967da4048cd07ab37855c090aaf366e4ce1b9f48",
+    137: "0x282d8efce846a88b159800bd4130ad77443fa1a1",
+}
+H2O_ADDRS = {
+    1: "0x0642026e7f0b6ccac5925b4e7fa61384250e1701",
+    137: "0xa1d2c3b4e5f60718293a4b5c6d7e8f9012345678",
+}
+RATES = {"OCEAN": 0.5, "H2O": 1.6}
+
+
+@enforce_types
+def synthetic_world(
+    n_LPs: int, n_assets: int, allocs_per_LP: float = 5.0, seed: int = 0
+) -> dict:
+    """
+    @description
+      Make inputs for RewardCalculator, with realistic skew: a few assets
+      get most of the volume and allocations, and veOCEAN balances are
+      lognormal. Assets are spread across 2 chains; ~80% trade in OCEAN,
+      the rest in H2O. About half of the assets are owned by an LP.
+
+    @arguments
+      n_LPs -- # LPs
+      n_assets -- # nfts
+      allocs_per_LP -- mean # nfts that each LP allocates to
+      seed -- for the rng. Same seed, same world
+
+    @return
+      world -- dict with keys stakes, locked_amts, nftvols, owners, symbols,
+        rates. Values are as RewardCalculator takes them
+    """
+    rng = np.random.default_rng(seed)
+    LP_addrs = [f"0x{0xB << 156 | i:040x}" for i in range(n_LPs)]
+    nft_addrs = [f"0x{0xA << 156 | j:040x}" for j in range(n_assets)]
+    chain_of_j = [CHAINIDS[j % len(CHAINIDS)] for j in range(n_assets)]
+
+    # popularity: zipf-like, shuffled so that it's not in address order
+    popularity = 1.0 / np.arange(1, n_assets + 1)
+    rng.shuffle(popularity)
+    popularity /= np.sum(popularity)
+
+    # allocations: each LP picks nfts by popularity
+    n_allocs = np.minimum(1 + rng.poisson(allocs_per_LP - 1.0, n_LPs), n_assets)
+    picks = rng.choice(n_assets, size=int(np.sum(n_allocs)), p=popularity)
+    vebals = rng.lognormal(mean=7.0, sigma=2.0, size=n_LPs)
+
+    stakes: dict = {chainID: {} for chainID in CHAINIDS}
+    locked_amts: dict = {chainID: {} for chainID in CHAINIDS}
+    start = 0
+    for i, n in enumerate(n_allocs.tolist()):
+        js = set(picks[start : start + n].tolist())
+        start += n
+        for j in js:
+            stake = float(vebals[i]) / len(js)
+            nft_stakes = stakes[chain_of_j[j]].setdefault(nft_addrs[j], {})
+            nft_stakes[LP_addrs[i]] = stake
+            nft_locked = locked_amts[chain_of_j[j]].setdefault(nft_addrs[j], {})
+            nft_locked[LP_addrs[i]] = stake * 0.6
+
+    # volumes: follow popularity, with noise. All > 0
+    vols = popularity * rng.lognormal(mean=0.0, sigma=1.0, size=n_assets) * 1e7
+    is_H2O = rng.random(n_assets) < 0.2
+    nftvols: dict = {
+        chainID: {OCEAN_ADDRS[chainID]: {}, H2O_ADDRS[chainID]: {}}
+        for chainID in CHAINIDS
+    }
+    owners: dict = {chainID: {} for chainID in CHAINIDS}
+    for j, nft_addr in enumerate(nft_addrs):
+        chainID = chain_of_j[j]
+        basetoken = H2O_ADDRS[chainID] if is_H2O[j] else OCEAN_ADDRS[chainID]
+        nftvols[chainID][basetoken][nft_addr] = float(vols[j]) + 1.0
+        if j % 2 == 0:
+            owners[chainID][nft_addr] = LP_addrs[int(rng.integers(n_LPs))]
+        else:
+            owners[chainID][nft_addr] = f"0x{0xC << 156 | j:040x}"
+
+    symbols = {
+        chainID: {OCEAN_ADDRS[chainID]: "OCEAN", H2O_ADDRS[chainID]: "H2O"}
+        for chainID in CHAINIDS
+    }
+    return {
+        "stakes": stakes,
+        "locked_amts": locked_amts,
+        "nftvols": nftvols,
+        "owners": owners,
+        "symbols": symbols,
+        "rates": dict(RATES),
+    }
+
+
+@enforce_types
+def bench_scale(n_LPs: int, n_assets: int, seed: int = 0) -> dict:
+    """
+    @description
+      Time each stage of a RewardCalculator calculate() on a synthetic
+      world, in this process.
+
+    @return
+      result -- dict with keys:
+        n_LPs, n_assets, n_stakes, seed
+        stages -- dict of [stage] : secs. See STAGES. "total" is all of
+          calculate(), incl. the parts not in a stage
+        peak_rss_MB -- peak resident memory of this process so far
+        world_rss_MB -- resident memory once the world was made
+        total_OCEAN -- sum of rewards. Should match across commits
+    """
+    # (scipy.stats is imported above: rank.py only loads it on 1st use,
+    # which would add ~1s to rank_based_allocate's time)
+    world = synthetic_world(n_LPs, n_assets, seed=seed)
+    world_rss_MB = _peak_rss_MB()
+    stages: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+
+    # time the stages in place, by wrapping the functions that do them
+    targets = [
+        (cleancase, "mod_nft_vols", "cleancase"),
+        (cleancase, "mod_owners", "cleancase"),
+        (cleancase, "mod_symbols", "cleancase"),
+        (cleancase, "mod_rates", "cleancase"),
+        (reward_calculator, "_stakes_table", "cleancase"),
+        (reward_calculator, "nft_vols_to_usd", "nft_vols_to_usd"),
+        (reward_calculator, "rank_based_allocate", "rank_based_allocate"),
+        (RewardCalculator, "calculate_arrays", "matrix_build"),
+        (RewardCalculator, "calc_rewards__usd", "calc_rewards__usd"),
+        (RewardCalculator, "_reward_array_to_dicts", "dict_export"),
+    ]
+    with ExitStack() as stack:
+        for obj, name, stage in targets:
+            timed = _timed(getattr(obj, name), stage, stages)
+            stack.enter_context(patch.object(obj, name, timed))
+        # offline: no predictoor feeds
+        stack.enter_context(
+            patch.object(
+                reward_calculator, "query_predictoor_contracts", return_value={}
+            )
+        )
+
+        t0 = time.perf_counter()
+        calculator = RewardCalculator(
+            world["stakes"],
+            world["locked_amts"],
+            world["nftvols"],
+            world["owners"],
+            world["symbols"],
+            world["rates"],
+            60,
+            1e5,
+            True,
+            True,
+        )
+        rewardsperlp, _ = calculator.calculate()
+        total = time.perf_counter() - t0
+
+    # rank_based_allocate runs inside calc_rewards__usd; count it once
+    stages["calc_rewards__usd"] -= stages["rank_based_allocate"]
+    stages["total"] = total
+
+    return {
+        "n_LPs": n_LPs,
+        "n_assets": n_assets,
+        "n_stakes": int(calculator.S.nnz),
+        "seed": seed,
+        "stages": stages,
+        "peak_rss_MB": _peak_rss_MB(),
+        "world_rss_MB": world_rss_MB,
+        "total_OCEAN": sum(sum(r.values()) for r in rewardsperlp.values()),
+    }
+
+
+@enforce_types
+def bench_reward_calculator(scales: List[str], seed: int = 0) -> dict:
+    """
+    @description
+      Run bench_scale() for each scale, each in a fresh process.
+
+    @arguments
+      scales -- names of scales; see SCALES
+
+    @return
+      report -- dict with keys commit, python, numpy, results -- list of
+        bench_scale() results, each with its "scale" name too
+    """
+    results = []
+    for scale in scales:
+        n_LPs, n_assets = SCALES[scale]
+        cmd = [sys.executable, "-m", "df_py.volume.reward_bench", "--child"]
+        cmd += [str(n_LPs), str(n_assets), "--seed", str(seed)]
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True)
+        result = json.loads(out.stdout.splitlines()[-1])
+        results.append({"scale": scale, **result})
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+
+
+@enforce_types
+def report_table(report: dict, baseline: Optional[dict] = None) -> str:
+    """
+    @arguments
+      report -- from bench_reward_calculator()
+      baseline -- an earlier report. If given, also show each time as a
+        ratio of the baseline's time at the same scale: > 1.0 is slower
+
+    @return
+      table -- one line per scale, one column per stage, in secs
+    """
+    columns = STAGES + ["total", "peak_MB"]
+    base_results = {r["scale"]: r for r in (baseline or {}).get("results", [])}
+    lines = [f"{'scale':>8} " + " ".join(f"{c[:13]:>13}" for c in columns)]
+    for r in report["results"]:
+        values = [r["stages"][stage] for stage in STAGES + ["total"]]
+        values.append(r["peak_rss_MB"])
+        lines.append(f"{r['scale']:>8} " + " ".join(f"{v:>13.3f}" for v in values))
+
+        base = base_results.get(r["scale"])
+        if base is not None:
+            base_values = [base["stages"][stage] for stage in STAGES + ["total"]]
+            base_values.append(base["peak_rss_MB"])
+            ratios = [v / max(b, 1e-9) for v, b in zip(values, base_values)]
+            lines.append(f"{'vs base':>8} " + " ".join(f"{x:>12.2f}x" for x in ratios))
+    return "\n".join(lines)
+
+
+# ========================================================================
+# helpers
+
+
+def _timed(func, stage: str, stages: Dict[str, float]):
+    """Wrap func, to add the time of each call to stages[stage]"""
+
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stages[stage] += time.perf_counter() - t0
+
+    return wrapper
+
+
+def _peak_rss_MB() -> float:
+    """Peak resident memory of this process. (ru_maxrss is in KB on linux)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # bytes on macOS
+        rss /= 1024
+    return rss / 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales",
+        default="tiny,small,medium",
+        help=f"comma-separated, of: {','.join(SCALES)}",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the report here, as JSON")
+    parser.add_argument("--compare", help="JSON report of an earlier run")
+    parser.add_argument("--child", nargs=2, type=int, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.child:
+        n_LPs, n_assets = arguments.child
+        print(json.dumps(bench_scale(n_LPs, n_assets, arguments.seed)))
+        return
+
+    scales = arguments.scales.split(",")
+    for scale in scales:
+        if scale not in SCALES:
+            parser.error(f"unknown scale {scale}. Choose from {list(SCALES)}")
+    report = bench_reward_calculator(scales, arguments.seed)
+
+    baseline = None
+    if arguments.compare:
+        with open(arguments.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(report_table(report, baseline))
+
+    if arguments.out:
+        with open(arguments.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Created {arguments.out}")
+
+
+if __name__ == "__main__":
+    _main()
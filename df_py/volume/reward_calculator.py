@@ -1,12 +1,15 @@
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 from enforce_typing import enforce_types
+from scipy import sparse
 
 from df_py.predictoor.queries import query_predictoor_contracts
 from df_py.util.constants import DEPLOYER_ADDRS, TARGET_WPY
 from df_py.util.dcv_multiplier import calc_dcv_multiplier
 from df_py.volume import cleancase as cc
+from df_py.volume import columnar
+from df_py.volume.columnar import NO_KEY
 from df_py.volume.rank import rank_based_allocate
 from df_py.volume.to_usd import nft_vols_to_usd
 
@@ -33,8 +36,10 @@ class RewardCalculator:
 
     def __init__(
         self,
-        stakes: Dict[int, Dict[str, Dict[str, float]]],
-        locked_ocean_amts: Dict[int, Dict[str, Dict[str, float]]],
+        stakes: Union[Dict[int, Dict[str, Dict[str, float]]], columnar.Table],
+        locked_ocean_amts: Union[
+            Dict[int, Dict[str, Dict[str, float]]], columnar.Table
+        ],
         nftvols: Dict[int, Dict[str, Dict[str, float]]],
         owners: Dict[int, Dict[str, str]],
         symbols: Dict[int, Dict[str, str]],
@@ -43,11 +48,15 @@ class RewardCalculator:
         OCEAN_avail: float,
         do_pubrewards: bool,
         do_rank: bool,
+        *,
+        predictoor_feed_addrs: Optional[dict] = None,
     ):
         """
         @arguments
           stakes - dict of [chainID][nft_addr][LP_addr] : veOCEAN_float
+            -- or the same as a columnar.Table, eg from load_stakes_tables()
           locked_ocean_amts: dict of [chainID][nft_addr][LP_addr] : OCEAN amount
+            -- or the same as a columnar.Table
           nftvols -- dict of [chainID][basetoken_addr][nft_addr] : consume_vol_float
           owners -- dict of [chainID][nft_addr] : owner_addr
           symbols -- dict of [chainID][basetoken_addr] : basetoken_symbol_str
@@ -56,11 +65,15 @@ class RewardCalculator:
           OCEAN_avail -- amount of rewards avail, in units of OCEAN
           do_pubrewards -- 2x effective stake to publishers?
           do_rank -- allocate OCEAN to assets by DCV rank, vs pro-rata
+          predictoor_feed_addrs -- dict of [chainID] : list of nft_addrs of
+            predictoor feeds, eg from a past week's predictoor_contracts.csv.
+            If None, query the feeds of today
         """
         self._freeze_attributes = False
 
-        self.stakes = cc.mod_stakes(stakes)
-        self.locked_ocean_amts = cc.mod_stakes(locked_ocean_amts)
+        # S and L get built from the tables, without going back to dicts
+        self.stakes_table = _stakes_table(stakes)
+        self.locked_ocean_amts_table = _stakes_table(locked_ocean_amts)
         self.nftvols = cc.mod_nft_vols(nftvols)
         self.owners = cc.mod_owners(owners)
         self.symbols = cc.mod_symbols(symbols)
@@ -76,14 +89,16 @@ class RewardCalculator:
         self.do_pubrewards = do_pubrewards
         self.do_rank = do_rank
 
-        self.predictoor_feed_addrs = self._get_predictoor_feed_addrs()
+        self.predictoor_feed_addrs = self._get_predictoor_feed_addrs(
+            predictoor_feed_addrs
+        )
 
         # will be filled in by calculate()
-        self.S: np.ndarray
+        self.S: sparse.csc_matrix
         self.V_USD: np.ndarray
         self.M: np.ndarray
-        self.R: np.ndarray
-        self.L: np.ndarray
+        self.R: sparse.csr_matrix
+        self.L: sparse.csc_matrix
 
         self.C: np.ndarray
 
@@ -96,43 +111,87 @@ class RewardCalculator:
           In the return dicts, chainID is the chain of the nft, not the
           chain where rewards go.
         """
+        self._calculate_R()
+
+        rewardsperlp, rewardsinfo = self._reward_array_to_dicts()
+
+        return rewardsperlp, rewardsinfo
+
+    @enforce_types
+    def calculate_rows(self) -> Tuple[Iterator[tuple], Iterator[tuple]]:
+        """
+        @description
+          Like calculate(), but give rewards as rows rather than nested dicts.
+          For streaming into csvs.save_volume_rewards_csv_rows() etc.
+
+        @return
+          rewardsperlp_rows -- iterator of (chainID, LP_addr, OCEAN_reward)
+          rewardsinfo_rows -- iterator of
+            (chainID, nft_addr, LP_addr, OCEAN_reward)
+
+        @notes
+          Rows come in the order that calculate()'s dicts iterate in.
+        """
+        self._calculate_R()
+
+        return self._rewardsperlp_rows(), self._rewardsinfo_rows()
+
+    def calculate_arrays(self):
+        """
+        @description
+          Fill in S, V_USD, M, C and L, but don't compute rewards.
+          Eg so that a parameter sweep can reuse them (see sweep.py)
+        """
         self._freeze_attributes = False
 
         self.S, self.V_USD, self.M, self.C, self.L = (
             self._stake_vol_owner_dicts_to_arrays()
         )
-        self.R = self.calc_rewards__usd()
 
         self._freeze_attributes = True
 
-        (rewardsperlp, rewardsinfo) = self._reward_array_to_dicts()
+    def _calculate_R(self):
+        self.calculate_arrays()
 
-        return rewardsperlp, rewardsinfo
+        self._freeze_attributes = False
+
+        self.R = self.calc_rewards__usd()
+
+        self._freeze_attributes = True
 
     @freeze_attributes
     @enforce_types
     def _stake_vol_owner_dicts_to_arrays(
         self,
-    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    ) -> Tuple[
+        sparse.csc_matrix, np.ndarray, np.ndarray, np.ndarray, sparse.csc_matrix
+    ]:
         """
         @return
-          S -- 2d array of [LP i, chain_nft j] -- stake for each {i,j}, in veOCEAN
+          S -- 2d sparse array of [LP i, chain_nft j] -- stake for each {i,j},
+            in veOCEAN
           V_USD -- 1d array of [chain_nft j] -- nftvol for each {j}, in USD
+          M -- 1d array of [chain_nft j] -- DCV multiplier for each {j}
+          C -- 1d array of [chain_nft j] -- LP index i of nft's owner, or -1
+          L -- 2d sparse array of [LP i, chain_nft j] -- locked OCEAN for each
+            {i,j}
+
+        @notes
+          S and L are CSC, holding just the nonzero entries: most LPs
+          allocate to only a few nfts, so dense arrays would be nearly all 0s.
         """
         N_j = len(self.chain_nft_tups)
         N_i = len(self.LP_addrs)
 
         M = np.zeros(N_j, dtype=float)
-        S = np.zeros((N_i, N_j), dtype=float)
         V_USD = np.zeros(N_j, dtype=float)
         C = np.zeros(N_j, dtype=int)
-        L = np.zeros((N_i, N_j), dtype=float)
+
+        # [LP_addr] : i, and [(chainID, nft_addr)] : j
+        LP_index = {LP_addr: i for i, LP_addr in enumerate(self.LP_addrs)}
+        chain_nft_index = {tup: j for j, tup in enumerate(self.chain_nft_tups)}
 
         for j, (chainID, nft_addr) in enumerate(self.chain_nft_tups):
-            for i, LP_addr in enumerate(self.LP_addrs):
-                assert nft_addr in self.stakes[chainID], "each tup should be in stakes"
-                S[i, j] = self.stakes[chainID][nft_addr].get(LP_addr, 0.0)
-                L[i, j] = self.locked_ocean_amts[chainID][nft_addr].get(LP_addr, 0.0)
             V_USD[j] += self.nftvols_USD[chainID].get(nft_addr, 0.0)
 
             M[j] = calc_dcv_multiplier(
@@ -140,85 +199,77 @@ class RewardCalculator:
             )
 
             owner_addr = self.owners[chainID][nft_addr]
-            C[j] = (
-                -1
-                if owner_addr not in self.LP_addrs
-                else self.LP_addrs.index(owner_addr)
-            )
+            C[j] = LP_index.get(owner_addr, -1)
 
+        # visit only the allocations there are, not all (LP, nft) pairs
+        S = _table_to_csc(self.stakes_table, LP_index, chain_nft_index, N_i)
+        L = _table_to_csc(self.locked_ocean_amts_table, LP_index, chain_nft_index, N_i)
         return S, V_USD, M, C, L
 
     @freeze_attributes
     @enforce_types
-    def calc_rewards__usd(self) -> np.ndarray:
+    def calc_rewards__usd(self) -> sparse.csr_matrix:
         """
         @return
-          R -- 2d array of [LP i, chain_nft j] -- rewards denominated in OCEAN
+          R -- 2d sparse array of [LP i, chain_nft j] -- rewards denominated
+            in OCEAN
+
+        @notes
+          Only entries with stake can get rewards, so this computes just
+          the entries stored in S. See calc_rewards_at_entries().
         """
         N_i, N_j = self.S.shape
 
         # corner case
         if np.sum(self.V_USD) == 0.0:
-            return np.zeros((N_i, N_j), dtype=float)
-
-        S = np.copy(self.S)
-        L = np.copy(self.L)
-        # modify S's: owners get rewarded as if 2x stake on their asset
-        if self.do_pubrewards:
-            for j in range(N_j):
-                if self.C[j] != -1:  # -1 = owner didn't stake
-                    S[self.C[j], j] *= 2.0
+            return sparse.csr_matrix((N_i, N_j), dtype=float)
+
+        S = self.S
+
+        # locked OCEAN at each entry of S
+        L = values_at_entries(self.L, S)
+
         # perc_per_j
         if self.do_rank:
             perc_per_j = rank_based_allocate(self.V_USD)
         else:
             perc_per_j = self.V_USD / np.sum(self.V_USD)
 
-        # compute rewards
-        R = np.zeros((N_i, N_j), dtype=float)
-        for j in range(N_j):
-            stake_j = sum(S[:, j])
-            multiplier = self.M[j]
-            DCV_OCEAN_j = self.V_USD[j] / self.rates["OCEAN"]
-            if stake_j == 0.0 or DCV_OCEAN_j == 0.0:
-                continue
-
-            for i in range(N_i):
-                perc_at_j = perc_per_j[j]
-
-                stake_ij = S[i, j]
-                perc_at_ij = stake_ij / stake_j
-
-                ocean_locked_ij = L[i, j]
-
-                # main formula!
-                # reward amount in OCEAN
-                R[i, j] = min(
-                    perc_at_j * perc_at_ij * self.OCEAN_avail,
-                    ocean_locked_ij * TARGET_WPY,  # bound rewards by max APY
-                    DCV_OCEAN_j * perc_at_ij * multiplier,  # bound rewards by DCV
-                )
+        # compute rewards, at the entries of S
+        R_data = calc_rewards_at_entries(
+            S,
+            L,
+            self.C if self.do_pubrewards else None,
+            perc_per_j,
+            self.V_USD / self.rates["OCEAN"],
+            self.M,
+            self.OCEAN_avail,
+        )
+        R = sparse.csc_matrix(
+            (R_data, S.indices.copy(), S.indptr.copy()), shape=(N_i, N_j)
+        )
 
         # filter negligible values
-        R[R < 0.000001] = 0.0
+        R.data[R.data < 0.000001] = 0.0
+        R.eliminate_zeros()
 
-        if np.sum(R) == 0.0:
-            return np.zeros((N_i, N_j), dtype=float)
+        if R.nnz == 0:
+            return sparse.csr_matrix((N_i, N_j), dtype=float)
 
         # postcondition: nans
-        assert not np.isnan(np.min(R)), R
+        assert not np.isnan(np.min(R.data)), R
 
         # postcondition: sum is ok. First check within a tol; shrink if needed
-        sum1 = np.sum(R)
+        sum1 = np.sum(R.data)
         tol = 1e-13
         assert sum1 <= self.OCEAN_avail * (1 + tol), (sum1, self.OCEAN_avail, R)
 
         if sum1 > self.OCEAN_avail:
-            R /= 1 + tol
-        sum2 = np.sum(R)
+            R.data /= 1 + tol
+        sum2 = np.sum(R.data)
         assert sum1 <= self.OCEAN_avail * (1 + tol), (sum2, self.OCEAN_avail, R)
 
-        return R
+        return R.tocsr()
 
     @freeze_attributes
     @enforce_types
@@ -233,27 +284,95 @@ class RewardCalculator:
           chain where rewards go.
         """
         rewardsperlp: dict = {}
+        for chainID, LP_addr, reward in self._rewardsperlp_rows():
+            if chainID not in rewardsperlp:
+                rewardsperlp[chainID] = {}
+            rewardsperlp[chainID][LP_addr] = reward
+
         rewardsinfo: dict = {}
+        for chainID, nft_addr, LP_addr, reward in self._rewardsinfo_rows():
+            if chainID not in rewardsinfo:
+                rewardsinfo[chainID] = {}
+            if nft_addr not in rewardsinfo[chainID]:
+                rewardsinfo[chainID][nft_addr] = {}
+            rewardsinfo[chainID][nft_addr][LP_addr] = reward
 
-        for i, LP_addr in enumerate(self.LP_addrs):
-            for j, (chainID, nft_addr) in enumerate(self.chain_nft_tups):
-                assert self.R[i, j] >= 0.0, self.R[i, j]
-                if self.R[i, j] == 0.0:
-                    continue
+        return rewardsperlp, rewardsinfo
 
-                if chainID not in rewardsperlp:
-                    rewardsperlp[chainID] = {}
-                if LP_addr not in rewardsperlp[chainID]:
-                    rewardsperlp[chainID][LP_addr] = 0.0
-                rewardsperlp[chainID][LP_addr] += self.R[i, j]
+    @freeze_attributes
+    @enforce_types
+    def _rewardsperlp_rows(self) -> Iterator[Tuple[int, str, float]]:
+        """
+        @return
+          rows -- iterator of (chainID, LP_addr, OCEAN_reward_float): each
+            LP's rewards summed over the nfts of a chain. By chain, then LP
+        """
+        i, j, R_ij, chain_rank = self._nonzero_rewards()
+        if len(R_ij) == 0:
+            return
+
+        # group entries by (chain, LP); within a group, by nft
+        order = np.lexsort((j, i, chain_rank))
+        chain_rank, i = chain_rank[order], i[order]
+        new_group = (np.diff(chain_rank) != 0) | (np.diff(i) != 0)
+        starts = np.flatnonzero(np.concatenate(([True], new_group)))
+        counts = np.diff(np.append(starts, len(order)))
+        sums = _sequential_sums(R_ij[order], starts, counts)
+
+        LP_is, js = i[starts].tolist(), j[order[starts]].tolist()
+        for LP_i, j_, reward in zip(LP_is, js, sums):
+            yield self.chain_nft_tups[j_][0], self.LP_addrs[LP_i], reward
 
-                if chainID not in rewardsinfo:
-                    rewardsinfo[chainID] = {}
-                if nft_addr not in rewardsinfo[chainID]:
-                    rewardsinfo[chainID][nft_addr] = {}
-                rewardsinfo[chainID][nft_addr][LP_addr] = self.R[i, j]
+    @freeze_attributes
+    @enforce_types
+    def _rewardsinfo_rows(self) -> Iterator[Tuple[int, str, str, float]]:
+        """
+        @return
+          rows -- iterator of (chainID, nft_addr, LP_addr, OCEAN_reward_float)
+            for each nonzero reward. By chain, then nft, then LP
+        """
+        i, j, R_ij, chain_rank = self._nonzero_rewards()
 
-        return rewardsperlp, rewardsinfo
+        # nfts in order of first appearance, like dict keys. Entries are
+        # row-major, so a column's first entry is where it first appears
+        uniq_j, first = np.unique(j, return_index=True)
+        nft_rank = first[np.searchsorted(uniq_j, j)]
+        order = np.lexsort((i, nft_rank, chain_rank))
+
+        for k in order.tolist():
+            chainID, nft_addr = self.chain_nft_tups[j[k]]
+            yield chainID, nft_addr, self.LP_addrs[i[k]], R_ij[k]
+
+    @freeze_attributes
+    @enforce_types
+    def _nonzero_rewards(
+        self,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        @return
+          i -- 1d array -- LP index of each nonzero entry of R
+          j -- 1d array -- chain_nft index of each
+          R_ij -- 1d array -- value of each
+          chain_rank -- 1d array -- for each, its chain's rank in order of
+            first appearance, like dict keys
+
+        @notes
+          Entries are in row-major order, the order of a dense R's cells.
+        """
+        A = self.R.tocoo()  # R is CSR, so row-major
+        assert (A.data >= 0.0).all(), A.data.min()
+        nonzero = np.flatnonzero(A.data)
+        i, j, R_ij = A.row[nonzero], A.col[nonzero], A.data[nonzero]
+
+        chain_of_j = np.array(
+            [chainID for chainID, _ in self.chain_nft_tups], dtype=int
+        )
+        chains = chain_of_j[j]
+        uniq_chains, first = np.unique(chains, return_index=True)
+        rank_of_uniq = np.argsort(np.argsort(first))
+        chain_rank = rank_of_uniq[np.searchsorted(uniq_chains, chains)]
+
+        return i, j, R_ij, chain_rank
 
     @freeze_attributes
     @enforce_types
@@ -262,16 +381,37 @@ class RewardCalculator:
         @return
           chain_nft_tups -- list of (chainID, nft_addr), indexed by j
         """
-        chainIDs = list(self.stakes.keys())
+        rows, strs = self.stakes_table.rows, self.stakes_table.strs
+        has_nft = rows["nft_addr"] != NO_KEY  # else a chain without nfts
+        staked = set(
+            zip(
+                rows["chainID"][has_nft].tolist(),
+                strs[rows["nft_addr"][has_nft]].tolist(),
+            )
+        )
+
+        chainIDs = self._get_chainIDs()
         nft_addrs = self._get_nft_addrs()
         chain_nft_tups = [
             (chainID, nft_addr)  # all (chain, nft) tups with stake
             for chainID in chainIDs
             for nft_addr in nft_addrs
-            if nft_addr in self.stakes[chainID]
+            if (chainID, nft_addr) in staked
         ]
         return chain_nft_tups
 
+    @freeze_attributes
+    @enforce_types
+    def _get_chainIDs(self) -> List[int]:
+        """
+        @return
+          chainIDs -- list of chainIDs in stakes, in order of first appearance
+        """
+        chainIDs, first = np.unique(
+            self.stakes_table.rows["chainID"], return_index=True
+        )
+        return chainIDs[np.argsort(first)].tolist()
+
     @freeze_attributes
     @enforce_types
     def _get_nft_addrs(self) -> List[str]:
@@ -293,18 +433,20 @@ class RewardCalculator:
         @return
           LP_addrs -- list of unique LP addrs. Order is consistent.
         """
-        LP_addrs = set()
-        for chainID in self.stakes:
-            for nft_addr in self.stakes[chainID]:
-                for LP_addr in self.stakes[chainID][nft_addr]:
-                    LP_addrs.add(LP_addr)
-
-        return sorted(LP_addrs)
+        codes = np.unique(self.stakes_table.rows["LP_addr"])
+        codes = codes[codes != NO_KEY]  # NO_KEY = an nft without LPs
+        return sorted(self.stakes_table.strs[codes].tolist())
 
     @freeze_attributes
     @enforce_types
-    def _get_predictoor_feed_addrs(self) -> Dict[int, List[str]]:
+    def _get_predictoor_feed_addrs(
+        self, feed_addrs: Optional[dict] = None
+    ) -> Dict[int, List[str]]:
         """
+        @arguments
+          feed_addrs -- dict of [chainID] : list of nft_addrs, to use rather
+            than querying. None = query
+
         @return
           predictoor_feed_addrs -- dict of (chainID, list of nft_addrs)
 
@@ -312,14 +454,210 @@ class RewardCalculator:
           This will only return the prediction feeds that are owned by
           DEPLOYER_ADDRS, due to functionality of query_predictoor_contracts().
         """
-        chainIDs = list(self.stakes.keys())
+        chainIDs = self._get_chainIDs()
         predictoor_feed_addrs: Dict[int, List[str]] = {
             chain_id: [] for chain_id in chainIDs
         }
 
+        if feed_addrs is not None:
+            for chain_id, addrs in feed_addrs.items():
+                predictoor_feed_addrs[chain_id] = list(addrs)
+            return predictoor_feed_addrs
+
         for chain_id in DEPLOYER_ADDRS:
             predictoor_feed_addrs[chain_id] = query_predictoor_contracts(
                 chain_id
             ).keys()
 
         return predictoor_feed_addrs
+
+
+# The kernels take the rewards formula's arrays positionally, in the
+# order that the formula uses them
+@enforce_types
+def calc_rewards_at_entries(  # pylint: disable=too-many-positional-arguments
+    S: sparse.csc_matrix,
+    L: np.ndarray,
+    C: Optional[np.ndarray],
+    perc_per_j: np.ndarray,
+    DCV_OCEAN: np.ndarray,
+    M: np.ndarray,
+    OCEAN_avail: float,
+) -> np.ndarray:
+    """
+    @description
+      The rewards formula, as array ops over all entries of S at once.
+
+    @arguments
+      S -- 2d sparse array of [LP i, chain_nft j] -- stake, in veOCEAN
+      L -- 1d array -- locked OCEAN at each entry of S (aligned to S.data)
+      C -- 1d array of [chain_nft j] -- LP index i of nft's owner, or -1.
+        If given, owners get rewarded as if 2x stake on their asset
+      perc_per_j -- 1d array of [chain_nft j] -- share of OCEAN_avail
+      DCV_OCEAN -- 1d array of [chain_nft j] -- nftvol, in OCEAN
+      M -- 1d array of [chain_nft j] -- DCV multiplier
+      OCEAN_avail -- amount of rewards avail, in units of OCEAN
+
+    @return
+      R -- 1d array -- reward at each entry of S (aligned to S.data), in OCEAN
+
+    @notes
+      Bit-identical to the dense loop over all [LP i, chain_nft j] that it
+      replaces: same float ops on the same values, in the same order.
+    """
+    R = calc_rewards_at_entries_batch(
+        S,
+        L,
+        C,
+        perc_per_j[np.newaxis, :],
+        DCV_OCEAN,
+        M,
+        OCEAN_avail,
+        np.array([TARGET_WPY]),
+    )
+    return R[0, 0]
+
+
+# arguments: like calc_rewards_at_entries(), plus target_wpys
+@enforce_types
+def calc_rewards_at_entries_batch(  # pylint: disable=too-many-positional-arguments
+    S: sparse.csc_matrix,
+    L: np.ndarray,
+    C: Optional[np.ndarray],
+    perc_per_j: np.ndarray,
+    DCV_OCEAN: np.ndarray,
+    M: np.ndarray,
+    OCEAN_avail: float,
+    target_wpys: np.ndarray,
+) -> np.ndarray:
+    """
+    @description
+      calc_rewards_at_entries(), for many sets of parameters in one go.
+      E.g. for a parameter sweep
+
+    @arguments
+      perc_per_j -- 2d array of [set p, chain_nft j] -- share of OCEAN_avail
+      target_wpys -- 1d array of [set w] -- Weekly Percent Yield, for the
+        APY bound
+      (others) -- like calc_rewards_at_entries()
+
+    @return
+      R -- 3d array of [set p, set w, entry of S] -- rewards, in OCEAN
+    """
+    N_j = S.shape[1]
+    n_per_j = np.diff(S.indptr)
+    cols = np.repeat(np.arange(N_j), n_per_j)  # j of each entry
+
+    stakes = S.data.astype(float)  # copy
+    if C is not None:
+        # owner's entry is the one in row C[j]. C[j] = -1 matches no row
+        stakes[S.indices == C[cols]] *= 2.0
+
+    # stake_j = sum of column j, added in row order like sum() does
+    stake = _sequential_sums(stakes, S.indptr[:-1], n_per_j)
+
+    ok = ((stake != 0.0) & (DCV_OCEAN != 0.0))[cols]
+    perc_at_ij = np.zeros(S.nnz, dtype=float)
+    np.divide(stakes, stake[cols], out=perc_at_ij, where=ok)
+
+    # main formula! Reward amount in OCEAN, as min() of three terms
+    with np.errstate(invalid="ignore"):  # inf multiplier x 0 stake
+        R_by_vol = perc_per_j[:, cols] * perc_at_ij * OCEAN_avail  # [p, entry]
+        R_by_APY = L * target_wpys[:, np.newaxis]  # [w, entry]; bound by max APY
+        R_by_DCV = DCV_OCEAN[cols] * perc_at_ij * M[cols]  # bound by DCV
+
+    # like min(a, b, c): take a later term only if it's strictly smaller
+    R_by_vol = R_by_vol[:, np.newaxis, :]
+    R_by_APY = R_by_APY[np.newaxis, :, :]
+    R = np.where(R_by_APY < R_by_vol, R_by_APY, R_by_vol)
+    R = np.where(R_by_DCV < R, R_by_DCV, R)
+    R[:, :, ~ok] = 0.0
+    return R
+
+
+@enforce_types
+def values_at_entries(A: sparse.csc_matrix, S: sparse.csc_matrix) -> np.ndarray:
+    """
+    @return
+      values -- 1d array -- A's value at each entry stored in S (aligned to
+        S.data); 0.0 where A has none
+    """
+    values = np.zeros(S.nnz, dtype=float)
+    if S.nnz > 0:
+        cols = np.repeat(np.arange(S.shape[1]), np.diff(S.indptr))
+        values[:] = np.asarray(A[S.indices, cols]).ravel()
+    return values
+
+
+def _sequential_sums(
+    values: np.ndarray, starts: np.ndarray, counts: np.ndarray
+) -> np.ndarray:
+    """
+    @description
+      Sum of each segment values[starts[s] : starts[s] + counts[s]], adding
+      left to right like sum() does. np.add.reduceat sums pairwise, which
+      rounds differently. So add the k'th value of all segments at once,
+      for k = 0, 1, ..
+    """
+    sums = np.zeros(len(starts), dtype=float)
+    for k in range(int(counts.max(initial=0))):
+        segments = np.flatnonzero(counts > k)
+        sums[segments] += values[starts[segments] + k]
+    return sums
+
+
+@enforce_types
+def _stakes_table(stakes: Union[dict, columnar.Table]) -> columnar.Table:
+    """Stakes as a normalized & validated Table"""
+    if isinstance(stakes, columnar.Table):
+        assert stakes.rows.dtype == columnar.STAKES_DTYPE, stakes.rows.dtype
+        return stakes
+    return columnar.stakes_from_dict(stakes)
+
+
+@enforce_types
+def _table_to_csc(
+    table: columnar.Table, LP_index: dict, chain_nft_index: dict, N_i: int
+) -> sparse.csc_matrix:
+    """
+    @description
+      Sparse matrix of [LP i, chain_nft j] from a stakes-like Table. Leaves
+      out 0s, and rows whose LP or (chainID, nft) has no index
+
+    @arguments
+      table -- rows of (chainID, nft_addr, LP_addr, value)
+      LP_index -- dict of [LP_addr] : i
+      chain_nft_index -- dict of [(chainID, nft_addr)] : j
+    """
+    rows = table.rows
+    strs = table.strs.tolist()
+
+    # map each distinct LP just once. NO_KEY picks the last
+    i_of_code = np.array([LP_index.get(s, -1) for s in strs] + [-1], dtype=int)
+    i = i_of_code[rows["LP_addr"]]
+
+    # rows of the same (chainID, nft) come in runs, like the dict's items
+    is_start = np.ones(len(rows), dtype=bool)
+    is_start[1:] = (rows["chainID"][1:] != rows["chainID"][:-1]) | (
+        rows["nft_addr"][1:] != rows["nft_addr"][:-1]
+    )
+    starts = np.flatnonzero(is_start)
+    run_of_row = np.cumsum(is_start) - 1
+    j_of_run = np.array(
+        [
+            chain_nft_index.get((chainID, strs[code] if code != NO_KEY else ""), -1)
+            for chainID, code in zip(
+                rows["chainID"][starts].tolist(), rows["nft_addr"][starts].tolist()
+            )
+        ],
+        dtype=int,
+    )
+    j = j_of_run[run_of_row]
+
+    values = rows["stake"]
+    keep = (i != -1) & (j != -1) & (values != 0.0)
+    return sparse.csc_matrix(
+        (values[keep], (i[keep], j[keep])),
+        shape=(N_i, len(chain_nft_index)),
+        dtype=float,
+    )
@@ -0,0 +1,224 @@
+"""Sweep volume-reward parameters, without rebuilding the reward matrices.
+
+Usage: build a RewardCalculator as for `dftool calc`, then call
+sweep_volume_rewards() with the values to try for each parameter.
+"""
+
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from enforce_typing import enforce_types
+from scipy import sparse
+
+from df_py.util.constants import (
+    DO_PUBREWARDS,
+    MAX_N_RANK_ASSETS,
+    RANK_SCALE_OP,
+    TARGET_WPY,
+)
+from df_py.volume.rank import rank_based_allocate
+from df_py.volume.reward_calculator import (
+    RewardCalculator,
+    calc_rewards_at_entries_batch,
+    values_at_entries,
+)
+
+# cap on the size of one batch of rewards, [set p, set w, entry of S]
+MAX_BATCH_BYTES = 256 * 1024 * 1024
+
+
+@enforce_types
+def sweep_volume_rewards(
+    calculator: RewardCalculator,
+    rank_scale_ops: Optional[list] = None,
+    max_n_rank_assets: Optional[list] = None,
+    target_wpys: Optional[list] = None,
+    do_pubrewards: Optional[list] = None,
+    *,
+    top_k: int = 5,
+    n_workers: int = 1,
+) -> List[dict]:
+    """
+    @description
+      Compute volume rewards for each combination of parameter values.
+      S, L, V_USD, M and C are built just once; each batch of combinations
+      is then one vectorized pass of the rewards kernel.
+
+    @arguments
+      calculator -- RewardCalculator, as for calc_volume_rewards()
+      rank_scale_ops -- values to try for RANK_SCALE_OP
+      max_n_rank_assets -- values to try for MAX_N_RANK_ASSETS
+      target_wpys -- values to try for TARGET_WPY
+      do_pubrewards -- values to try for DO_PUBREWARDS
+      top_k -- how many of the top recipients to report, per combination
+      n_workers -- if > 1, spread batches across this many processes
+
+    @return
+      results -- list of dict, one per combination, with keys:
+        RANK_SCALE_OP, MAX_N_RANK_ASSETS, TARGET_WPY, DO_PUBREWARDS,
+        total_OCEAN, n_LPs, gini, top -- list of (LP_addr, OCEAN_reward)
+
+    @notes
+      A parameter left as None is held at its value in constants.py.
+      Assets are always allocated by rank (as with DO_RANK), else the
+      rank parameters would have no effect. Rewards per LP are summed
+      across chains.
+    """
+    rank_scale_ops = rank_scale_ops or [RANK_SCALE_OP]
+    max_n_rank_assets = max_n_rank_assets or [MAX_N_RANK_ASSETS]
+    target_wpys = target_wpys or [TARGET_WPY]
+    do_pubrewards = do_pubrewards or [DO_PUBREWARDS]
+
+    calculator.calculate_arrays()
+    S, V_USD, M, C = calculator.S, calculator.V_USD, calculator.M, calculator.C
+    L = values_at_entries(calculator.L, S)
+    DCV_OCEAN = V_USD / calculator.rates["OCEAN"]
+    OCEAN_avail = calculator.OCEAN_avail
+    wpys = np.array(target_wpys, dtype=float)
+
+    # one row of perc_per_j per (rank_scale_op, max_n_rank_assets)
+    rank_params = list(itertools.product(rank_scale_ops, max_n_rank_assets))
+    if np.sum(V_USD) == 0.0:  # corner case, like calc_rewards__usd()
+        perc_per_j = np.zeros((len(rank_params), len(V_USD)))
+    else:
+        perc_per_j = np.array(
+            [rank_based_allocate(V_USD, max_n, op) for op, max_n in rank_params]
+        ).reshape(len(rank_params), len(V_USD))
+
+    # split the rank params into batches: bounded in size, and enough
+    # batches to keep each worker busy
+    set_bytes = max(1, 8 * len(wpys) * S.nnz)
+    batch_size = max(1, min(MAX_BATCH_BYTES // set_bytes, len(rank_params)))
+    batch_size = min(batch_size, math.ceil(len(rank_params) / n_workers))
+
+    tasks = []
+    for pub in do_pubrewards:
+        for p0 in range(0, len(rank_params), batch_size):
+            args = (
+                S,
+                L,
+                C if pub else None,
+                perc_per_j[p0 : p0 + batch_size],
+                DCV_OCEAN,
+                M,
+                OCEAN_avail,
+                wpys,
+            )
+            tasks.append((pub, p0, args))
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_sweep_batch, *args) for _, _, args in tasks]
+            rewards_per_task = [future.result() for future in futures]
+    else:
+        rewards_per_task = [_sweep_batch(*args) for _, _, args in tasks]
+
+    # in order of do_pubrewards, rank_scale_ops, max_n_rank_assets, target_wpys
+    results = []
+    for (pub, p0, _), rewards_per_LP in zip(tasks, rewards_per_task):
+        for p in range(rewards_per_LP.shape[0]):
+            op, max_n = rank_params[p0 + p]
+            for w, target_wpy in enumerate(target_wpys):
+                R_per_LP = rewards_per_LP[p, w]
+                top_I = np.argsort(-R_per_LP, kind="stable")[:top_k]
+                results.append(
+                    {
+                        "RANK_SCALE_OP": op,
+                        "MAX_N_RANK_ASSETS": max_n,
+                        "TARGET_WPY": target_wpy,
+                        "DO_PUBREWARDS": pub,
+                        "total_OCEAN": float(np.sum(R_per_LP)),
+                        "n_LPs": int(np.count_nonzero(R_per_LP)),
+                        "gini": gini(R_per_LP),
+                        "top": [
+                            (calculator.LP_addrs[i], float(R_per_LP[i]))
+                            for i in top_I
+                            if R_per_LP[i] > 0.0
+                        ],
+                    }
+                )
+
+    return results
+
+
+# arguments: as for calc_rewards_at_entries_batch()
+def _sweep_batch(  # pylint: disable=too-many-positional-arguments
+    S: sparse.csc_matrix,
+    L: np.ndarray,
+    C: Optional[np.ndarray],
+    perc_per_j: np.ndarray,
+    DCV_OCEAN: np.ndarray,
+    M: np.ndarray,
+    OCEAN_avail: float,
+    target_wpys: np.ndarray,
+) -> np.ndarray:
+    """
+    @return
+      rewards_per_LP -- 3d array of [set p, set w, LP i] -- OCEAN rewards,
+        filtered & shrunk like calc_rewards__usd() does
+
+    @notes
+      Top-level, so that a process pool can pickle it.
+    """
+    R = calc_rewards_at_entries_batch(
+        S, L, C, perc_per_j, DCV_OCEAN, M, OCEAN_avail, target_wpys
+    )
+    P, W, nnz = R.shape
+    N_i = S.shape[0]
+
+    # filter negligible values
+    R[R < 0.000001] = 0.0
+
+    # sum is ok. First check within a tol; shrink if needed
+    tol = 1e-13
+    sums = np.sum(R, axis=2)
+    assert np.all(sums <= OCEAN_avail * (1 + tol)), (sums, OCEAN_avail)
+    R[sums > OCEAN_avail] /= 1 + tol
+
+    # sum over the nfts of each LP, for all sets at once: offset the LP
+    # index of each set so that one bincount does it
+    offsets = np.arange(P * W)[:, np.newaxis] * N_i
+    I = (S.indices[np.newaxis, :] + offsets).ravel()
+    rewards_per_LP = np.bincount(
+        I, weights=R.reshape(P * W, nnz).ravel(), minlength=P * W * N_i
+    )
+    return rewards_per_LP.reshape(P, W, N_i)
+
+
+@enforce_types
+def gini(x: np.ndarray) -> float:
+    """
+    @return
+      gini -- Gini coefficient of the values in x: 0.0 if all are equal,
+        towards 1.0 if one holds all. 0.0 if they sum to 0
+    """
+    x = np.sort(x)
+    n, total = len(x), np.sum(x)
+    if n == 0 or total == 0.0:
+        return 0.0
+    i = np.arange(1, n + 1)
+    return float(2.0 * np.sum(i * x) / (n * total) - (n + 1.0) / n)
+
+
+@enforce_types
+def sweep_table(results: List[dict]) -> str:
+    """
+    @return
+      table -- results of sweep_volume_rewards(), one line per combination
+    """
+    header = (
+        f"{'RANK_SCALE_OP':>13} {'MAX_N':>6} {'TARGET_WPY':>10} {'PUB':>5} "
+        f"{'total_OCEAN':>14} {'n_LPs':>6} {'gini':>6}  top"
+    )
+    lines = [header]
+    for r in results:
+        top = ", ".join(f"{addr[:8]}..={amt:.1f}" for addr, amt in r["top"])
+        lines.append(
+            f"{r['RANK_SCALE_OP']:>13} {r['MAX_N_RANK_ASSETS']:>6} "
+            f"{r['TARGET_WPY']:>10.6f} {str(r['DO_PUBREWARDS']):>5} "
+            f"{r['total_OCEAN']:>14.2f} {r['n_LPs']:>6} {r['gini']:>6.3f}  {top}"
+        )
+    return "\n".join(lines)
@@ -1,9 +1,11 @@
+import os
 from unittest.mock import patch
 
+import pytest
 from enforce_typing import enforce_types
 
 from df_py.volume import csvs
-from df_py.volume.allocations import allocs_to_stakes, load_stakes
+from df_py.volume.allocations import allocs_to_stakes, load_stakes, load_stakes_tables
 
 # for shorter lines
 C1, C2 = 7, 137
@@ -66,3 +68,59 @@ def test_load_stakes(tmp_path):
         loaded_stakes, loaded_locked_amts = load_stakes(csv_dir)
     assert loaded_stakes == target_stakes
     assert loaded_locked_amts == target_locked_amts
+
+
+@enforce_types
+def test_load_stakes_tables(tmp_path):
+    csv_dir = str(tmp_path)
+    LP1, LP2, LP3 = "0x" + "aB" * 20, "0x" + "cd" * 20, "0x" + "EF" * 20
+    NFT1, NFT2 = "0x" + "12" * 20, "0x" + "3A" * 20
+    with open(csvs.allocation_csv_filename(csv_dir), "w") as f:
+        f.write("chainID,nft_addr,LP_addr,percent\n")
+        f.write(f"{C1},{NFT1},{LP1},0.25\n")
+        f.write(f"{C2},{NFT2},{LP2},0.5\n")
+        f.write(f"{C1},{'0x' + NFT1[2:].upper()},{LP2},0.5\n")
+        f.write(f"{C1},{NFT1},{LP1.lower()},0.75\n")  # duplicate: last wins
+        f.write(f"{C1},{NFT2},{LP3},1.0\n")  # LP3 has no vebal
+    vebals = {LP1: 100.0, LP2: 200.0}
+    locked_amts = {LP1: 10.0, LP2: 20.0}
+    csvs.save_vebals_csv(vebals, locked_amts, {LP1: 1, LP2: 1}, csv_dir)
+
+    # same as via dicts
+    stakes, locked_amts_per_nft = load_stakes_tables(csv_dir)
+    assert (stakes.to_dict(), locked_amts_per_nft.to_dict()) == load_stakes(csv_dir)
+
+    lp1, lp2, lp3 = LP1.lower(), LP2.lower(), LP3.lower()
+    nft1, nft2 = NFT1.lower(), NFT2.lower()
+    assert stakes.to_dict() == {
+        C1: {nft1: {lp1: 75.0, lp2: 100.0}, nft2: {lp3: 0.0}},
+        C2: {nft2: {lp2: 100.0}},
+    }
+    assert locked_amts_per_nft.to_dict()[C1][nft1] == {lp1: 7.5, lp2: 10.0}
+
+    # LPs allocating > 100% fail
+    with open(csvs.allocation_csv_filename(csv_dir), "a") as f:
+        f.write(f"{C2},{NFT1},{LP2},0.6\n")
+    with pytest.raises(AssertionError):
+        load_stakes_tables(csv_dir)
+
+    # addresses are validated
+    with open(csvs.allocation_csv_filename(csv_dir), "w") as f:
+        f.write("chainID,nft_addr,LP_addr,percent\n")
+        f.write(f"{C1},{NFT1},0xnot_an_addr,0.1\n")
+    with pytest.raises(ValueError):
+        load_stakes_tables(csv_dir)
+
+
+@enforce_types
+def test_load_stakes_tables_empty(tmp_path):
+    csv_dir = str(tmp_path)
+    csvs.save_allocation_csv({}, csv_dir)
+    csvs.save_vebals_csv({}, {}, {}, csv_dir)
+    stakes, locked_amts_per_nft = load_stakes_tables(csv_dir)
+    assert len(stakes) == len(locked_amts_per_nft) == 0
+    assert stakes.to_dict() == {}
+
+    os.remove(csvs.allocation_csv_filename(csv_dir))
+    with pytest.raises(FileNotFoundError):
+        load_stakes_tables(csv_dir)
@@ -1,11 +1,13 @@
 # pylint: disable=too-many-lines
 from datetime import datetime
+from typing import Optional
 from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pytest
 from enforce_typing import enforce_types
 from pytest import approx
+from scipy import sparse
 
 from df_py.util.constants import (
     SAPPHIRE_MAINNET_CHAINID,
@@ -13,7 +15,13 @@ from df_py.util.constants import (
 )
 from df_py.volume import csvs
 from df_py.volume.calc_rewards import calc_volume_rewards_from_csvs
-from df_py.volume.reward_calculator import TARGET_WPY, RewardCalculator
+from df_py.volume.columnar import stakes_from_dict
+from df_py.volume.rank import rank_based_allocate
+from df_py.volume.reward_calculator import (
+    TARGET_WPY,
+    RewardCalculator,
+    calc_rewards_at_entries,
+)
 from df_py.volume.test.constants import *  # pylint: disable=wildcard-import
 from df_py.volume.test.helperfuncs import *  # pylint: disable=wildcard-import
 
@@ -507,6 +515,24 @@ def test_divide_by_zero():
     assert rewards_per_lp == {}
 
 
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_LP_addrs_same_but_for_case():
+    # like cleancase.mod_stakes(), the later one wins; the stakes aren't summed
+    LP2_upper = "0x" + LP2[2:].upper()
+    stakes = {C1: {NA: {LP1: 1e3, LP2: 2e3, LP2_upper: 5e3}}}
+    nftvols = {C1: {OCN_ADDR: {NA: 1.0}}}
+    OCEAN_avail = 10.0
+
+    rewards_per_lp, rewards_info = calc_rewards_C1(stakes, nftvols, OCEAN_avail)
+
+    stakes = {C1: {NA: {LP1: 1e3, LP2: 5e3}}}
+    assert (rewards_per_lp, rewards_info) == calc_rewards_C1(
+        stakes, nftvols, OCEAN_avail
+    )
+    assert rewards_per_lp[LP2] == approx(5.0 * rewards_per_lp[LP1])
+
+
 # ========================================================================
 # Test helper functions found in calc_rewards
 
@@ -534,7 +560,7 @@ def test_get_lp_addrs():
         },
     }
     mock_calculator = MockRewardCalculator()
-    mock_calculator.set_mock_attribute("stakes", stakes)
+    mock_calculator.set_mock_attribute("stakes_table", stakes_from_dict(stakes))
     LP_addrs = mock_calculator._get_lp_addrs()
     assert isinstance(LP_addrs, list)
     assert sorted(LP_addrs) == sorted([LP1, LP2, LP3, LP4])
@@ -571,8 +597,10 @@ def test_stake_vol_owner_dicts_to_arrays():
     chain_nft_tups = [(1, NA), (1, NB), (2, NC), (2, ND)]
 
     mock_calculator = MockRewardCalculator()
-    mock_calculator.set_mock_attribute("stakes", stakes)
-    mock_calculator.set_mock_attribute("locked_ocean_amts", locked_ocean_amts)
+    mock_calculator.set_mock_attribute("stakes_table", stakes_from_dict(stakes))
+    mock_calculator.set_mock_attribute(
+        "locked_ocean_amts_table", stakes_from_dict(locked_ocean_amts)
+    )
     mock_calculator.set_mock_attribute("nftvols_USD", nftvols_USD)
     mock_calculator.set_mock_attribute("LP_addrs", lp_addrs)
     mock_calculator.set_mock_attribute("chain_nft_tups", chain_nft_tups)
@@ -603,11 +631,115 @@ def test_stake_vol_owner_dicts_to_arrays():
     )
     expected_V_USD = np.array([15.0, 25.0, 35.0, 45.0], dtype=float)
 
-    assert np.array_equal(S, expected_S)
-    assert np.array_equal(L, expected_L)
+    assert np.array_equal(S.toarray(), expected_S)
+    assert np.array_equal(L.toarray(), expected_L)
     assert np.array_equal(V_USD, expected_V_USD)
 
 
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_stake_vol_owner_dicts_to_arrays__only_entries():
+    stakes = {C1: {NA: {LP1: 10.0, LP2: 0.0}, NB: {LP3: 5.0}, NC: {LP2: 1.0}}}
+    # LP4 locked but didn't allocate; NB has no locked amounts
+    locked_amts = {C1: {NA: {LP1: 20.0, LP4: 7.0}, NC: {LP2: 3.0}}}
+    nftvols = {C1: {OCN_ADDR: {NA: 1.0, NB: 1.0}}}  # NC has no volume
+    owners = {C1: {NA: LP3, NB: LP4}}
+
+    rc = RewardCalculator(
+        stakes, locked_amts, nftvols, owners, SYMBOLS, RATES, DF_WEEK, 1.0, True, False
+    )
+    assert rc.LP_addrs == [LP1, LP2, LP3]
+    assert rc.chain_nft_tups == [(C1, NA), (C1, NB)]
+
+    S, _, _, C, L = rc._stake_vol_owner_dicts_to_arrays()
+    assert S.nnz == 2 and L.nnz == 1  # no explicit zeros
+    assert np.array_equal(S.toarray(), [[10.0, 0.0], [0.0, 0.0], [0.0, 5.0]])
+    assert np.array_equal(L.toarray(), [[20.0, 0.0], [0.0, 0.0], [0.0, 0.0]])
+    assert list(C) == [2, -1]
+
+
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+@pytest.mark.parametrize("do_pubrewards", [False, True])
+@pytest.mark.parametrize("do_rank", [False, True])
+@pytest.mark.parametrize("df_week", [DF_WEEK, 80])
+def test_sparse_matches_dense(do_pubrewards, do_rank, df_week):
+    for seed in range(5):
+        stakes, locked_amts, nftvols, owners = _random_world(seed)
+        rc = RewardCalculator(
+            stakes,
+            locked_amts,
+            nftvols,
+            owners,
+            SYMBOLS,
+            RATES,
+            df_week,
+            1e5,
+            do_pubrewards,
+            do_rank,
+        )
+        rewardsperlp, rewardsinfo = rc.calculate()
+        R, dense_rewardsperlp, dense_rewardsinfo = _calc_rewards_dense(rc)
+
+        assert 0 < rc.S.nnz < np.prod(rc.S.shape) / 4  # it's sparse
+        assert rc.R.nnz > 0
+        # bit-identical, not approx
+        assert np.array_equal(rc.R.toarray(), R)
+        assert rewardsperlp == dense_rewardsperlp
+        assert rewardsinfo == dense_rewardsinfo
+        # same order too, so csvs come out the same
+        assert repr(rewardsperlp) == repr(dense_rewardsperlp)
+        assert repr(rewardsinfo) == repr(dense_rewardsinfo)
+
+
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_calculate_rows():
+    stakes, locked_amts, nftvols, owners = _random_world(seed=0)
+    args = (stakes, locked_amts, nftvols, owners, SYMBOLS, RATES, 80, 1e5, True, True)
+
+    rewardsperlp, rewardsinfo = RewardCalculator(*args).calculate()
+    rewardsperlp_rows, rewardsinfo_rows = RewardCalculator(*args).calculate_rows()
+
+    assert list(rewardsperlp_rows) == [
+        (chainID, LP_addr, reward)
+        for chainID, rewards in rewardsperlp.items()
+        for LP_addr, reward in rewards.items()
+    ]
+    assert list(rewardsinfo_rows) == [
+        (chainID, nft_addr, LP_addr, reward)
+        for chainID, rewards in rewardsinfo.items()
+        for nft_addr, rewards2 in rewards.items()
+        for LP_addr, reward in rewards2.items()
+    ]
+
+
+@enforce_types
+@pytest.mark.parametrize("seed", range(4))
+def test_calc_rewards_at_entries_matches_dense(seed):
+    rng = np.random.default_rng(seed)
+    N_i, N_j = 300, 120
+
+    # popular columns have 100s of entries, so that summation order matters
+    density = np.clip(rng.pareto(1.0, N_j) / 20, 0.0, 1.0)
+    mask = rng.random((N_i, N_j)) < density
+    mask[:, :5] = False  # some empty columns
+    S = sparse.csc_matrix(np.where(mask, rng.uniform(1e-3, 1e6, (N_i, N_j)), 0.0))
+    L = rng.uniform(0.0, 1e6, S.nnz) * (rng.random(S.nnz) < 0.9)
+
+    C = rng.integers(-1, N_i, N_j)  # owners, who may or may not stake
+    V_USD = rng.uniform(0.0, 1e5, N_j) * (rng.random(N_j) < 0.8)
+    perc_per_j = V_USD / np.sum(V_USD)
+    M = rng.choice([0.0, 0.001, 0.201, 5.0, np.inf], N_j)
+
+    for C_ in [None, C]:
+        args = (S, L, C_, perc_per_j, V_USD / 0.5, M, 1e5)
+        R = calc_rewards_at_entries(*args)
+        R_dense = _calc_rewards_at_entries_dense(*args)
+        assert np.count_nonzero(R) > N_j
+        assert np.array_equal(R, R_dense)  # bit-identical, not approx
+
+
 @enforce_types
 def test_volume_reward_calculator_no_pdrs(tmp_path):
     stakes = {
@@ -629,8 +761,8 @@ def test_volume_reward_calculator_no_pdrs(tmp_path):
     OCEAN_reward = 1000.0
 
     with patch(
-        "df_py.volume.allocations.load_stakes",
-        return_value=(stakes, locked_amts),
+        "df_py.volume.allocations.load_stakes_tables",
+        return_value=(stakes_from_dict(stakes), stakes_from_dict(locked_amts)),
     ), patch("df_py.volume.csvs.load_nftvols_csvs", return_value=volumes), patch(
         "df_py.volume.csvs.load_owners_csvs", return_value=owners
     ), patch(
@@ -704,8 +836,8 @@ def test_volume_reward_calculator_pdr_mul(tmp_path):
     OCEAN_reward = 1000.0
 
     with patch(
-        "df_py.volume.allocations.load_stakes",
-        return_value=(stakes, locked_amts),
+        "df_py.volume.allocations.load_stakes_tables",
+        return_value=(stakes_from_dict(stakes), stakes_from_dict(locked_amts)),
     ), patch("df_py.volume.csvs.load_nftvols_csvs", return_value=volumes), patch(
         "df_py.volume.csvs.load_owners_csvs", return_value=owners
     ), patch(
@@ -799,8 +931,8 @@ def _test_volume_reward_calculator_pdr_mult(tmp_path, DF_week, expected_rewards)
     OCEAN_reward = 1e24
 
     with patch(
-        "df_py.volume.allocations.load_stakes",
-        return_value=(stakes, locked_amts),
+        "df_py.volume.allocations.load_stakes_tables",
+        return_value=(stakes_from_dict(stakes), stakes_from_dict(locked_amts)),
     ), patch("df_py.volume.csvs.load_nftvols_csvs", return_value=volumes), patch(
         "df_py.volume.csvs.load_owners_csvs", return_value=owners
     ), patch(
@@ -829,3 +961,150 @@ def _test_volume_reward_calculator_pdr_mult(tmp_path, DF_week, expected_rewards)
         rewards_per_lp = csvs.load_volume_rewards_csv(str(tmp_path))
 
         assert rewards_per_lp[chain_id][LP1] == approx(expected_rewards, 1e-6)
+
+
+# ========================================================================
+# support functions
+
+
+@enforce_types
+def _random_world(seed: int) -> tuple:
+    """Sparse stakes: each LP allocates to a few nfts on C1 and C2"""
+    rng = np.random.default_rng(seed)
+    LPs = [f"0xlp{i}_addr" for i in range(60)]
+    chain_basetoken = {C1: OCN_ADDR, C2: OCN_ADDR2}
+
+    stakes: dict = {C1: {}, C2: {}}
+    locked_amts: dict = {C1: {}, C2: {}}
+    for LP in LPs:
+        for n in rng.choice(80, size=rng.integers(1, 5), replace=False):
+            chainID = C1 if n % 2 else C2
+            nft = f"0xnft{n}_addr"
+            stake = float(rng.uniform(1.0, 1e5))
+            stakes[chainID].setdefault(nft, {})[LP] = stake
+            if rng.random() < 0.9:  # else nothing locked
+                locked = stake * float(rng.uniform(0.01, 2.0))
+                locked_amts[chainID].setdefault(nft, {})[LP] = locked
+    for chainID in stakes:
+        for nft in stakes[chainID]:
+            locked_amts[chainID].setdefault(nft, {})
+
+    nftvols: dict = {}
+    owners: dict = {}
+    for chainID, nfts in stakes.items():
+        basetoken = chain_basetoken[chainID]
+        nftvols[chainID] = {basetoken: {}}
+        owners[chainID] = {}
+        for nft in nfts:
+            if rng.random() < 0.8:  # else no volume
+                nftvols[chainID][basetoken][nft] = float(rng.uniform(0.0, 1e4))
+            # often, the owner is one of the LPs
+            owners[chainID][nft] = (
+                str(rng.choice(list(nfts[nft]))) if rng.random() < 0.5 else ZERO_ADDRESS
+            )
+    return stakes, locked_amts, nftvols, owners
+
+
+@enforce_types
+def _calc_rewards_dense(rc: RewardCalculator) -> tuple:
+    """Reference: RewardCalculator's rewards, over dense S, L and R"""
+    N_i, N_j = len(rc.LP_addrs), len(rc.chain_nft_tups)
+    stakes = rc.stakes_table.to_dict()
+    locked_amts = rc.locked_ocean_amts_table.to_dict()
+    S = np.zeros((N_i, N_j), dtype=float)
+    L = np.zeros((N_i, N_j), dtype=float)
+    for j, (chainID, nft_addr) in enumerate(rc.chain_nft_tups):
+        for i, LP_addr in enumerate(rc.LP_addrs):
+            S[i, j] = stakes[chainID][nft_addr].get(LP_addr, 0.0)
+            L[i, j] = locked_amts[chainID][nft_addr].get(LP_addr, 0.0)
+    assert np.array_equal(rc.S.toarray(), S)
+    assert np.array_equal(rc.L.toarray(), L)
+
+    if rc.do_rank:
+        perc_per_j = rank_based_allocate(rc.V_USD)
+    else:
+        perc_per_j = rc.V_USD / np.sum(rc.V_USD)
+
+    C = rc.C if rc.do_pubrewards else None
+    DCV_OCEAN = rc.V_USD / rc.rates["OCEAN"]
+    R = _rewards_dense(S, L, C, perc_per_j, DCV_OCEAN, rc.M, rc.OCEAN_avail)
+    R[R < 0.000001] = 0.0
+    if np.sum(R) > rc.OCEAN_avail:
+        R /= 1 + 1e-13
+
+    rewardsperlp: dict = {}
+    rewardsinfo: dict = {}
+    for i, LP_addr in enumerate(rc.LP_addrs):
+        for j, (chainID, nft_addr) in enumerate(rc.chain_nft_tups):
+            if R[i, j] == 0.0:
+                continue
+            rewardsperlp.setdefault(chainID, {}).setdefault(LP_addr, 0.0)
+            rewardsperlp[chainID][LP_addr] += R[i, j]
+            rewardsinfo.setdefault(chainID, {}).setdefault(nft_addr, {})
+            rewardsinfo[chainID][nft_addr][LP_addr] = R[i, j]
+
+    return R, rewardsperlp, rewardsinfo
+
+
+@enforce_types
+def _calc_rewards_at_entries_dense(  # pylint: disable=too-many-positional-arguments
+    S: sparse.csc_matrix,
+    L: np.ndarray,
+    C: Optional[np.ndarray],
+    perc_per_j: np.ndarray,
+    DCV_OCEAN: np.ndarray,
+    M: np.ndarray,
+    OCEAN_avail: float,
+) -> np.ndarray:
+    """Reference: calc_rewards_at_entries(), via the dense loop"""
+    cols = np.repeat(np.arange(S.shape[1]), np.diff(S.indptr))
+    L_dense = np.zeros(S.shape, dtype=float)
+    L_dense[S.indices, cols] = L
+    R = _rewards_dense(S.toarray(), L_dense, C, perc_per_j, DCV_OCEAN, M, OCEAN_avail)
+    return R[S.indices, cols]
+
+
+@enforce_types
+def _rewards_dense(  # pylint: disable=too-many-positional-arguments
+    S: np.ndarray,
+    L: np.ndarray,
+    C: Optional[np.ndarray],
+    perc_per_j: np.ndarray,
+    DCV_OCEAN: np.ndarray,
+    M: np.ndarray,
+    OCEAN_avail: float,
+) -> np.ndarray:
+    """The rewards loop over all [LP i, chain_nft j], as it was before
+    RewardCalculator went sparse"""
+    N_i, N_j = S.shape
+    S = np.copy(S)
+    # modify S's: owners get rewarded as if 2x stake on their asset
+    if C is not None:
+        for j in range(N_j):
+            if C[j] != -1:  # -1 = owner didn't stake
+                S[C[j], j] *= 2.0
+
+    R = np.zeros((N_i, N_j), dtype=float)
+    for j in range(N_j):
+        stake_j = sum(S[:, j])
+        multiplier = M[j]
+        DCV_OCEAN_j = DCV_OCEAN[j]
+        if stake_j == 0.0 or DCV_OCEAN_j == 0.0:
+            continue
+
+        for i in range(N_i):
+            perc_at_j = perc_per_j[j]
+
+            stake_ij = S[i, j]
+            perc_at_ij = stake_ij / stake_j
+
+            ocean_locked_ij = L[i, j]
+
+            # main formula!
+            # reward amount in OCEAN
+            R[i, j] = min(
+                perc_at_j * perc_at_ij * OCEAN_avail,
+                ocean_locked_ij * TARGET_WPY,  # bound rewards by max APY
+                DCV_OCEAN_j * perc_at_ij * multiplier,  # bound rewards by DCV
+            )
+    return R
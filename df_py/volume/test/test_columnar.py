@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from enforce_typing import enforce_types
+
+from df_py.volume import cleancase, columnar
+from df_py.volume.columnar import NO_KEY
+
+
+@enforce_types
+def test_allocations():
+    allocs = {
+        1: {
+            "0xpOolA": {"0xLp1": 0.5, "0xLP2": 1.0},
+            "0xPOOLB": {"0xLP1": 0.5},
+            "0xPOoLC": {},
+        },
+        2: {"0xPOOLD": {"0xLP5": 1.0}},
+        3: {},
+    }
+    table = columnar.allocations_from_dict(allocs)
+    assert table.rows.dtype == columnar.ALLOCATIONS_DTYPE
+    assert table.to_dict() == cleancase.mod_allocations(allocs)
+
+    # each distinct str is stored once, normalized
+    assert sorted(table.strs.tolist()) == sorted(
+        ["0xpoola", "0xpoolb", "0xpoolc", "0xpoold", "0xlp1", "0xlp2", "0xlp5"]
+    )
+
+    # nfts without LPs, and chains without nfts, are placeholder rows
+    assert np.sum(table.rows["LP_addr"] == NO_KEY) == 2
+
+
+@enforce_types
+def test_allocations_fail():
+    allocs = {1: {"0xpoola": {"0xlp1": 0.5}, "0xpoolb": {"0xLP1": 0.51}}}
+    with pytest.raises(AssertionError) as excinfo:
+        columnar.allocations_from_dict(allocs)
+    assert str(excinfo.value) == "LP 0xlp1 has 1.01% allocation, > 1.0%"
+
+
+@enforce_types
+def test_round_trips():
+    stakes = {1: {"0xPoolA": {"0xLp1": 10.0, "0xLP2": 20.0}}, 2: {"0xpoolb": {}}}
+    assert columnar.stakes_from_dict(stakes).to_dict() == cleancase.mod_stakes(stakes)
+
+    vebals = {"0xLP1": 10.0, "0xlp2": 0.0}
+    assert columnar.vebals_from_dict(vebals).to_dict() == {"0xlp1": 10.0, "0xlp2": 0.0}
+    assert columnar.vebals_from_dict({}).to_dict() == {}
+
+
+@enforce_types
+def test_same_but_for_case():
+    # the later key wins, at the earlier key's place, like cleancase
+    stakes = {1: {"0xpoola": {"0xlp1": 1.0, "0xlp2": 2.0, "0xLP1": 3.0}}}
+    table = columnar.stakes_from_dict(stakes)
+    assert len(table) == 2
+    assert list(table.to_dict()[1]["0xpoola"].items()) == list(
+        cleancase.mod_stakes(stakes)[1]["0xpoola"].items()
+    )
+    assert table.to_dict() == {1: {"0xpoola": {"0xlp1": 3.0, "0xlp2": 2.0}}}
+
+    # an LP's allocations are checked after dedup
+    allocs = {1: {"0xpoola": {"0xlp1": 0.7, "0xLP1": 0.9}}}
+    assert columnar.allocations_from_dict(allocs).to_dict() == (
+        cleancase.mod_allocations(allocs)
+    )
+
+
+@enforce_types
+def test_validation():
+    with pytest.raises(AssertionError):
+        columnar.stakes_from_dict({1: {"poola": {"0xlp1": 1.0}}})
+    with pytest.raises(AssertionError):
+        columnar.vebals_from_dict({"lp1": 1.0})
+    with pytest.raises(TypeError):
+        columnar.stakes_from_dict([])
+
+    # stakes & allocs must be floats, like cleancase requires
+    for bad_stake in [None, 1, "1.0"]:
+        stakes = {1: {"0xpoola": {"0xlp1": bad_stake}}}
+        with pytest.raises(AssertionError):
+            cleancase.mod_stakes(stakes)
+        with pytest.raises(AssertionError):
+            columnar.stakes_from_dict(stakes)
+    with pytest.raises(AssertionError):
+        columnar.allocations_from_dict({1: {"0xpoola": {"0xlp1": None}}})
+    columnar.stakes_from_dict({1: {"0xpoola": {}}})  # no LPs is fine
+
+
+@enforce_types
+def test_lookup():
+    allocs = columnar.allocations_from_dict(
+        {1: {"0xpoola": {"0xlp1": 0.5, "0xlp2": 0.5}, "0xpoolb": {}}}
+    )
+    vebals = columnar.vebals_from_dict({"0xLP2": 20.0, "0xlp3": 30.0})
+    bals = columnar.lookup(vebals, allocs, "LP_addr")
+    assert bals.tolist() == [0.0, 20.0, 0.0]  # no vebal; found; placeholder
+
+    with pytest.raises(AssertionError):
+        columnar.lookup(vebals, allocs, "nft_addr")
+
+
+@enforce_types
+def test_eq():
+    stakes = {1: {"0xpoola": {"0xlp1": 10.0, "0xlp2": 20.0}}}
+    table = columnar.stakes_from_dict(stakes)
+    assert table == columnar.stakes_from_dict(
+        {1: {"0xPOOLA": {"0xlp2": 20.0, "0xLP1": 10.0}}}
+    )
+    assert table != columnar.stakes_from_dict({1: {"0xpoola": {"0xlp1": 10.0}}})
+    assert table != columnar.allocations_from_dict({1: {"0xpoola": {"0xlp1": 1.0}}})
+    assert table != stakes
+    assert len(table) == 2
@@ -313,6 +313,23 @@ def test_rewards_per_lp_main(tmp_path):
             assert isinstance(value, float)
 
 
+@enforce_types
+def test_rewards_per_lp_rows(tmp_path):
+    rewards = {1: {LP1: 1.1, LP2: 2.2}, 137: {LP1: 137.1}}
+    dict_dir, rows_dir = tmp_path / "dict", tmp_path / "rows"
+    dict_dir.mkdir()
+    rows_dir.mkdir()
+
+    csvs.save_volume_rewards_csv(rewards, str(dict_dir))
+    rows = iter([(1, LP1, 1.1), (1, LP2, 2.2), (137, LP1, 137.1)])
+    csvs.save_volume_rewards_csv_rows(rows, str(rows_dir))
+
+    dict_csv = csvs.volume_rewards_csv_filename(str(dict_dir))
+    rows_csv = csvs.volume_rewards_csv_filename(str(rows_dir))
+    with open(dict_csv, "r") as f1, open(rows_csv, "r") as f2:
+        assert f1.read() == f2.read()
+
+
 # ========================================================================
 # rewardsinfo csvs
 
@@ -355,6 +372,19 @@ def test_rewards_info(tmp_path):  # pylint: disable=unused-argument
     csv = loaded_rewards.read()
     assert csv == target_rewards
 
+    # rows, e.g. streamed from RewardCalculator.calculate_rows()
+    rows_dir = tmp_path / "rows"
+    rows_dir.mkdir()
+    rows = (
+        (chainID, nft_addr, LP_addr, value)
+        for chainID, innerdict in rewards.items()
+        for nft_addr, innerdict2 in innerdict.items()
+        for LP_addr, value in innerdict2.items()
+    )
+    csvs.save_volume_rewardsinfo_csv_rows(rows, str(rows_dir))
+    with open(csvs.volume_rewardsinfo_csv_filename(str(rows_dir)), "r") as f:
+        assert f.read() == target_rewards
+
     with patch("web3.main.Web3.to_checksum_address") as mock:
         mock.side_effect = lambda value: value
         loaded_rewards = csvs.load_volume_rewardsinfo_csv(csv_dir)
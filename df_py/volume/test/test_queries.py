@@ -1,8 +1,12 @@
 # mypy: disable-error-code="attr-defined"
 # pylint: disable=too-many-lines
+import asyncio
+import copy
 import os
 import random
+import re
 import time
+from unittest.mock import Mock, patch
 
 import pytest
 from enforce_typing import enforce_types
@@ -13,6 +17,7 @@ from df_py.util.base18 import from_wei, str_with_wei, to_wei
 from df_py.util.blockrange import BlockRange
 from df_py.util.constants import MAX_ALLOCATE
 from df_py.util.contract_base import ContractBase
+from df_py.util.graphtestutil import mock_stream_query
 from df_py.util.networkutil import send_ether
 from df_py.util.oceanutil import ve_delegate
 from df_py.volume import csvs, queries
@@ -297,7 +302,7 @@ def _test_queryVolsOwnersSymbols(w3, st, fin):
     print("_test_queryVolsOwnersSymbols()...")
     n = 500
     rng = BlockRange(st, fin, n, web3=w3)
-    (V0, C0, SYM0) = queries.queryVolsOwnersSymbols(rng, CHAINID)
+    V0, C0, SYM0 = queries.queryVolsOwnersSymbols(rng, CHAINID)
 
     assert CO2_addr in V0
     assert C0
@@ -410,7 +415,7 @@ def _test_dftool_allocations(tmp_path, start_block, fin_block):
 @enforce_types
 def _test_end_to_end_without_csvs(rng):
     print("_test_end_to_end_without_csvs()...")
-    (V0, C0, SYM0) = queries.queryVolsOwnersSymbols(rng, CHAINID)
+    V0, C0, SYM0 = queries.queryVolsOwnersSymbols(rng, CHAINID)
     V = {CHAINID: V0}
     C = {CHAINID: C0}
     SYM = {CHAINID: SYM0}
@@ -452,7 +457,7 @@ def _test_end_to_end_with_csvs(w3, rng, tmp_path, god_acct):
     csvs.save_rate_csv(CO2_sym, 1.00, csv_dir)
 
     # 2. simulate "dftool volsym"
-    (V0, C0, SYM0) = queries.queryVolsOwnersSymbols(rng, CHAINID)
+    V0, C0, SYM0 = queries.queryVolsOwnersSymbols(rng, CHAINID)
     csvs.save_nftvols_csv(V0, csv_dir, CHAINID)
     csvs.save_owners_csv(C0, csv_dir, CHAINID)
     csvs.save_symbols_csv(SYM0, csv_dir, CHAINID)
@@ -550,10 +555,10 @@ def _test_queryPassiveRewards(addresses, god_acct):
 
 def _test_ghost_consume(start_block, fin_block, rng, ghost_consume_nft_addr):
     print("_test_ghost_consume()...")
-    (V0, _, _) = queries.queryVolsOwnersSymbols(rng, CHAINID)
+    V0, _, _ = queries.queryVolsOwnersSymbols(rng, CHAINID)
     assert V0[CO2_addr][ghost_consume_nft_addr] == approx(1.0, 0.5)
 
-    (V0, _, _) = queries._queryVolsOwners(start_block, fin_block, CHAINID)
+    V0, _, _ = queries._queryVolsOwners(start_block, fin_block, CHAINID)
     assert V0[CO2_addr][ghost_consume_nft_addr] == 21.0
 
     swaps = queries._querySwaps(start_block, fin_block, CHAINID)
@@ -1070,6 +1075,145 @@ def test_calculate_gas_vols_distributes_gas_evenly():
     ), "Gas volumes should be evenly distributed among NFTs."
 
 
+def _fake_snapshot_submit_query(query: str, chainID: int) -> dict:
+    """Fake subgraph: deterministic veOCEANs & veAllocations per block"""
+    # pylint: disable=unused-argument
+    data = {}
+    aliased_pages = re.findall(
+        r"(b\d+): (\w+)\(first: (\d+), orderBy: id, orderDirection: asc, "
+        r'where: {id_gt: "([^"]*)"[^}]*}, block: {number: (\d+)}\)',
+        query,
+    )
+    for alias, entity, first, last_id, block in aliased_pages:
+        records = _fake_snapshot(entity, int(block))
+        records = [rec for rec in records if rec["id"] > last_id][: int(first)]
+        data[alias] = records
+    return {"data": data}
+
+
+def _fake_snapshot(entity: str, block: int) -> list:
+    rnd = random.Random(block)
+    lps = [f"0x{i:040x}" for i in range(1, 25)]
+    if entity == "veOCEANs":
+        return [
+            {
+                "id": lp,
+                "lockedAmount": str(rnd.uniform(1.0, 1000.0)),
+                "unlockTime": str(2000000000 + rnd.randint(0, 10**7)),
+                "delegation": (
+                    [
+                        {
+                            "id": f"{lp}-d",
+                            "receiver": {"id": lps[(i + 1) % len(lps)]},
+                            "amount": str(rnd.uniform(0.0, 0.1)),
+                            "expireTime": "2100000000",
+                            "timeLeftUnlock": 10**8,
+                            "lockedAmount": "1",
+                            "updates": [],
+                        }
+                    ]
+                    if i % 3 == 0
+                    else []
+                ),
+            }
+            for i, lp in enumerate(lps)
+        ]
+    return [
+        {
+            "id": f"{lp}-{nft_i}",
+            "allocated": str(rnd.uniform(0.0, 2500.0)),
+            "chainId": str(CHAINID),
+            "nftAddress": f"0x{nft_i:040x}",
+            "allocationUser": {"id": lp},
+        }
+        for lp in lps
+        for nft_i in range(1, 4)
+    ]
+
+
+@enforce_types
+@pytest.mark.parametrize("max_workers", ["3", "8"])
+def test_sampled_queries_concurrent_matches_serial(monkeypatch, max_workers):
+    rng = BlockRange(st=100, fin=10000, num_samples=20, random_seed=42)
+    web3 = Mock()
+    web3.eth.get_block.return_value.timestamp = 1700000000
+
+    with patch(
+        "df_py.util.graphutil.async_stream_query",
+        side_effect=mock_stream_query(_fake_snapshot_submit_query),
+    ), patch("df_py.util.networkutil.chain_id_to_web3") as chain_id_to_web3_mock:
+        chain_id_to_web3_mock.return_value = web3
+
+        monkeypatch.setenv("DEVELOPMENT_SUBGRAPH_MAX_WORKERS", "1")
+        vebals_serial = queries.queryVebalances(rng, CHAINID)
+        allocs_serial = queries.queryAllocations(rng, CHAINID)
+
+        monkeypatch.setenv("DEVELOPMENT_SUBGRAPH_MAX_WORKERS", max_workers)
+        vebals_concurrent = queries.queryVebalances(rng, CHAINID)
+        allocs_concurrent = queries.queryAllocations(rng, CHAINID)
+
+    assert vebals_serial[0]
+    assert allocs_serial
+    # exact equality, not approx
+    assert vebals_concurrent == vebals_serial
+    assert allocs_concurrent == allocs_serial
+
+
+@enforce_types
+def test_queryVolsOwnersSymbols_streams_overlap():
+    rng = BlockRange(st=100, fin=200, num_samples=2, random_seed=1, web3=Mock())
+    delay = 0.3
+    vols = {
+        "0xocean": {"0xnft1": 10.0, "0xnft2": 5.0},
+        "0xdevelopment": {"0xnft3": 1.0},
+    }
+    owners = {"0xnft1": "0xowner1", "0xnft2": "0xowner2", "0xnft3": "0xowner3"}
+    gasvols = {"0xnative": {"0xnft1": 0.5}}
+    swaps = {"0xocean": {"0xnft1": 8.0, "0xnft2": 9.0}}
+
+    async def _vols_owners(*args):  # pylint: disable=unused-argument
+        await asyncio.sleep(delay)
+        return copy.deepcopy(vols), dict(owners), copy.deepcopy(gasvols)
+
+    async def _swaps(*args):  # pylint: disable=unused-argument
+        await asyncio.sleep(delay)
+        return copy.deepcopy(swaps)
+
+    def _filter(nftvols, chainID):  # pylint: disable=unused-argument
+        time.sleep(delay)
+        return {"0xocean": nftvols["0xocean"]}
+
+    symbol_calls = []
+
+    def _symbol(web3, addr):  # pylint: disable=unused-argument
+        symbol_calls.append(addr)
+        time.sleep(delay)
+        if addr == "0xdevelopment":
+            raise ValueError("not a token")
+        return addr[2:].upper()
+
+    with patch.object(queries, "_async_queryVolsOwners", _vols_owners), patch.object(
+        queries, "_async_querySwaps", _swaps
+    ), patch.object(queries, "_filterNftvols", _filter), patch.object(
+        queries, "symbol", _symbol
+    ):
+        t0 = time.time()
+        Vi, Ci, SYMi = queries.queryVolsOwnersSymbols(rng, CHAINID)
+        elapsed = time.time() - t0
+
+    assert Vi == {
+        "0xocean": {"0xnft1": 8.0, "0xnft2": 5.0},
+        "0xnative": {"0xnft1": 0.5},
+    }
+    assert Ci == owners
+    assert SYMi == {"0xocean": "OCEAN", "0xnative": "NATIVE"}
+    assert sorted(symbol_calls) == ["0xnative", "0xocean"]  # not filtered-out ones
+
+    # {orders, then filter} next to swaps, then both symbols at once:
+    # 3 delays, not 5
+    assert elapsed < 4 * delay
+
+
 # ===========================================================================
 # support functions
 
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from enforce_typing import enforce_types
+
+from df_py.volume import reward_bench as rb
+from df_py.volume.calc_rewards import calc_volume_rewards
+
+QUERY_PATH = "df_py.volume.reward_calculator.query_predictoor_contracts"
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..")
+
+
+@enforce_types
+def test_synthetic_world():
+    world = rb.synthetic_world(50, 40, seed=3)
+    assert world == rb.synthetic_world(50, 40, seed=3)
+    assert world != rb.synthetic_world(50, 40, seed=4)
+
+    # every staked nft has volume & an owner
+    vol_nfts = {
+        (chainID, nft)
+        for chainID, vols in world["nftvols"].items()
+        for nft_vols in vols.values()
+        for nft in nft_vols
+    }
+    for chainID, nft_stakes in world["stakes"].items():
+        for nft_addr, LP_stakes in nft_stakes.items():
+            assert (chainID, nft_addr) in vol_nfts
+            assert nft_addr in world["owners"][chainID]
+            assert LP_stakes.keys() == world["locked_amts"][chainID][nft_addr].keys()
+    assert len(vol_nfts) == 40
+
+    # and RewardCalculator takes it as is
+    with patch(QUERY_PATH, return_value={}):
+        rewardsperlp, _ = calc_volume_rewards(
+            world["stakes"],
+            world["locked_amts"],
+            world["nftvols"],
+            world["owners"],
+            world["symbols"],
+            world["rates"],
+            None,
+            1e4,
+            True,
+            True,
+        )
+    assert sum(sum(r.values()) for r in rewardsperlp.values()) > 0.0
+
+
+@enforce_types
+def test_bench_scale():
+    result = rb.bench_scale(100, 100, seed=1)
+    assert set(result["stages"]) == set(rb.STAGES + ["total"])
+    for stage in rb.STAGES:
+        assert 0.0 <= result["stages"][stage] <= result["stages"]["total"]
+    assert result["stages"]["matrix_build"] > 0.0
+    assert result["n_stakes"] > 0
+    assert result["peak_rss_MB"] >= result["world_rss_MB"] > 0.0
+
+    # same world, same rewards
+    assert rb.bench_scale(100, 100, seed=1)["total_OCEAN"] == result["total_OCEAN"]
+
+
+@enforce_types
+def test_report_table():
+    result = rb.bench_scale(100, 100)
+    report = {"results": [{"scale": "tiny", **result}]}
+    assert len(rb.report_table(report).splitlines()) == 2
+
+    baseline = json.loads(json.dumps(report))
+    for stage in baseline["results"][0]["stages"]:
+        baseline["results"][0]["stages"][stage] *= 2
+    lines = rb.report_table(report, baseline).splitlines()
+    assert len(lines) == 3
+    assert "0.50x" in lines[2]
+
+
+@enforce_types
+def test_main(tmp_path):
+    out = str(tmp_path / "bench.json")
+    cmd = [sys.executable, "-m", "df_py.volume.reward_bench"]
+    cmd += ["--scales", "tiny", "--out", out]
+    subprocess.run(cmd, cwd=ROOT_DIR, check=True, capture_output=True)
+
+    with open(out, encoding="utf-8") as f:
+        report = json.load(f)
+    assert [r["scale"] for r in report["results"]] == ["tiny"]
+    assert report["results"][0]["n_LPs"] == 100
+
+    cmd += ["--compare", out]
+    p = subprocess.run(cmd, cwd=ROOT_DIR, check=True, capture_output=True, text=True)
+    assert "vs base" in p.stdout
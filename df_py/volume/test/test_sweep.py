@@ -0,0 +1,156 @@
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from enforce_typing import enforce_types
+from pytest import approx
+
+from df_py.util.constants import MAX_N_RANK_ASSETS, RANK_SCALE_OP, TARGET_WPY
+from df_py.volume import csvs, rank
+from df_py.volume.reward_calculator import RewardCalculator
+from df_py.volume.sweep import gini, sweep_table, sweep_volume_rewards
+from df_py.volume.test.constants import *  # pylint: disable=wildcard-import
+
+OPS = ["LIN", "LOG"]
+MAX_NS = [5, 100]
+WPYS = [0.001, TARGET_WPY]
+PUBS = [False, True]
+
+
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_sweep_matches_calculate():
+    results = sweep_volume_rewards(_calculator(), OPS, MAX_NS, WPYS, PUBS, top_k=3)
+    assert len(results) == len(OPS) * len(MAX_NS) * len(WPYS) * len(PUBS)
+
+    i = 0
+    for pub in PUBS:
+        for op in OPS:
+            for max_n in MAX_NS:
+                for wpy in WPYS:
+                    result = results[i]
+                    i += 1
+                    assert (
+                        result["DO_PUBREWARDS"],
+                        result["RANK_SCALE_OP"],
+                        result["MAX_N_RANK_ASSETS"],
+                        result["TARGET_WPY"],
+                    ) == (pub, op, max_n, wpy)
+
+                    # same rewards as a calculate() with these params
+                    expected = _calculate_per_LP(pub, op, max_n, wpy)
+                    assert result["total_OCEAN"] == approx(sum(expected.values()))
+                    assert result["n_LPs"] == len(expected)
+                    assert 0.0 < result["gini"] < 1.0
+
+                    top = sorted(expected.items(), key=lambda kv: -kv[1])[:3]
+                    assert [addr for addr, _ in result["top"]] == [
+                        addr for addr, _ in top
+                    ]
+                    assert [amt for _, amt in result["top"]] == approx(
+                        [amt for _, amt in top]
+                    )
+
+    # each param matters
+    totals = {result["total_OCEAN"] for result in results}
+    assert len(totals) > len(results) // 2
+
+
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_sweep_workers(monkeypatch):
+    results = sweep_volume_rewards(_calculator(), OPS, MAX_NS, WPYS, PUBS)
+
+    # small batches, spread across processes: same results
+    monkeypatch.setattr("df_py.volume.sweep.MAX_BATCH_BYTES", 1)
+    results2 = sweep_volume_rewards(_calculator(), OPS, MAX_NS, WPYS, PUBS, n_workers=2)
+    assert results2 == results
+
+
+@patch(QUERY_PATH, MagicMock(return_value={}))
+@enforce_types
+def test_sweep_defaults(tmp_path):
+    results = sweep_volume_rewards(_calculator())
+    assert len(results) == 1
+    assert results[0]["RANK_SCALE_OP"] == RANK_SCALE_OP
+    assert results[0]["MAX_N_RANK_ASSETS"] == MAX_N_RANK_ASSETS
+    assert results[0]["TARGET_WPY"] == TARGET_WPY
+
+    table = sweep_table(results)
+    assert len(table.splitlines()) == 2
+    assert RANK_SCALE_OP in table
+
+    csv_dir = str(tmp_path)
+    csvs.save_volume_sweep_csv(results, csv_dir)
+    with open(csvs.volume_sweep_csv_filename(csv_dir), encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith("RANK_SCALE_OP,MAX_N_RANK_ASSETS,TARGET_WPY")
+    assert len(lines) == 2
+
+
+@enforce_types
+def test_gini():
+    assert gini(np.array([])) == 0.0
+    assert gini(np.zeros(4)) == 0.0
+    assert gini(np.full(10, 3.0)) == approx(0.0)
+    assert gini(np.array([0.0, 0.0, 0.0, 1.0])) == approx(0.75)
+    assert gini(np.array([1.0, 2.0, 3.0])) == gini(np.array([3.0, 1.0, 2.0]))
+    with pytest.raises(TypeError):
+        gini([1.0, 2.0])
+
+
+# ========================================================================
+# support functions
+
+
+@enforce_types
+def _world() -> tuple:
+    """Stakes of 40 LPs, on 30 nfts across C1 and C2"""
+    rng = np.random.default_rng(0)
+    LPs = [f"0xlp{i}_addr" for i in range(40)]
+    chain_basetoken = {C1: OCN_ADDR, C2: OCN_ADDR2}
+
+    stakes: dict = {C1: {}, C2: {}}
+    nftvols: dict = {C1: {OCN_ADDR: {}}, C2: {OCN_ADDR2: {}}}
+    owners: dict = {C1: {}, C2: {}}
+    for LP in LPs:
+        for n in rng.choice(30, size=3, replace=False):
+            chainID = C1 if n % 2 else C2
+            nft = f"0xnft{n}_addr"
+            stakes[chainID].setdefault(nft, {})[LP] = float(rng.uniform(1.0, 1e5))
+            nftvols[chainID][chain_basetoken[chainID]][nft] = float(1e4 * (n + 1))
+            owners[chainID][nft] = LPs[n]
+    return stakes, stakes, nftvols, owners
+
+
+@enforce_types
+def _calculator(do_pubrewards: bool = True) -> RewardCalculator:
+    stakes, locked_amts, nftvols, owners = _world()
+    return RewardCalculator(
+        stakes,
+        locked_amts,
+        nftvols,
+        owners,
+        SYMBOLS,
+        RATES,
+        df_week=9,
+        OCEAN_avail=1e4,
+        do_pubrewards=do_pubrewards,
+        do_rank=True,
+    )
+
+
+@enforce_types
+def _calculate_per_LP(pub: bool, op: str, max_n: int, wpy: float) -> dict:
+    """Per-LP rewards summed across chains, from a regular calculate()"""
+    with patch("df_py.volume.reward_calculator.TARGET_WPY", wpy), patch(
+        "df_py.volume.reward_calculator.rank_based_allocate",
+        lambda V_USD: rank.rank_based_allocate(V_USD, max_n, op),
+    ):
+        rewardsperlp, _ = _calculator(do_pubrewards=pub).calculate()
+
+    per_LP: dict = {}
+    for rewards in rewardsperlp.values():
+        for LP_addr, reward in rewards.items():
+            per_LP[LP_addr] = per_LP.get(LP_addr, 0.0) + reward
+    return per_LP
@@ -15,6 +15,7 @@ from setuptools import find_packages, setup
 # Installed by pip install ocean-provider
 # or pip install -e .
 install_requirements = [
+    "aiohttp",
     "coverage",
     "ccxt==3.0.84",
     "eciespy",
@@ -30,6 +31,7 @@ install_requirements = [
     "requests",
     "scipy",
     "types-requests",
+    "yarl",
     "black",
     "ocean-contracts==2.0.0a15",
 ]